@@ -0,0 +1,303 @@
+"""Sweeps executed in real time, or as few unrolled programs.
+
+Controllers which cannot sweep a parameter in real time (e.g. the RFSoC
+boards, for readout frequencies, durations, or any sweep in presence of flux
+pulses) fall back to a Python loop with one round-trip to the instrument per
+point. The same happens to :meth:`qibolab.platform.Platform.execute_pulse_sequences`
+on controllers without unrolling bounds.
+
+:func:`sweep` hands the sweep to :meth:`qibolab.platform.Platform.sweep` when
+the controller sweeps all its parameters in real time, i.e. unless they are
+listed in :data:`UNROLLED`. Otherwise it builds the sequence of every point of an
+N-dimensional sweep, and plays them back to back, separated by the
+relaxation time, in as few programs as the memory of the controller allows
+(its unrolling bounds, or :data:`BOUNDS`). The results of all readouts and
+points are returned as a single array. Integrated IQ values are written as
+they arrive into a :class:`buffers.ResultBuffer`, which can be preallocated
+(or memory-mapped) by the caller.
+
+Each dimension of the sweep is a :class:`qibolab.sweeper.Sweeper`, or a list
+of sweepers with the same number of values which are swept together, such
+that different qubits can be swept over different values::
+
+    results = sweep(platform, sequence, options, [delays_0, delays_1], amplitudes)
+    results[qubit]  # shape (len(delays), len(amplitudes))
+
+Only the parameters of the pulses can be swept.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from buffers import IQ, ResultBuffer
+from qibolab import AcquisitionType, AveragingMode, ExecutionParameters
+from qibolab.pulses import PulseSequence, PulseType
+from qibolab.sweeper import Parameter, Sweeper
+from qibolab.unrolling import Bounds
+
+PULSE_PARAMETERS = (
+    Parameter.amplitude,
+    Parameter.duration,
+    Parameter.frequency,
+    Parameter.relative_phase,
+    Parameter.start,
+)
+BOUNDS: Dict[str, Bounds] = {
+    "RFSoC": Bounds(waveforms=100000, readout=500, instructions=2000),
+}
+"""Unrolling bounds of the controllers which do not define them."""
+UNROLLED: Dict[str, Tuple[Parameter, ...]] = {
+    "RFSoC": PULSE_PARAMETERS,
+    "RFSOC": PULSE_PARAMETERS,
+}
+"""Parameters which controllers cannot sweep in real time, by class name."""
+
+Dimension = Union[Sweeper, Sequence[Sweeper]]
+
+
+@dataclass
+class SweepResults:
+    """Results of all the readouts of a sweep."""
+
+    values: np.ndarray
+    """Values of each readout, with shape ``(readouts, *sweep, ...)``."""
+    qubits: list
+    """Qubit of each readout."""
+    serials: List[str]
+    """Serial of each readout pulse of the swept sequence."""
+    programs: int
+    """Number of programs executed."""
+    buffer: Optional[ResultBuffer] = None
+    """Buffer holding the values, for integrated acquisitions."""
+
+    def __getitem__(self, key) -> np.ndarray:
+        """Values of a readout, by pulse serial or qubit."""
+        index = self.serials.index(key) if key in self.serials else None
+        if index is None:
+            index = self.qubits.index(key)
+        return self.values[index]
+
+
+def bounds(platform) -> Bounds:
+    """Unrolling bounds of the controller of a platform."""
+    controller = platform._controller
+    if controller.bounds != Bounds(0, 0, 0):
+        return controller.bounds
+    return BOUNDS.get(type(controller).__name__, Bounds(0, 0, 0))
+
+
+def _dimensions(dimensions: Sequence[Dimension]) -> List[List[Sweeper]]:
+    result = []
+    for dimension in dimensions:
+        sweepers = [dimension] if isinstance(dimension, Sweeper) else list(dimension)
+        if len({len(sweeper.values) for sweeper in sweepers}) != 1:
+            raise ValueError("Sweepers of the same dimension need the same length.")
+        for sweeper in sweepers:
+            if sweeper.parameter not in PULSE_PARAMETERS:
+                raise ValueError(f"Cannot unroll a sweep of {sweeper.parameter.name}.")
+        result.append(sweepers)
+    return result
+
+
+def _native(platform, dimensions: List[List[Sweeper]]) -> Optional[List[Sweeper]]:
+    """One sweeper per dimension, if the controller can execute them in real
+    time.
+
+    Sweepers of the same dimension are merged when they sweep the same
+    parameter over the same values, otherwise the sweep is unrolled.
+    """
+    unrolled = UNROLLED.get(type(platform._controller).__name__, ())
+    native = []
+    for sweepers in dimensions:
+        first = sweepers[0]
+        for sweeper in sweepers:
+            if (
+                sweeper.parameter in unrolled
+                or sweeper.parameter is not first.parameter
+                or sweeper.type is not first.type
+                or not np.array_equal(sweeper.values, first.values)
+            ):
+                return None
+        pulses = [pulse for sweeper in sweepers for pulse in sweeper.pulses]
+        native.append(Sweeper(first.parameter, first.values, pulses, type=first.type))
+    return native
+
+
+def _points(pulses: list, dimensions: List[List[Sweeper]]):
+    """Copies of the pulses for every point of the sweep, in C order."""
+    indices = {id(pulse): i for i, pulse in enumerate(pulses)}
+    updates = []
+    for sweepers in dimensions:
+        values = []
+        for sweeper in sweepers:
+            for pulse in sweeper.pulses:
+                name = sweeper.parameter.name
+                base = getattr(pulse, name)
+                values.append((indices[id(pulse)], name, sweeper.get_values(base)))
+        updates.append(values)
+
+    shape = tuple(len(sweepers[0].values) for sweepers in dimensions)
+    for point in np.ndindex(shape):
+        copies = [pulse.copy() for pulse in pulses]
+        for index, values in zip(point, updates):
+            for i, name, array in values:
+                value = array[index].item()
+                if name in ("start", "duration"):
+                    value = int(value)
+                setattr(copies[i], name, value)
+        yield copies
+
+
+def _programs(points, bounds: Bounds):
+    """Split the points in programs within the bounds of the controller."""
+    counters, program = Bounds(0, 0, 0), []
+    for pulses in points:
+        update = Bounds.update(PulseSequence(*pulses))
+        if len(program) > 0 and counters + update > bounds:
+            yield program
+            counters, program = Bounds(0, 0, 0), []
+        program.append(pulses)
+        counters += update
+    if len(program) > 0:
+        yield program
+
+
+def _unroll(program: List[list], relaxation_time: int) -> PulseSequence:
+    """Play the points of a program back to back, shifting their pulses."""
+    sequence = PulseSequence()
+    start = 0
+    for pulses in program:
+        for pulse in pulses:
+            pulse.start += start
+        sequence.add(*pulses)
+        start = sequence.finish + relaxation_time
+    return sequence
+
+
+def _value(result) -> np.ndarray:
+    """IQ values, or state probabilities or samples, of a result."""
+    for name in ("voltage", "statistical_frequency", "samples"):
+        value = getattr(result, name, None)
+        if value is not None:
+            return np.asarray(value)
+    raise ValueError(f"Unsupported result {type(result).__name__}.")
+
+
+def _readouts(pulses: list) -> List[int]:
+    return [i for i, pulse in enumerate(pulses) if pulse.type is PulseType.READOUT]
+
+
+def _real_time(
+    platform,
+    sequence: PulseSequence,
+    sweepers: List[Sweeper],
+    options: ExecutionParameters,
+    out: Optional[ResultBuffer],
+) -> Optional[np.ndarray]:
+    """Sweep with the controller, returning the values unless written to
+    ``out``."""
+    shape = tuple(len(sweeper.values) for sweeper in sweepers)
+    results = platform.sweep(sequence, options, *sweepers)
+    pulses = list(sequence)
+    values = []
+    for readout, i in enumerate(_readouts(pulses)):
+        value = _value(results[pulses[i].serial])
+        if options.averaging_mode is not AveragingMode.CYCLIC:
+            # shots come first in the results of the controllers
+            value = np.moveaxis(value, 0, len(shape))
+        if out is None:
+            values.append(value)
+            continue
+        for point in np.ndindex(shape):
+            out.write(readout, point, value[point])
+    return np.array(values) if out is None else None
+
+
+def _unrolled(
+    platform,
+    pulses: list,
+    dimensions: List[List[Sweeper]],
+    options: ExecutionParameters,
+    out: Optional[ResultBuffer],
+):
+    """Sweep as unrolled programs, returning the values unless written to
+    ``out`` and the number of programs."""
+    shape = tuple(len(sweepers[0].values) for sweepers in dimensions)
+    readouts = _readouts(pulses)
+    values = []
+    programs = 0
+    points = np.ndindex(shape)
+    for program in _programs(_points(pulses, dimensions), bounds(platform)):
+        unrolled = _unroll(program, options.relaxation_time)
+        results = platform.execute_pulse_sequence(unrolled, options)
+        programs += 1
+        for copies in program:
+            point = next(points)
+            point_values = [_value(results[copies[i].serial]) for i in readouts]
+            if out is None:
+                values.append(point_values)
+                continue
+            for readout, value in enumerate(point_values):
+                out.write(readout, point, value)
+
+    if out is not None:
+        return None, programs
+    values = np.array(values)
+    values = np.moveaxis(values, 1, 0).reshape(
+        (len(readouts),) + shape + values.shape[2:]
+    )
+    return values, programs
+
+
+def sweep(
+    platform,
+    sequence: PulseSequence,
+    options: ExecutionParameters,
+    *dimensions: Dimension,
+    out: Optional[ResultBuffer] = None,
+) -> SweepResults:
+    """Execute an N-dimensional sweep, in real time or as unrolled programs.
+
+    Args:
+        platform (:class:`qibolab.platform.Platform`): Platform to execute on.
+        sequence (:class:`qibolab.pulses.PulseSequence`): Sequence to sweep.
+        options (:class:`qibolab.ExecutionParameters`): Execution options.
+        dimensions: Sweepers of each dimension, outermost first.
+        out (:class:`buffers.ResultBuffer`): Buffer receiving the values of
+            integrated acquisitions, allocated in memory if not given.
+    """
+    options = platform.settings.fill(options)
+    dimensions = _dimensions(dimensions)
+    shape = tuple(len(sweepers[0].values) for sweepers in dimensions)
+    pulses = list(sequence)
+    readouts = _readouts(pulses)
+    qubits = [pulses[i].qubit for i in readouts]
+
+    averaged = options.averaging_mode is AveragingMode.CYCLIC
+    shots = 1 if averaged else options.nshots
+    if options.acquisition_type is AcquisitionType.INTEGRATION:
+        if out is None:
+            out = ResultBuffer.allocate(qubits, shape, shots)
+        expected = (len(readouts),) + shape + (shots, IQ)
+        if out.data.shape != expected:
+            raise ValueError(f"Buffer of shape {out.data.shape} instead of {expected}.")
+    elif out is not None:
+        raise ValueError("Only integrated acquisitions can be written to a buffer.")
+
+    native = _native(platform, dimensions)
+    if native is None:
+        values, programs = _unrolled(platform, pulses, dimensions, options, out)
+    else:
+        values, programs = _real_time(platform, sequence, native, options, out), 1
+
+    if out is not None:
+        out.flush()
+        values = out.complex()[..., 0] if averaged else out.complex()
+    return SweepResults(
+        values=values,
+        qubits=qubits,
+        serials=[pulses[i].serial for i in readouts],
+        programs=programs,
+        buffer=out,
+    )
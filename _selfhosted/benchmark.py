@@ -0,0 +1,210 @@
+"""Benchmark creation, runcard loading and sequence building of the platforms.
+
+Every platform is measured in a fresh interpreter, such that import times
+and memory are not affected by modules loaded for other platforms::
+
+    python _selfhosted/benchmark.py --output benchmarks.json
+    python _selfhosted/benchmark.py iqm5q --compare benchmarks.json
+
+Measured quantities (times in seconds, memory in MB):
+
+- ``import``: loading the ``platform.py`` module,
+- ``create`` and ``create_peak_memory``: calling ``create()``, and the
+  growth of the peak resident memory meanwhile (including driver imports),
+- ``load_runcard``, ``load_runcard_compiled``, ``load_qubits`` and
+  ``load_kernels``: best time of the serialization helpers,
+- ``rx_mz`` and ``cz``: sequences per second built with the platform
+  methods (RX followed by MZ on every qubit, CZ on every pair),
+- ``rx_mz_batch``: the same for the vectorized :mod:`sequences` builder.
+"""
+
+import argparse
+import json
+import pathlib
+import platform as host
+import resource
+import subprocess
+import sys
+import time
+
+from platforms import KERNELS, PLATFORM, list_platforms, locate
+
+COSTS = (
+    "import",
+    "create",
+    "create_peak_memory",
+    "load_runcard",
+    "load_runcard_compiled",
+    "load_qubits",
+    "load_kernels",
+)
+"""Quantities for which lower is better, the others are throughputs."""
+
+parser = argparse.ArgumentParser()
+parser.add_argument("names", type=str, nargs="*", help="Names of the platforms.")
+parser.add_argument("--repeat", type=int, default=5, help="Repetitions of each step.")
+parser.add_argument("--output", type=pathlib.Path, help="JSON file with the results.")
+parser.add_argument("--compare", type=pathlib.Path, help="Results to compare with.")
+parser.add_argument(
+    "--tolerance",
+    type=float,
+    default=0.25,
+    help="Relative slowdown reported as a regression.",
+)
+parser.add_argument("--worker", type=pathlib.Path, help=argparse.SUPPRESS)
+
+
+def best(function, repeat: int) -> float:
+    """Shortest execution time of a function."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def throughput(function, repeat: int) -> float:
+    """Number of sequences built per second by a function returning them."""
+    count = len(function())
+    return count / best(function, repeat) if count > 0 else None
+
+
+def measure(folder: pathlib.Path, repeat: int) -> dict:
+    """Measure a platform in the current interpreter."""
+    import importlib.util
+
+    results = {}
+    start = time.perf_counter()
+    spec = importlib.util.spec_from_file_location("platform", folder / PLATFORM)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    results["import"] = time.perf_counter() - start
+
+    memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    platform = module.create()
+    results["create"] = time.perf_counter() - start
+    # maximum resident set size, in kB on Linux
+    memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - memory
+    results["create_peak_memory"] = memory / 2**10
+
+    from qibolab.kernels import Kernels
+    from qibolab.serialize import load_qubits, load_runcard
+    from runcard import load_runcard as load_compiled
+
+    results["load_runcard"] = best(lambda: load_runcard(folder), repeat)
+    results["load_runcard_compiled"] = best(lambda: load_compiled(folder), repeat)
+    runcard = load_runcard(folder)
+    kernels = Kernels.load(folder) if (folder / KERNELS).exists() else None
+    results["load_qubits"] = best(lambda: load_qubits(runcard, kernels), repeat)
+    results["load_kernels"] = (
+        best(lambda: Kernels.load(folder), repeat) if kernels is not None else None
+    )
+
+    results["rx_mz"] = throughput(lambda: _rx_mz(platform, 100), repeat)
+    results["cz"] = throughput(lambda: _cz(platform, 100), repeat)
+    results["rx_mz_batch"] = throughput(lambda: _rx_mz_batch(platform, 100), repeat)
+    return results
+
+
+def _rx_mz(platform, nsequences: int):
+    from qibolab.pulses import PulseSequence
+
+    sequences = []
+    for _ in range(nsequences):
+        sequence = PulseSequence()
+        for qubit in platform.qubits:
+            rx_pulse = platform.create_RX_pulse(qubit, start=0)
+            sequence.add(rx_pulse, platform.create_MZ_pulse(qubit, rx_pulse.finish))
+        sequences.append(sequence)
+    return sequences
+
+
+def _cz(platform, nsequences: int):
+    pairs = [
+        pair
+        for pair, qubit_pair in platform.pairs.items()
+        if qubit_pair.native_gates.CZ is not None
+    ]
+    if len(pairs) == 0:
+        return []
+    return [
+        platform.create_CZ_pulse_sequence(pair, start=0)[0]
+        for _ in range(nsequences)
+        for pair in pairs
+    ]
+
+
+def _rx_mz_batch(platform, nsequences: int):
+    import numpy as np
+    from sequences import PulseBatch, SequenceBuilder
+
+    builder = SequenceBuilder(platform)
+    qubits = [q for q in platform.qubits if ("RX", q) in builder.table.gates]
+    if len(qubits) == 0:
+        return []
+    sequence = np.repeat(np.arange(nsequences), len(qubits))
+    rx = builder.rx(np.tile(qubits, nsequences).tolist(), sequence=sequence)
+    mz = builder.mz(np.tile(qubits, nsequences).tolist(), rx.finish, sequence)
+    return PulseBatch.concatenate(rx, mz).sequences(builder.table)
+
+
+def run(folder: pathlib.Path, repeat: int) -> dict:
+    """Measure a platform in a separate interpreter."""
+    output = subprocess.run(
+        [sys.executable, __file__, "--worker", str(folder), "--repeat", str(repeat)],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return json.loads(output.stdout.splitlines()[-1])
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Quantities that got worse than the baseline by more than
+    ``tolerance``."""
+    regressions = []
+    for name, values in results["platforms"].items():
+        reference = baseline["platforms"].get(name, {})
+        for key, value in values.items():
+            old = reference.get(key)
+            if value is None or not old:
+                continue
+            ratio = value / old if key in COSTS else old / value
+            if ratio > 1 + tolerance:
+                regressions.append(f"{name} {key}: {old:.4g} -> {value:.4g}")
+    return regressions
+
+
+def main(names, repeat=5, output=None, baseline=None, tolerance=0.25):
+    """Benchmark the given platforms, all of them if ``names`` is empty."""
+    import qibolab
+
+    folders = [locate(name) for name in names] or list(list_platforms().values())
+    results = {
+        "timestamp": time.time(),
+        "python": host.python_version(),
+        "qibolab": qibolab.__version__,
+        "platforms": {folder.name: run(folder, repeat) for folder in folders},
+    }
+    text = json.dumps(results, indent=4)
+    if output is not None:
+        output.write_text(text + "\n")
+    else:
+        print(text)
+
+    if baseline is not None:
+        regressions = compare(results, json.loads(baseline.read_text()), tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        return len(regressions) == 0
+    return True
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    if args.worker is not None:
+        print(json.dumps(measure(args.worker.resolve(), args.repeat)))
+    elif not main(args.names, args.repeat, args.output, args.compare, args.tolerance):
+        sys.exit(1)
@@ -0,0 +1,86 @@
+"""Preallocated buffers for acquired IQ values.
+
+A :class:`ResultBuffer` holds the integrated IQ values of all the readouts
+of an acquisition in a single array, with layout
+``(readout, *sweep, shot, IQ)``. Acquisitions write every result into it
+once, as it arrives, and consumers read views of it: :meth:`ResultBuffer.iq`
+gives the real ``(..., 2)`` points of a readout, :meth:`ResultBuffer.complex`
+the same memory as complex values.
+
+Buffers too large for memory can be backed by a ``.npy`` file, which can be
+opened again with ``np.load(path, mmap_mode="r")``.
+"""
+
+import pathlib
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+
+IQ = 2
+COMPLEX = {np.dtype(np.float32): np.complex64, np.dtype(np.float64): np.complex128}
+
+
+@dataclass
+class ResultBuffer:
+    data: np.ndarray
+    """IQ values, with shape ``(readouts, *sweep, shots, 2)``."""
+    qubits: list
+    """Qubit of each readout."""
+
+    @classmethod
+    def allocate(
+        cls,
+        qubits: list,
+        sweep: Tuple[int, ...] = (),
+        shots: int = 1,
+        dtype=np.float64,
+        path: Optional[pathlib.Path] = None,
+    ) -> "ResultBuffer":
+        """Allocate a buffer, in memory or mapped to a ``.npy`` file.
+
+        Args:
+            qubits (list): Qubit of each readout.
+            sweep (tuple): Shape of the sweep.
+            shots (int): Shots of each point, 1 for averaged results.
+            dtype: Floating point type of the I and Q values.
+            path (pathlib.Path): File backing the buffer, if given.
+        """
+        shape = (len(qubits),) + tuple(sweep) + (shots, IQ)
+        if path is None:
+            data = np.empty(shape, dtype=dtype)
+        else:
+            data = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+        return cls(data, list(qubits))
+
+    @property
+    def sweep(self) -> Tuple[int, ...]:
+        return self.data.shape[1:-2]
+
+    @property
+    def shots(self) -> int:
+        return self.data.shape[-2]
+
+    def index(self, qubit) -> int:
+        return self.qubits.index(qubit)
+
+    def iq(self, qubit) -> np.ndarray:
+        """IQ points of the readout of a qubit, shape ``(*sweep, shots, 2)``."""
+        return self.data[self.index(qubit)]
+
+    def complex(self, qubit=None) -> np.ndarray:
+        """Complex view of the values of a readout, or of all of them, with
+        shape ``(*sweep, shots)``."""
+        data = self.data if qubit is None else self.iq(qubit)
+        return data.view(COMPLEX[data.dtype])[..., 0]
+
+    def write(self, readout: int, point: tuple, values: np.ndarray):
+        """Store the complex values of a readout at a point of the sweep."""
+        target = self.data[(readout,) + tuple(point)]
+        target[:, 0] = np.real(values)
+        target[:, 1] = np.imag(values)
+
+    def flush(self):
+        """Write the values to the backing file, if any."""
+        if isinstance(self.data, np.memmap):
+            self.data.flush()
@@ -1,18 +1,52 @@
 import argparse
+import io
+import json
 import logging
 import pathlib
-import traceback
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
 from dataclasses import dataclass, field
+from multiprocessing import get_context
 from typing import Callable, List, Optional
 
+import numpy as np
+from platforms import BUILTIN, locate
+from pool import lease, pool
 from qibocal.auto.operation import Routine
 from qibocal.protocols.characterization import Operation
-from qibolab import create_platform
+from simulator import Simulator
+from store import COMPACT, store
+from streaming import streaming_readout
+from sweeps import adaptive_coherence
+from tracing import context, span, tracer, write_breakdown
+from update import characterization, update_runcard
 
 MESSAGE_FILE = "message.txt"
+TRACE_FILE = "trace.json"
+QUEUES_FILE = pathlib.Path(__file__).parents[1] / "queues.json"
+FIT_WORKERS = 2
+"""Processes fitting the data of the experiments."""
+MAX_ERROR = 0.2
+"""Relative error above which fitted values are not stored nor written to the
+runcard."""
 
 parser = argparse.ArgumentParser()
-parser.add_argument("name", type=str, help="Name of the platform.")
+parser.add_argument("names", type=str, nargs="*", help="Names of the platforms.")
+parser.add_argument(
+    "--all",
+    action="store_true",
+    help="Run on all the platforms listed in queues.json.",
+)
+parser.add_argument(
+    "--update",
+    action="store_true",
+    help="Write the fitted parameters to the platform runcards.",
+)
+parser.add_argument(
+    "--simulate",
+    action="store_true",
+    help="Replace the instruments with the offline simulator.",
+)
 
 
 @dataclass
@@ -22,6 +56,10 @@ class Experiment:
     header: str
     attribute: str
     formatter: Callable = field(default=lambda x: f"{x:.3f}")
+    parameter: Optional[str] = None
+    """Runcard characterization parameter updated with the fitted values."""
+    qubits: Optional[list] = None
+    """Qubits the experiment acts on. If ``None`` all platform qubits are used."""
     fit: Optional["test"] = None
     acquisition_time: float = 0
     fit_time: float = 0
@@ -30,15 +68,48 @@ class Experiment:
     def total_time(self):
         return self.acquisition_time + self.fit_time
 
-    def __call__(self, platform, qubits):
+    def acquire(self, platform, qubits):
+        """Acquire the data of the experiment, ``None`` if it fails."""
+        if self.qubits is not None:
+            qubits = {q: qubits[q] for q in self.qubits}
         params = self.routine.parameters_type.load(self.params)
+        with context(platform=platform.name, experiment=self.header):
+            try:
+                with span("acquisition"):
+                    data, self.acquisition_time = self.routine.acquisition(
+                        params=params, platform=platform, qubits=qubits
+                    )
+            except Exception:
+                logging.exception(f"Experiment {self.header} failed")
+                return None
+        return data
+
+    def __call__(self, platform, qubits):
+        data = self.acquire(platform, qubits)
+        if data is None:
+            return
+        with context(platform=platform.name, experiment=self.header):
+            try:
+                with span("fit"):
+                    self.fit, self.fit_time = self.routine.fit(data)
+            except Exception:
+                logging.exception(f"Experiment {self.header} failed")
+
+    def submit(self, executor, platform, data) -> Future:
+        """Fit the data in a process of the executor."""
+        # the undecorated fit function can be pickled
+        fit = self.routine.fit.__wrapped__
+        args = dict(platform=platform.name, experiment=self.header)
+        return executor.submit(_fit, fit, data, args)
+
+    def collect(self, future: Future):
+        """Store the results of a fit submitted with :meth:`submit`."""
         try:
-            data, self.acquisition_time = self.routine.acquisition(
-                params=params, platform=platform, qubits=qubits
-            )
-            self.fit, self.fit_time = self.routine.fit(data)
-        except:
-            logging.error(traceback.format_exc())
+            self.fit, self.fit_time, spans = future.result()
+        except Exception:
+            logging.exception(f"Experiment {self.header} failed")
+            return
+        tracer.extend(spans)
 
     def report(self, file):
         file.write(f"\n{self.header}:")
@@ -49,47 +120,105 @@ class Experiment:
             for qubit, value in getattr(self.fit, self.attribute).items():
                 file.write(f"{qubit}: {self.formatter(value)}\n")
 
+    def results(self):
+        """Fitted value of every qubit, with its error if available (see
+        :func:`fitted`)."""
+        if self.fit is None:
+            return {}
+        return fitted(getattr(self.fit, self.attribute))
+
+    def updates(self):
+        """Runcard values to be updated according to the fit results."""
+        if self.parameter is None:
+            return {}
+        return {
+            characterization(qubit, self.parameter): value
+            for qubit, (value, _) in self.results().items()
+        }
+
+    def records(self):
+        """Fitted values, as records of the :mod:`store`."""
+        quantity = self.parameter or self.attribute
+        return [
+            (qubit, quantity, value, np.nan if error is None else error)
+            for qubit, (value, error) in self.results().items()
+        ]
+
+
+def fitted(values: dict, max_error: float = MAX_ERROR) -> dict:
+    """Values and errors of a qibocal results attribute, for every qubit.
+
+    Values can be given alone or with their error. Failed fits, i.e. values
+    or errors which are not finite, and values whose relative error exceeds
+    ``max_error`` are skipped.
+    """
+    results = {}
+    for qubit, value in values.items():
+        error = None
+        if isinstance(value, (list, tuple)):
+            # value with its error
+            value, error = value[0], value[1] if len(value) > 1 else None
+        value, error = float(value), None if error is None else float(error)
+        if not np.isfinite(value):
+            continue
+        if error is not None and not (
+            np.isfinite(error) and abs(error) <= max_error * abs(value)
+        ):
+            continue
+        results[qubit] = (value, error)
+    return results
+
+
+def _fit(fit, data, args: dict):
+    """Fit the data of an experiment in a worker process.
+
+    Returns the results, the fit time and the spans recorded.
+    """
+    tracer.clear()
+    with context(**args):
+        with span("fit") as record:
+            results = fit(data)
+    return results, record.duration / 1e9, list(tracer.spans)
+
 
 def convert_to_us(x):
+    if isinstance(x, (list, tuple)):
+        value, error = x
+        return f"{value / 1000:.2f} +- {error / 1000:.2f} us"
     return f"{x / 1000:.2f} us"
 
 
-def main(name):
-    """Execute single shot classification routine on the given platform."""
-    platform = create_platform(name)
-    qubits = platform.qubits
+def calibrate(name, update=False, simulate=None):
+    """Execute the calibration experiments on a single platform.
 
-    max_time = max(int(5 * max(qubit.T1 for qubit in qubits.values())), 20000)
-    step = max_time // 25
+    If ``update`` is ``True`` the fitted parameters are written to the
+    platform runcard, unless the platform is simulated (see
+    :func:`platforms.create_platform`). Returns the report of the run as a
+    string.
+    """
+    tracer.name_process(name)
     experiments = [
         Experiment(
-            Operation.readout_characterization.value,
-            dict(nshots=10000),
+            streaming_readout,
+            dict(nshots=100000, chunk=2000, tolerance=0.005),
             header="Readout assignment fidelities",
             attribute="assignment_fidelity",
+            parameter="assignment_fidelity",
         ),
         Experiment(
-            Operation.t1_signal.value,
-            dict(
-                delay_before_readout_start=50,
-                delay_before_readout_end=max_time,
-                delay_before_readout_step=step,
-                nshots=2000,
-            ),
+            adaptive_coherence,
+            dict(kind="t1", nshots=2000),
             header="T1",
             attribute="t1",
+            parameter="T1",
             formatter=convert_to_us,
         ),
         Experiment(
-            Operation.t2_signal.value,
-            dict(
-                delay_between_pulses_start=50,
-                delay_between_pulses_end=max_time,
-                delay_between_pulses_step=step,
-                nshots=2000,
-            ),
+            adaptive_coherence,
+            dict(kind="t2", nshots=2000),
             header="T2",
             attribute="t2",
+            parameter="T2",
             formatter=convert_to_us,
         ),
         # Experiment(
@@ -103,26 +232,113 @@ def main(name):
         # )
     ]
 
-    platform.connect()
-    platform.setup()
-    platform.start()
+    begin = time.perf_counter()
+    # the process may run other calibrations, before or at the same time
+    start = tracer.mark()
+    # fits run in other processes while the following experiments acquire,
+    # which are spawned not to fork the connections to the instruments
+    fits = []
+    with ProcessPoolExecutor(FIT_WORKERS, mp_context=get_context("spawn")) as fitter:
+        # the instruments stay connected for the following runs of this process
+        with lease(name, simulate) as platform:
+            qubits = platform.qubits
+            for experiment in experiments:
+                data = experiment.acquire(platform, qubits)
+                if data is not None:
+                    future = experiment.submit(fitter, platform, data)
+                    fits.append((experiment, future))
+        # results are collected in the order of the experiments
+        for experiment, future in fits:
+            experiment.collect(future)
+    # acquisitions and fits overlap, their times do not add up
+    total_time = time.perf_counter() - begin
 
+    file = io.StringIO()
+    file.write(
+        f"Run on platform `%s` completed in %.2fsec! :atom:\n" % (name, total_time)
+    )
     for experiment in experiments:
-        experiment(platform, qubits)
+        experiment.report(file)
+    file.write("\nTime breakdown (s):\n")
+    events = tracer.events(since=start)
+    write_breakdown(
+        [e for e in events if e["args"].get("platform") == platform.name], file
+    )
+
+    simulated = any(
+        isinstance(instrument, Simulator)
+        for instrument in platform.instruments.values()
+    )
+    if name not in BUILTIN and not simulated:
+        records = [record for e in experiments for record in e.records()]
+        store.append(name, records, run="calibration.py")
+        store.compact(name, minimum=COMPACT)
+    if update and name not in BUILTIN and not simulated:
+        updates = {}
+        for experiment in experiments:
+            updates.update(experiment.updates())
+        operations = update_runcard(locate(name), updates, message="calibration.py")
+        file.write(f"\nUpdated {len(operations)} runcard parameters.\n")
+    return file.getvalue()
 
-    platform.stop()
-    platform.disconnect()
 
-    total_time = sum(experiment.total_time for experiment in experiments)
+def safe_calibrate(name, update=False, simulate=None):
+    """Execute :func:`calibrate` reporting failures instead of raising.
+
+    The platform is disconnected afterwards, since the exit handlers of the
+    pool do not run in the worker processes of :func:`main`. Returns the
+    report together with the trace events of the process.
+    """
+    start = tracer.mark()
+    try:
+        report = calibrate(name, update, simulate)
+    except Exception:
+        logging.exception(f"Calibration of {name} failed")
+        report = f"Run on platform `{name}` failed :worried:\n"
+    finally:
+        try:
+            pool.close(name)
+        except Exception:
+            logging.exception(f"Disconnection of {name} failed")
+    return report, tracer.events(since=start)
+
+
+def main(names, update=False, simulate=None):
+    """Execute the calibration routines on the given platforms.
+
+    Each platform is calibrated in a separate process, and the reports
+    are merged in a single message file. The traces of all the processes
+    are merged in a single Chrome trace file.
+    """
+    if len(names) == 1:
+        reports = [calibrate(names[0], update, simulate)]
+        events = tracer.events()
+    else:
+        with ProcessPoolExecutor(max_workers=len(names)) as executor:
+            results = list(
+                executor.map(
+                    safe_calibrate,
+                    names,
+                    [update] * len(names),
+                    [simulate] * len(names),
+                )
+            )
+        reports = [report for report, _ in results]
+        events = [event for _, trace in results for event in trace]
+
     path = pathlib.Path.cwd() / MESSAGE_FILE
     with open(path, "w") as file:
-        file.write(
-            f"Run on platform `%s` completed in %.2fsec! :atom:\n" % (name, total_time)
-        )
-        for experiment in experiments:
-            experiment.report(file)
+        file.write("\n".join(reports))
+    tracer.export(pathlib.Path.cwd() / TRACE_FILE, events)
 
 
 if __name__ == "__main__":
+    import envelopes
+
+    # sampled pulse envelopes are reused across sequences and platforms
+    envelopes.install()
     args = parser.parse_args()
-    main(args.name)
+    names = list(json.loads(QUEUES_FILE.read_text())) if args.all else args.names
+    if len(names) == 0:
+        parser.error("at least one platform name is required")
+    main(names, args.update, args.simulate or None)
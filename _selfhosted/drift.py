@@ -0,0 +1,338 @@
+"""Recalibration of the qubits whose parameters drifted.
+
+The actions of a monitoring file (``_monitoring/*.yml``) form a graph, in
+which every action is followed by the one given as its ``main``. Instead of
+running all of them on all the qubits, :func:`main`:
+
+1. measures the parameters calibrated by the actions with cheap probes
+   (:data:`PROBES`: few shots, a single round of the adaptive sweeps),
+2. compares them with the values of the runcard, flagging the qubits whose
+   parameters drifted beyond the tolerances stored in the ``drift.json``
+   file next to the runcard, e.g.::
+
+       {"T1": {"relative": 0.2}, "assignment_fidelity": {"absolute": 0.02}}
+
+   widened by a few standard deviations of the probe, such that the noise
+   of the cheap probes is not mistaken for drift. Probes which failed, or
+   whose relative error exceeds the ``max_error`` of the tolerance, are
+   inconclusive and their qubits are recalibrated as if they drifted,
+3. re-runs the actions calibrating a drifted parameter, on the drifted
+   qubits only, and the actions following them in the graph on the same
+   qubits.
+
+Probes and actions are executed through the :mod:`jobs` queue, and the
+probed values are appended to the :mod:`store` for real platforms. With
+``--update``, the parameters fitted by the actions (see :data:`RESULTS`) are
+written to the runcard, as by ``calibration.py``::
+
+    python _selfhosted/drift.py _monitoring/iqm5q.yml [--simulate] [--dry-run] [--update]
+"""
+
+import argparse
+import json
+import logging
+import pathlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+TOLERANCES = "drift.json"
+DEFAULT_TOLERANCES = {
+    "T1": {"relative": 0.2},
+    "T2": {"relative": 0.3},
+    "assignment_fidelity": {"absolute": 0.02},
+}
+OPERATIONS = {
+    "t1": ("T1",),
+    "t2": ("T2",),
+    "readout_characterization": ("assignment_fidelity",),
+}
+"""Qubit parameters calibrated by the qibocal operations."""
+RESULTS = {"T1": "t1", "T2": "t2", "assignment_fidelity": "assignment_fidelity"}
+"""Attribute of the qibocal results holding each parameter."""
+PROBES = {
+    "T1": ("adaptive_coherence", dict(kind="t1", nshots=500, rounds=1), "t1"),
+    "T2": ("adaptive_coherence", dict(kind="t2", nshots=500, rounds=1), "t2"),
+    "assignment_fidelity": (
+        "streaming_readout",
+        dict(nshots=20000, chunk=2000, tolerance=0.01),
+        "assignment_fidelity",
+    ),
+}
+"""Routine, parameters and fitted attribute measuring every parameter."""
+PROBE_PRIORITY = -1
+"""Priority of the probes in the :mod:`jobs` queue, before all actions."""
+
+parser = argparse.ArgumentParser()
+parser.add_argument("paths", type=str, nargs="+", help="Monitoring files.")
+parser.add_argument(
+    "--simulate",
+    action="store_true",
+    help="Replace the instruments with the offline simulator.",
+)
+parser.add_argument(
+    "--dry-run",
+    action="store_true",
+    help="Only probe and print the actions that would be executed.",
+)
+parser.add_argument(
+    "--update",
+    action="store_true",
+    help="Write the parameters fitted by the actions to the platform runcards.",
+)
+
+
+@dataclass
+class Tolerance:
+    relative: float = 0
+    """Allowed deviation, relative to the runcard value."""
+    absolute: float = 0
+    """Allowed deviation, in the units of the parameter."""
+    sigmas: float = 3
+    """Standard deviations of the probed value added to the allowed
+    deviation."""
+    max_error: float = 0.2
+    """Relative error of the probed value above which the probe is
+    inconclusive."""
+
+    def inconclusive(self, value: float, error: Optional[float] = None) -> bool:
+        if error is None:
+            return False
+        return not (np.isfinite(error) and abs(error) <= self.max_error * abs(value))
+
+    def exceeded(
+        self, reference: Optional[float], value: float, error: Optional[float] = None
+    ) -> bool:
+        if not reference:
+            # parameters never calibrated
+            return True
+        allowed = max(self.absolute, self.relative * abs(reference))
+        if error is not None:
+            allowed += self.sigmas * error
+        return abs(value - reference) > allowed
+
+
+def load_tolerances(folder: pathlib.Path) -> Dict[str, Tolerance]:
+    """Tolerances of a platform, with the defaults for missing parameters."""
+    path = pathlib.Path(folder) / TOLERANCES
+    tolerances = dict(DEFAULT_TOLERANCES)
+    if path.exists():
+        tolerances.update(json.loads(path.read_text()))
+    return {name: Tolerance(**values) for name, values in tolerances.items()}
+
+
+@dataclass
+class Graph:
+    """Actions of a monitoring file and the links between them."""
+
+    platform: str
+    qubits: list
+    actions: List[dict]
+    """Actions, in order of priority."""
+    following: Dict[str, List[str]] = field(default_factory=dict)
+    """Actions following each action."""
+
+    @classmethod
+    def load(cls, path) -> "Graph":
+        from jobs import actions
+
+        loaded = actions(path)
+        ids = {action["id"] for action in loaded}
+        following = {action["id"]: [] for action in loaded}
+        for action in loaded:
+            if action.get("main") in ids:
+                following[action["id"]].append(action["main"])
+            elif action.get("main") is not None:
+                logging.warning(f"Action {action['id']} followed by unknown action.")
+        ordered = sorted(loaded, key=lambda action: int(action.get("priority", 0)))
+        first = loaded[0] if loaded else {}
+        return cls(first.get("platform"), first.get("qubits") or [], ordered, following)
+
+    def parameters(self) -> Set[str]:
+        """Qubit parameters calibrated by the actions."""
+        return {
+            name
+            for action in self.actions
+            for name in OPERATIONS.get(action["operation"], ())
+        }
+
+    def plan(self, drifted: Dict[str, Set]) -> List[Tuple[dict, list]]:
+        """Actions to execute, with the qubits to execute them on.
+
+        Args:
+            drifted (dict): Qubits whose parameter drifted, for each
+                parameter.
+        """
+        inherited = {action["id"]: set() for action in self.actions}
+        plan = []
+        for action in self.actions:
+            targets = action["qubits"] if action["qubits"] is not None else self.qubits
+            stale = set(inherited[action["id"]])
+            for name in OPERATIONS.get(action["operation"], ()):
+                stale |= drifted.get(name, set())
+            qubits = [qubit for qubit in targets if qubit in stale]
+            if len(qubits) == 0:
+                continue
+            plan.append((action, qubits))
+            for following in self.following[action["id"]]:
+                inherited[following].update(qubits)
+        return plan
+
+
+def probe(platform, names, qubits) -> Dict[str, Dict]:
+    """Measure the given parameters of some qubits with the cheap
+    :data:`PROBES`.
+
+    Returns the value and error (``None`` if unknown) of every parameter of
+    each qubit. Failed fits are skipped, and failed probes return no values.
+    """
+    import streaming
+    import sweeps
+    from calibration import fitted
+
+    routines = {
+        "adaptive_coherence": sweeps.adaptive_coherence,
+        "streaming_readout": streaming.streaming_readout,
+    }
+    targets = {qubit: platform.qubits[qubit] for qubit in qubits}
+    measured = {}
+    for name in names:
+        routine_name, params, attribute = PROBES[name]
+        routine = routines[routine_name]
+        params = routine.parameters_type.load(params)
+        try:
+            data, _ = routine.acquisition(
+                params=params, platform=platform, qubits=targets
+            )
+            results, _ = routine.fit(data)
+        except Exception:
+            logging.exception(f"Probe of {name} failed")
+            measured[name] = {}
+            continue
+        measured[name] = fitted(getattr(results, attribute), max_error=np.inf)
+    return measured
+
+
+def drifted(
+    platform, measured: Dict[str, Dict], tolerances, qubits: Optional[list] = None
+) -> Dict[str, Set]:
+    """Qubits whose measured parameters are out of tolerance with respect
+    to the platform runcard.
+
+    The qubits probed inconclusively, or not measured at all among the given
+    ``qubits``, are included as well, since they cannot be assumed to be
+    within tolerance.
+    """
+    result = {}
+    for name, values in measured.items():
+        tolerance = tolerances.get(name, Tolerance())
+        targets = values if qubits is None else qubits
+        result[name] = {
+            qubit
+            for qubit in targets
+            if qubit not in values
+            or tolerance.inconclusive(*values[qubit])
+            or tolerance.exceeded(
+                getattr(platform.qubits[qubit], name, None), *values[qubit]
+            )
+        }
+    return result
+
+
+def _probe_job(graph: Graph, tolerances):
+    def run(platform):
+        from simulator import Simulator
+
+        measured = probe(platform, sorted(graph.parameters()), graph.qubits)
+        simulated = any(
+            isinstance(instrument, Simulator)
+            for instrument in platform.instruments.values()
+        )
+        if not simulated:
+            from store import store
+
+            records = [
+                (qubit, name, value, np.nan if error is None else error)
+                for name, values in measured.items()
+                for qubit, (value, error) in values.items()
+            ]
+            store.append(graph.platform, records, run="drift.py")
+        return measured, drifted(platform, measured, tolerances, graph.qubits)
+
+    return run
+
+
+def updates(action: dict, results) -> Dict[str, float]:
+    """Runcard values to be updated according to the results of an action."""
+    from calibration import fitted
+    from update import characterization
+
+    values = {}
+    for name in OPERATIONS.get(action["operation"], ()):
+        for qubit, (value, _) in fitted(getattr(results, RESULTS[name])).items():
+            values[characterization(qubit, name)] = value
+    return values
+
+
+def main(paths, simulate=None, dry_run=False, update=False):
+    from jobs import _operation, queue
+    from platforms import BUILTIN, locate
+    from simulator import enabled
+    from update import update_runcard
+
+    for path in paths:
+        graph = Graph.load(path)
+        tolerances = load_tolerances(locate(graph.platform))
+        measured, drift = queue.submit(
+            graph.platform,
+            _probe_job(graph, tolerances),
+            priority=PROBE_PRIORITY,
+            name="drift probes",
+            simulate=simulate,
+        ).result()
+        print(f"{graph.platform} ({path}):")
+        for name, values in measured.items():
+            tolerance = tolerances.get(name, Tolerance())
+            for qubit in graph.qubits:
+                if qubit not in values:
+                    print(f"  {name} {qubit}: inconclusive")
+                    continue
+                value, error = values[qubit]
+                mark = " drifted" if qubit in drift[name] else ""
+                if tolerance.inconclusive(value, error):
+                    mark = " inconclusive"
+                error = "" if error is None else f" +- {error:.2g}"
+                print(f"  {name} {qubit}: {value:.4g}{error}{mark}")
+
+        plan = graph.plan(drift)
+        futures = []
+        for action, qubits in plan:
+            print(f"  run {action['id']} on {qubits}")
+            if not dry_run:
+                future = queue.submit(
+                    graph.platform,
+                    _operation({**action, "qubits": qubits}),
+                    priority=int(action.get("priority", 0)),
+                    name=action["id"],
+                    simulate=simulate,
+                )
+                futures.append((action, future))
+        skipped = len(graph.actions) - len(plan)
+        print(f"  {len(plan)} actions to run, {skipped} skipped")
+        values = {}
+        for action, future in futures:
+            error = future.exception()
+            print(f"  {action['id']}: {'failed: ' + str(error) if error else 'done'}")
+            if error is None:
+                values.update(updates(action, future.result()))
+        simulated = graph.platform in BUILTIN or enabled(graph.platform, simulate)
+        if update and not simulated:
+            folder = locate(graph.platform)
+            operations = update_runcard(folder, values, message="drift.py")
+            print(f"  updated {len(operations)} runcard parameters")
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    main(args.paths, args.simulate or None, args.dry_run, args.update)
@@ -0,0 +1,191 @@
+"""Shared cache of sampled pulse envelopes.
+
+Drivers sample the envelope of every pulse with
+:meth:`qibolab.pulses.PulseShape.envelope_waveform_i` (and ``_q``) each time
+a sequence is compiled, although the runcards only contain a handful of
+distinct shapes (e.g. ``"Gaussian(5)"``, ``"Rectangular()"`` or
+``"Exponential(12, 5000, 0.1)"``). At the sampling rates of the RFSoC boards
+(6.144 and 9.8304 GS/s) long readout pulses amount to tens of thousands of
+samples, regenerated for every batch of shots.
+
+The sampled envelopes are kept in a single least-recently-used cache per
+process, shared by all platforms and bounded by the memory it occupies.
+Entries are keyed by shape class and parameters, duration and sampling rate,
+together with the amplitude, such that cached waveforms are bit-for-bit
+equal to the ones computed by qibolab. Cached arrays are read-only.
+
+The cache is opt-in: qibolab uses it after the application calls
+:func:`install`, which wraps the envelope methods of all the pulse shapes of
+the process::
+
+    import envelopes
+
+    envelopes.install()
+"""
+
+import copy
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+MAX_BYTES = int(float(os.environ.get("QRC_ENVELOPE_CACHE_MB", 256)) * 2**20)
+"""Default memory budget of the cache, which can be set in MB through the
+``QRC_ENVELOPE_CACHE_MB`` environment variable."""
+UNCACHED = ("Custom", "IIR", "SNZ")
+"""Shapes whose parameters do not identify the envelope (their samples are
+truncated, or depend on the pulse)."""
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    entries: int
+    nbytes: int
+    max_bytes: int
+
+
+class EnvelopeCache:
+    """Least-recently-used cache of waveforms, bounded by their size.
+
+    Args:
+        max_bytes (int): Maximum memory occupied by the cached arrays.
+    """
+
+    def __init__(self, max_bytes: int = MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, object]" = OrderedDict()
+        self._nbytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, compute: Callable[[], object]):
+        """Cached waveform for ``key``, computed and stored if missing.
+
+        ``compute`` must return a :class:`qibolab.pulses.Waveform`. Arrays
+        larger than the whole budget are returned without being cached.
+        """
+        with self._lock:
+            waveform = self._entries.get(key)
+            if waveform is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return waveform
+            self._misses += 1
+
+        waveform = compute()
+        waveform.data = np.asarray(waveform.data)
+        waveform.data.flags.writeable = False
+        nbytes = waveform.data.nbytes
+        if nbytes > self.max_bytes:
+            return waveform
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = waveform
+                self._nbytes += nbytes
+                while self._nbytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._nbytes -= evicted.data.nbytes
+        return waveform
+
+    def info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(
+                self._hits,
+                self._misses,
+                len(self._entries),
+                self._nbytes,
+                self.max_bytes,
+            )
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+            self._hits = 0
+            self._misses = 0
+
+
+cache = EnvelopeCache()
+"""Cache shared by all the platforms of the process."""
+
+_originals: Dict[Tuple[type, str], Callable] = {}
+
+
+def _key(shape, component: str, sampling_rate) -> Optional[tuple]:
+    """Key of an envelope, ``None`` if its parameters cannot be hashed."""
+    parameters = tuple(
+        sorted(
+            (name, value)
+            for name, value in vars(shape).items()
+            if name not in ("name", "pulse", "_pulse")
+        )
+    )
+    try:
+        hash(parameters)
+    except TypeError:
+        return None
+    pulse = shape.pulse
+    return (
+        type(shape),
+        parameters,
+        pulse.duration,
+        float(sampling_rate),
+        float(pulse.amplitude),
+        component,
+    )
+
+
+def _cached(method: Callable, component: str) -> Callable:
+    def envelope_waveform(self, *args, **kwargs):
+        if self.pulse is None or self.name in UNCACHED:
+            return method(self, *args, **kwargs)
+        sampling_rate = args[0] if args else kwargs.get("sampling_rate")
+        if sampling_rate is None:
+            from qibolab.pulses import SAMPLING_RATE as sampling_rate
+        key = _key(self, component, sampling_rate)
+        if key is None:
+            return method(self, *args, **kwargs)
+        waveform = cache.get(key, lambda: method(self, *args, **kwargs))
+        # callers may change the attributes of the waveform (not its data)
+        return copy.copy(waveform)
+
+    envelope_waveform.__wrapped__ = method
+    envelope_waveform.__doc__ = method.__doc__
+    return envelope_waveform
+
+
+def _shapes():
+    from qibolab.pulses import PulseShape
+
+    shapes, stack = [], [PulseShape]
+    while stack:
+        shape = stack.pop()
+        shapes.append(shape)
+        stack.extend(shape.__subclasses__())
+    return shapes
+
+
+def install():
+    """Make the envelope methods of all qibolab pulse shapes use the cache.
+
+    Calling this function more than once has no further effect.
+    """
+    for shape in _shapes():
+        for component in ("i", "q"):
+            name = f"envelope_waveform_{component}"
+            if name in vars(shape) and (shape, name) not in _originals:
+                method = vars(shape)[name]
+                _originals[(shape, name)] = method
+                setattr(shape, name, _cached(method, component))
+
+
+def uninstall():
+    """Restore the original envelope methods."""
+    for (shape, name), method in _originals.items():
+        setattr(shape, name, method)
+    _originals.clear()
@@ -0,0 +1,276 @@
+"""Integration kernels: computation, batched demodulation and storage.
+
+The optimal integration weights of a qubit discriminate its ground and
+excited state from the raw readout traces. :func:`compute` builds them as a
+matched filter, the conjugate of the difference between the mean traces of
+the two states, normalized to a maximum weight of one and truncated to a
+multiple of :data:`SAMPLES_FACTOR` samples, as :mod:`qibocal` does for the
+Zurich Instruments kernels. When given single shots instead of mean traces,
+the samples are also weighted by their inverse noise variance. :func:`acquire`
+measures mean traces only, since most controllers do not return raw single
+shots.
+
+Controllers that cannot integrate with arbitrary weights (qblox, RFSoC) can
+acquire raw traces instead and integrate them in software with a
+:class:`KernelBank`, which stacks the kernels of all qubits and applies them
+to the traces of all qubits and shots as a single batched matrix product.
+
+Kernels are stored in the ``kernels.npz`` file next to the runcard, loaded by
+:func:`runcard.load_kernels`. Every saved set is also archived as
+``kernels/<version>.npz``, the version being a hash of its content, and
+recorded in ``kernels.history.jsonl``, such that previous kernels can be
+restored. Usage::
+
+    python _selfhosted/integration.py qw5q_gold [--update] [--simulate]
+    python _selfhosted/integration.py qw5q_gold --restore 0123456789ab
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import pathlib
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from runcard import KERNELS
+
+SAMPLES_FACTOR = 16
+"""Kernel lengths are multiple of this number of samples."""
+ARCHIVE = "kernels"
+HISTORY = "kernels.history.jsonl"
+
+parser = argparse.ArgumentParser()
+parser.add_argument("names", type=str, nargs="+", help="Names of the platforms.")
+parser.add_argument(
+    "--nshots", type=int, default=10000, help="Shots averaged for each state."
+)
+parser.add_argument(
+    "--update",
+    action="store_true",
+    help="Save the computed kernels next to the platform runcards.",
+)
+parser.add_argument(
+    "--simulate",
+    action="store_true",
+    help="Replace the instruments with the offline simulator.",
+)
+parser.add_argument(
+    "--restore", type=str, default=None, help="Version of the kernels to restore."
+)
+
+
+def compute(
+    ground: np.ndarray, excited: np.ndarray, factor: int = SAMPLES_FACTOR
+) -> np.ndarray:
+    """Matched-filter kernel discriminating two states.
+
+    Args:
+        ground (np.ndarray): Complex raw traces of the ground state, averaged
+            (``(samples,)``) or single shots (``(shots, samples)``).
+        excited (np.ndarray): The same for the excited state.
+        factor (int): The kernel length is a multiple of this number.
+    """
+    ground, excited = np.asarray(ground), np.asarray(excited)
+    difference = np.atleast_2d(ground).mean(axis=0) - np.atleast_2d(excited).mean(0)
+    if ground.ndim > 1 and excited.ndim > 1:
+        variance = (np.var(ground, axis=0) + np.var(excited, axis=0)) / 2
+        difference = difference / np.maximum(variance, np.finfo(float).tiny)
+    length = len(difference) // factor * factor
+    kernel = np.conj(difference[:length])
+    scale = np.abs(kernel).max() if length > 0 else 0
+    return kernel / scale if scale > 0 else kernel
+
+
+@dataclass
+class KernelBank:
+    """Kernels of multiple qubits, stacked and zero-padded to a common
+    length."""
+
+    qubits: list
+    weights: np.ndarray
+    """Complex weights, with shape ``(qubits, samples)``."""
+
+    @classmethod
+    def from_kernels(cls, kernels: Dict) -> "KernelBank":
+        qubits = list(kernels)
+        length = max((len(kernel) for kernel in kernels.values()), default=0)
+        weights = np.zeros((len(qubits), length), dtype=np.complex128)
+        for row, kernel in zip(weights, kernels.values()):
+            row[: len(kernel)] = kernel
+        return cls(qubits, weights)
+
+    @classmethod
+    def from_platform(cls, platform) -> "KernelBank":
+        """Kernels loaded in the qubits of a platform."""
+        return cls.from_kernels(
+            {
+                name: qubit.kernel
+                for name, qubit in platform.qubits.items()
+                if qubit.kernel is not None
+            }
+        )
+
+    def integrate(self, traces: np.ndarray, qubits: Optional[list] = None):
+        """Integrate raw traces with the kernel of their qubit.
+
+        Args:
+            traces (np.ndarray): Complex traces with shape
+                ``(qubits, ..., samples)``, e.g. one per shot.
+            qubits (list): Qubit of each row of the traces, all the qubits of
+                the bank by default.
+
+        Returns:
+            The integrated values, with shape ``(qubits, ...)``.
+        """
+        qubits = self.qubits if qubits is None else qubits
+        weights = self.weights[[self.qubits.index(qubit) for qubit in qubits]]
+        samples = min(traces.shape[-1], weights.shape[-1])
+        flat = traces[..., :samples].reshape(len(qubits), -1, samples)
+        values = np.matmul(flat, weights[:, :samples, None])[..., 0]
+        return values.reshape(traces.shape[:-1])
+
+
+def version(kernels: Dict) -> str:
+    """Hash of the content of a set of kernels."""
+    digest = hashlib.sha256()
+    for qubit in sorted(kernels, key=json.dumps):
+        kernel = np.ascontiguousarray(kernels[qubit])
+        digest.update(json.dumps([qubit, kernel.dtype.str, kernel.shape]).encode())
+        digest.update(kernel.tobytes())
+    return digest.hexdigest()[:12]
+
+
+def _read(path: pathlib.Path) -> Dict:
+    if not path.exists():
+        return {}
+    with np.load(path) as npz:
+        return {json.loads(key): value for key, value in npz.items()}
+
+
+def _write(path: pathlib.Path, kernels: Dict):
+    """Write kernels to a ``.npz`` file atomically."""
+    buffer = io.BytesIO()
+    np.savez(buffer, **{json.dumps(qubit): value for qubit, value in kernels.items()})
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(buffer.getvalue())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def load(folder: pathlib.Path, version: Optional[str] = None) -> Dict:
+    """Current kernels of a platform, or an archived version."""
+    folder = pathlib.Path(folder)
+    if version is None:
+        return _read(folder / KERNELS)
+    return _read(folder / ARCHIVE / f"{version}.npz")
+
+
+def history(folder: pathlib.Path) -> List[dict]:
+    """Versions of the kernels of a platform, oldest first."""
+    path = pathlib.Path(folder) / HISTORY
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text().splitlines() if line]
+
+
+def _record(folder: pathlib.Path, kernels: Dict, qubits: list, message):
+    current = version(kernels)
+    archive = folder / ARCHIVE / f"{current}.npz"
+    if not archive.exists():
+        archive.parent.mkdir(exist_ok=True)
+        _write(archive, kernels)
+    _write(folder / KERNELS, kernels)
+    entry = {"timestamp": time.time(), "version": current, "qubits": qubits}
+    if message is not None:
+        entry["message"] = message
+    with open(folder / HISTORY, "a") as file:
+        file.write(json.dumps(entry) + "\n")
+    return current
+
+
+def save(folder: pathlib.Path, kernels: Dict, message: Optional[str] = None) -> str:
+    """Store new kernels of some qubits, keeping the other ones.
+
+    Returns the version of the stored set of kernels.
+    """
+    folder = pathlib.Path(folder)
+    merged = {**load(folder), **kernels}
+    return _record(folder, merged, list(kernels), message)
+
+
+def restore(folder: pathlib.Path, version: str, message: Optional[str] = None) -> str:
+    """Make an archived version the current kernels of a platform."""
+    folder = pathlib.Path(folder)
+    kernels = load(folder, version)
+    if len(kernels) == 0:
+        raise ValueError(f"Kernels version {version} not found in {folder}.")
+    return _record(folder, kernels, list(kernels), message or f"restore {version}")
+
+
+def acquire(
+    platform, qubits, nshots: int, relaxation_time: Optional[int] = None
+) -> Dict[object, Tuple[np.ndarray, np.ndarray]]:
+    """Averaged raw traces of the qubits prepared in the ground and excited
+    states, measured together."""
+    from batched import sweep
+    from qibolab import AcquisitionType, AveragingMode, ExecutionParameters
+    from qibolab.pulses import PulseSequence
+    from qibolab.sweeper import Parameter, Sweeper, SweeperType
+
+    sequence = PulseSequence()
+    rx_pulses = []
+    for qubit in qubits:
+        rx_pulse = platform.create_RX_pulse(qubit, start=0)
+        sequence.add(rx_pulse, platform.create_MZ_pulse(qubit, rx_pulse.finish))
+        rx_pulses.append(rx_pulse)
+    states = Sweeper(
+        Parameter.amplitude, np.array([0, 1]), rx_pulses, type=SweeperType.FACTOR
+    )
+    options = ExecutionParameters(
+        nshots=nshots,
+        relaxation_time=relaxation_time,
+        acquisition_type=AcquisitionType.RAW,
+        averaging_mode=AveragingMode.CYCLIC,
+    )
+    results = sweep(platform, sequence, options, states)
+    return {qubit: tuple(results[qubit]) for qubit in qubits}
+
+
+def main(names, nshots=10000, update=False, simulate=None, restore_version=None):
+    from platforms import BUILTIN, locate
+    from pool import lease
+    from simulator import Simulator
+
+    for name in names:
+        if restore_version is not None:
+            folder = locate(name)
+            print(f"{name}: restored kernels {restore(folder, restore_version)}")
+            continue
+        with lease(name, simulate) as platform:
+            traces = acquire(platform, platform.qubits, nshots)
+            simulated = any(
+                isinstance(instrument, Simulator)
+                for instrument in platform.instruments.values()
+            )
+        kernels = {qubit: compute(*pair) for qubit, pair in traces.items()}
+        print(f"{name}: kernels of {len(kernels)} qubits, version {version(kernels)}")
+        for qubit, kernel in kernels.items():
+            print(f"  {qubit}: {len(kernel)} samples")
+        if update and (name in BUILTIN or simulated):
+            print("  not saved, the platform is simulated")
+        elif update:
+            print(f"  saved as {save(locate(name), kernels, 'integration.py')}")
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    main(args.names, args.nshots, args.update, args.simulate or None, args.restore)
@@ -0,0 +1,293 @@
+"""Queue of the jobs executed on the platforms of a process.
+
+Jobs are functions of a connected platform, submitted with a priority::
+
+    future = queue.submit("qw5q_gold", lambda platform: ..., priority=10)
+    result = future.result()
+
+Each platform has its own worker thread, executing its jobs one at a time,
+lowest priority value first (as the ``priority`` fields of the
+``_monitoring/*.yml`` actions), in submission order for equal priorities.
+Different platforms run in parallel. Platforms are built when their jobs are
+submitted (see :meth:`pool.Pool.prepare`), since some of them can only be
+created in the main thread.
+
+When a job starts, all the queued jobs of the same platform with the same
+setup (simulation flag and optional ``setup`` key) join it in a batch, which
+runs within a single lease of the :mod:`pool`: the platform is connected and
+set up once for all of them.
+
+The queue keeps latency metrics for every platform (see :meth:`JobQueue.metrics`).
+The actions of a monitoring file can be executed through the queue with::
+
+    python _selfhosted/jobs.py _monitoring/qw5q.yml [--simulate]
+"""
+
+import argparse
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Hashable, List, Optional
+
+import numpy as np
+from pool import pool as default_pool
+from tracing import context, span
+
+parser = argparse.ArgumentParser()
+parser.add_argument("paths", type=str, nargs="+", help="Monitoring files.")
+parser.add_argument(
+    "--simulate",
+    action="store_true",
+    help="Replace the instruments with the offline simulator.",
+)
+
+
+@dataclass
+class Job:
+    platform: str
+    function: Callable
+    """Function executed with the connected platform as argument."""
+    priority: int = 0
+    """Jobs with lower values are executed first."""
+    name: Optional[str] = None
+    simulate: Optional[bool] = None
+    setup: Optional[Hashable] = None
+    """Jobs are batched only with jobs with the same setup."""
+    future: Future = field(default_factory=Future)
+    submitted: float = field(default_factory=time.monotonic)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+
+    @property
+    def key(self) -> tuple:
+        return (self.simulate, self.setup)
+
+    @property
+    def latency(self) -> Optional[float]:
+        """Time spent in the queue, in seconds."""
+        return None if self.started is None else self.started - self.submitted
+
+
+@dataclass
+class Metrics:
+    jobs: int = 0
+    failed: int = 0
+    batches: int = 0
+    latencies: List[float] = field(default_factory=list)
+    """Queue latency of every job, in seconds."""
+    busy: float = 0
+    """Time spent executing jobs, in seconds."""
+
+    def summary(self) -> dict:
+        latencies = np.array(self.latencies) if self.latencies else np.zeros(1)
+        return {
+            "jobs": self.jobs,
+            "failed": self.failed,
+            "batches": self.batches,
+            "latency_mean": float(latencies.mean()),
+            "latency_p95": float(np.percentile(latencies, 95)),
+            "latency_max": float(latencies.max()),
+            "busy": self.busy,
+        }
+
+
+class _Worker:
+    """Queue and thread of a single platform."""
+
+    def __init__(self, queue: "JobQueue", platform: str):
+        self.queue = queue
+        self.platform = platform
+        self.heap = []
+        self.metrics = Metrics()
+        self.thread = threading.Thread(
+            target=self.run, name=f"jobs-{platform}", daemon=True
+        )
+
+    def pop(self) -> Optional[List[Job]]:
+        """Next batch of jobs, or ``None`` when the queue is closed."""
+        with self.queue.condition:
+            while not self.heap and not self.queue.closed:
+                self.queue.condition.wait()
+            if not self.heap:
+                return None
+            batch, rest = [heapq.heappop(self.heap)], []
+            key = batch[0][-1].key
+            while self.heap and len(batch) < self.queue.max_batch:
+                entry = heapq.heappop(self.heap)
+                (batch if entry[-1].key == key else rest).append(entry)
+            for entry in rest:
+                heapq.heappush(self.heap, entry)
+            return [entry[-1] for entry in batch]
+
+    def run(self):
+        while True:
+            batch = self.pop()
+            if batch is None:
+                return
+            self.execute(batch)
+
+    def execute(self, batch: List[Job]):
+        self.metrics.batches += 1
+        try:
+            with self.queue.pool.lease(self.platform, batch[0].simulate) as platform:
+                for job in batch:
+                    self._run(job, platform)
+        except Exception as exception:
+            # the platform could not be leased
+            logging.exception(f"Batch of jobs on {self.platform} failed")
+            for job in batch:
+                if not job.future.done():
+                    self.metrics.failed += 1
+                    job.future.set_exception(exception)
+
+    def _run(self, job: Job, platform):
+        job.started = time.monotonic()
+        self.metrics.jobs += 1
+        self.metrics.latencies.append(job.latency)
+        if not job.future.set_running_or_notify_cancel():
+            return
+        try:
+            with context(platform=self.platform, job=job.name):
+                with span(job.name or "job", "acquisition"):
+                    result = job.function(platform)
+        except Exception as exception:
+            self.metrics.failed += 1
+            job.future.set_exception(exception)
+        else:
+            job.future.set_result(result)
+        finally:
+            job.finished = time.monotonic()
+            self.metrics.busy += job.finished - job.started
+
+
+class JobQueue:
+    """Priority queues of jobs, one per platform.
+
+    Args:
+        pool (:class:`pool.Pool`): Pool the platforms are leased from.
+        max_batch (int): Maximum number of jobs sharing a lease.
+    """
+
+    def __init__(self, pool=None, max_batch: int = 16):
+        self.pool = default_pool if pool is None else pool
+        self.max_batch = max_batch
+        self.workers: Dict[str, _Worker] = {}
+        self.condition = threading.Condition()
+        self.closed = False
+        self._counter = itertools.count()
+
+    def submit(
+        self,
+        platform: str,
+        function: Callable,
+        priority: int = 0,
+        name: Optional[str] = None,
+        simulate: Optional[bool] = None,
+        setup: Optional[Hashable] = None,
+    ) -> Future:
+        """Queue a job, returning the future of its result."""
+        self.pool.prepare(platform, simulate)
+        job = Job(platform, function, priority, name, simulate, setup)
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("Cannot submit jobs to a closed queue.")
+            worker = self.workers.get(platform)
+            if worker is None:
+                worker = self.workers[platform] = _Worker(self, platform)
+                worker.thread.start()
+            heapq.heappush(worker.heap, (priority, next(self._counter), job))
+            self.condition.notify_all()
+        return job.future
+
+    def pending(self, platform: Optional[str] = None) -> int:
+        """Number of queued jobs, of a platform or of all of them."""
+        with self.condition:
+            return sum(
+                len(worker.heap)
+                for name, worker in self.workers.items()
+                if platform in (None, name)
+            )
+
+    def metrics(self) -> Dict[str, dict]:
+        """Jobs, batches, queue latencies and busy time of every platform."""
+        return {name: w.metrics.summary() for name, w in self.workers.items()}
+
+    def close(self, wait: bool = True):
+        """Stop the workers once their queues are empty."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        if wait:
+            for worker in self.workers.values():
+                worker.thread.join()
+
+
+queue = JobQueue()
+"""Job queue of the current process."""
+submit = queue.submit
+
+
+def actions(path) -> List[dict]:
+    """Actions of a monitoring file, with the platform and qubits they act on."""
+    import yaml
+
+    with open(path) as file:
+        monitoring = yaml.safe_load(file)
+    return [
+        {
+            "platform": monitoring["platform"],
+            "qubits": action.get("qubits", monitoring.get("qubits")),
+            **action,
+        }
+        for action in monitoring["actions"]
+    ]
+
+
+def _operation(action: dict):
+    """Job executing a qibocal operation of a monitoring file."""
+    from qibocal.protocols.characterization import Operation
+
+    routine = Operation[action["operation"]].value
+
+    def run(platform):
+        params = routine.parameters_type.load(action.get("parameters", {}))
+        qubits = platform.qubits
+        if action["qubits"] is not None:
+            qubits = {qubit: platform.qubits[qubit] for qubit in action["qubits"]}
+        data, _ = routine.acquisition(params=params, platform=platform, qubits=qubits)
+        results, _ = routine.fit(data)
+        return results
+
+    return run
+
+
+def main(paths, simulate=None):
+    futures = {}
+    for path in paths:
+        for action in actions(path):
+            futures[action["platform"], action["id"]] = queue.submit(
+                action["platform"],
+                _operation(action),
+                priority=int(action.get("priority", 0)),
+                name=action["id"],
+                simulate=simulate,
+            )
+    for (platform, name), future in futures.items():
+        error = future.exception()
+        print(f"{platform} {name}: {'failed: ' + str(error) if error else 'done'}")
+    for platform, metrics in queue.metrics().items():
+        print(
+            f"{platform}: {metrics['jobs']} jobs in {metrics['batches']} batches, "
+            f"queue latency mean {metrics['latency_mean']:.2f}s "
+            f"p95 {metrics['latency_p95']:.2f}s max {metrics['latency_max']:.2f}s"
+        )
+    queue.close()
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    main(args.paths, args.simulate or None)
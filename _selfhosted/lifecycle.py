@@ -0,0 +1,257 @@
+"""Concurrent connection, setup, start and stop of the instruments.
+
+:meth:`qibolab.platform.Platform.connect` connects the instruments one after
+the other, such that bringing up a platform takes the sum of the times of
+all of them (the controller, the local oscillators, the TWPA pumps, ...).
+:func:`execute` runs a stage on all the instruments of a platform at once,
+each in its own thread with its own timeout, waiting only for the
+instruments it depends on (see :func:`dependencies`)::
+
+    connect(platform)  # as long as the slowest instrument
+    start(platform)
+    ...
+    stop(platform)
+    disconnect(platform)
+
+Instruments without the method of a stage skip it. From a running event
+loop, await :func:`execute` instead of the synchronous wrappers. A timeout
+raises a :class:`TimeoutError` naming the instrument, but cannot interrupt
+its driver: the thread running it finishes in the background. When an
+instrument fails to connect, the other ones are disconnected.
+
+The connection times of each instrument are printed with::
+
+    python _selfhosted/lifecycle.py qw5q_gold [--simulate]
+"""
+
+import argparse
+import asyncio
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Union
+
+from qibolab.instruments.abstract import Controller
+
+if TYPE_CHECKING:
+    from qibolab.platform import Platform
+
+STAGES = ("connect", "setup", "start", "stop", "disconnect")
+REVERSED = ("stop", "disconnect")
+"""Stages executed in the reverse order of the dependencies."""
+ARMING = ("start", "stop")
+"""Stages in which the controllers wait for the other instruments."""
+TIMEOUT = 120.0
+"""Default time allowed to each instrument for a stage, in seconds."""
+
+parser = argparse.ArgumentParser()
+parser.add_argument("names", type=str, nargs="+", help="Names of the platforms.")
+parser.add_argument(
+    "--simulate",
+    action="store_true",
+    help="Replace the instruments with the offline simulator.",
+)
+
+
+def _thread(method, **kwargs) -> asyncio.Future:
+    """Run a blocking method in a new thread.
+
+    Unlike :func:`asyncio.to_thread`, this also works while the interpreter
+    exits, when the pool disconnects the platforms.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def resolve(result, exception):
+        if not future.done():
+            if exception is None:
+                future.set_result(result)
+            else:
+                future.set_exception(exception)
+
+    def run():
+        try:
+            outcome = (method(**kwargs), None)
+        except BaseException as exception:
+            outcome = (None, exception)
+        try:
+            loop.call_soon_threadsafe(resolve, *outcome)
+        except RuntimeError:
+            # the loop is closed, after a timeout
+            pass
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+def dependencies(platform: "Platform", stage: str) -> Dict[str, Set[str]]:
+    """Instruments each instrument waits for during a stage.
+
+    Modules owned by a controller (the qblox cluster modules) are connected
+    through it, and wait for it. During :data:`ARMING` stages the controllers
+    also wait for the local oscillators and pumps, such that their tones are
+    on before the pulses are played. The dependencies are reversed for the
+    :data:`REVERSED` stages.
+    """
+    instruments = platform.instruments
+    graph = {name: set() for name in instruments}
+    controllers = [
+        name
+        for name, instrument in instruments.items()
+        if isinstance(instrument, Controller)
+    ]
+    for name in controllers:
+        modules = getattr(instruments[name], "modules", None)
+        owned = set(modules) & set(instruments) if isinstance(modules, dict) else set()
+        for module in owned:
+            graph[module].add(name)
+        if stage in ARMING:
+            graph[name].update(set(instruments) - set(controllers) - owned)
+    if stage in REVERSED:
+        reverse = {name: set() for name in instruments}
+        for name, required in graph.items():
+            for other in required:
+                reverse[other].add(name)
+        graph = reverse
+    return graph
+
+
+async def _execute(
+    platform: "Platform",
+    stage: str,
+    names: List[str],
+    timeouts: Dict[str, float],
+    settings: Optional[Dict[str, dict]] = None,
+) -> Dict[str, Union[float, BaseException]]:
+    """Execute a stage on some instruments, returning the time taken by each
+    of them, or the exception it raised."""
+    graph = dependencies(platform, stage)
+    tasks = {}
+
+    async def run(name):
+        for required in graph[name]:
+            if required in tasks:
+                await tasks[required]
+        method = getattr(platform.instruments[name], stage, None)
+        if stage == "setup":
+            if settings is None or name not in settings:
+                return 0.0
+            kwargs = settings[name]
+        else:
+            kwargs = {}
+        if method is None:
+            return 0.0
+        timeout = timeouts.get(name, TIMEOUT)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(_thread(method, **kwargs), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"{stage} of {name} took more than {timeout} s.")
+        return time.perf_counter() - start
+
+    for name in names:
+        tasks[name] = asyncio.ensure_future(run(name))
+    results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+    return dict(zip(tasks, results))
+
+
+async def execute(
+    platform: "Platform",
+    stage: str,
+    timeouts: Optional[Dict[str, float]] = None,
+    settings: Optional[Dict[str, dict]] = None,
+) -> Dict[str, float]:
+    """Execute a stage on all the instruments of a platform concurrently.
+
+    If an instrument fails to connect, or times out, the instruments already
+    connected are disconnected before raising its error.
+
+    Args:
+        platform (:class:`qibolab.platform.Platform`): Platform whose
+            instruments are executed.
+        stage (str): One of :data:`STAGES`.
+        timeouts (dict): Timeout of some instruments, in seconds, instead of
+            :data:`TIMEOUT`.
+        settings (dict): For the ``setup`` stage, the settings of the
+            instruments to set up. The other instruments are skipped.
+
+    Returns:
+        The time taken by each instrument, in seconds.
+    """
+    if stage not in STAGES:
+        raise ValueError(f"Unknown stage {stage}, expected one of {STAGES}.")
+    timeouts = {} if timeouts is None else timeouts
+    results = await _execute(
+        platform, stage, list(platform.instruments), timeouts, settings
+    )
+    errors = [r for r in results.values() if isinstance(r, BaseException)]
+    if len(errors) == 0:
+        return results
+    if stage == "connect":
+        # the platform is not connected, and would not be disconnected
+        connected = [
+            name for name, r in results.items() if not isinstance(r, BaseException)
+        ]
+        rollback = await _execute(platform, "disconnect", connected, timeouts)
+        for name, error in rollback.items():
+            if isinstance(error, BaseException):
+                logging.error(f"Disconnection of {name} failed: {error}")
+    raise errors[0]
+
+
+def connect(platform: "Platform", timeouts: Optional[Dict[str, float]] = None):
+    """Connect all the instruments of a platform."""
+    if platform.is_connected:
+        return {}
+    durations = asyncio.run(execute(platform, "connect", timeouts))
+    platform.is_connected = True
+    return durations
+
+
+def setup(
+    platform: "Platform",
+    settings: Dict[str, dict],
+    timeouts: Optional[Dict[str, float]] = None,
+):
+    """Apply new settings to some instruments of a platform."""
+    return asyncio.run(execute(platform, "setup", timeouts, settings))
+
+
+def start(platform: "Platform", timeouts: Optional[Dict[str, float]] = None):
+    return asyncio.run(execute(platform, "start", timeouts))
+
+
+def stop(platform: "Platform", timeouts: Optional[Dict[str, float]] = None):
+    return asyncio.run(execute(platform, "stop", timeouts))
+
+
+def disconnect(platform: "Platform", timeouts: Optional[Dict[str, float]] = None):
+    """Disconnect all the instruments of a platform."""
+    if not platform.is_connected:
+        return {}
+    durations = asyncio.run(execute(platform, "disconnect", timeouts))
+    platform.is_connected = False
+    return durations
+
+
+def main(names, simulate=None):
+    from pool import _folder, build
+    from simulator import enabled
+
+    for name in names:
+        platform = build(_folder(name), enabled(name, simulate))
+        begin = time.perf_counter()
+        durations = connect(platform)
+        total = time.perf_counter() - begin
+        print(
+            f"{name}: connected in {total:.2f}s, "
+            f"{sum(durations.values()):.2f}s one after the other"
+        )
+        for instrument, duration in sorted(durations.items(), key=lambda x: -x[1]):
+            print(f"  {instrument}: {duration:.2f}s")
+        disconnect(platform)
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    main(args.names, args.simulate or None)
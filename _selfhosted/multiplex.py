@@ -0,0 +1,388 @@
+"""Frequency multiplexing of the readout.
+
+The qubits read out through the same line share its local oscillator, and
+are measured together as long as their tones can be told apart. This tool
+chooses the local oscillator frequency of every readout line, and the line of
+every qubit when a feedline is connected to multiple readout ports, such
+that:
+
+- the intermediate frequency of every tone is within the bandwidth of the
+  line, and far enough from the local oscillator leakage,
+- tones measured together are separated by at least the crosstalk spacing
+  (or twice the inverse of the readout duration, if larger), and so are
+  their images with respect to the local oscillator,
+- no more than ``max_tones`` tones are measured together on a line.
+
+Tones that cannot be measured together are split in sequential readout
+rounds, whose number is minimized before maximizing the distance of the
+intermediate frequencies from the bandwidth limits. The frequencies and
+durations of the tones are the ones of the ``MZ`` native gates.
+
+Feedlines with multiple readout ports, and the limits of each of them, are
+described in the ``readout`` section of ``wiring.json``::
+
+    "readout": {
+        "L3-25": {"lines": [["L3-25_a", "L2-5_a"], ["L3-25_b", "L2-5_b"]], "max_tones": 6}
+    }
+
+where each line is a pair of readout and feedback channels. Every other
+readout channel is a feedline on its own. Usage::
+
+    python _selfhosted/multiplex.py qw5q_gold [--update]
+"""
+
+import argparse
+import itertools
+import json
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from platforms import locate
+from update import get, pointer, update_runcard
+from wiring import Wiring, load_wiring
+
+BANDWIDTH = 500e6
+"""Maximum intermediate frequency, in Hz."""
+MIN_IF = 20e6
+"""Minimum intermediate frequency, to stay away from the LO leakage."""
+SPACING = 10e6
+"""Minimum separation of tones measured together, in Hz."""
+
+parser = argparse.ArgumentParser()
+parser.add_argument("names", type=str, nargs="+", help="Names of the platforms.")
+parser.add_argument(
+    "--update",
+    action="store_true",
+    help="Write the local oscillators and readout lines to the platforms.",
+)
+
+
+@dataclass
+class Tone:
+    qubit: object
+    frequency: float
+    duration: float
+    """Readout duration, in ns."""
+
+
+@dataclass
+class Feedline:
+    name: str
+    lines: List[Tuple[str, Optional[str]]]
+    """Readout and feedback channels connected to the feedline."""
+    bandwidth: float = BANDWIDTH
+    min_if: float = MIN_IF
+    spacing: float = SPACING
+    max_tones: Optional[int] = None
+    """Maximum number of tones measured together on a line."""
+
+    def separation(self, first: Tone, second: Tone) -> float:
+        duration = min(first.duration, second.duration)
+        return max(self.spacing, 2 / (duration * 1e-9))
+
+    def conflict(self, first: Tone, second: Tone, lo: Optional[float]) -> bool:
+        """Whether two tones cannot be measured together."""
+        spacing = self.separation(first, second)
+        if abs(first.frequency - second.frequency) < spacing:
+            return True
+        if lo is None:
+            return False
+        return abs(first.frequency + second.frequency - 2 * lo) < spacing
+
+    def readable(self, tone: Tone, lo: Optional[float]) -> bool:
+        if lo is None:
+            return True
+        return self.min_if <= abs(tone.frequency - lo) <= self.bandwidth
+
+    def margin(self, tone: Tone, lo: Optional[float]) -> float:
+        if lo is None:
+            return np.inf
+        offset = abs(tone.frequency - lo)
+        return min(offset - self.min_if, self.bandwidth - offset)
+
+    def rounds(self, tones: List[Tone], lo: Optional[float]) -> List[List[Tone]]:
+        """Split the tones in groups without conflicts, greedily."""
+        groups = []
+        for tone in sorted(tones, key=lambda tone: tone.frequency):
+            for group in groups:
+                full = self.max_tones is not None and len(group) >= self.max_tones
+                if not full and not any(self.conflict(tone, t, lo) for t in group):
+                    group.append(tone)
+                    break
+            else:
+                groups.append([tone])
+        return groups
+
+    def candidates(self, tones: List[Tone], current: Optional[float]) -> List[float]:
+        """Local oscillator frequencies worth trying."""
+        frequencies = sorted(tone.frequency for tone in tones)
+        candidates = [] if current is None else [current]
+        for f in frequencies:
+            candidates += [f - self.bandwidth, f + self.bandwidth]
+            candidates += [f - self.min_if, f + self.min_if]
+        for low, high in zip(frequencies, frequencies[1:]):
+            middle = (low + high) / 2
+            candidates += [middle - self.spacing, middle + self.spacing]
+        low, high = frequencies[-1] - self.bandwidth, frequencies[0] + self.bandwidth
+        if low < high:
+            candidates += list(np.arange(low, high, self.spacing / 2))
+        return [round(candidate, -3) for candidate in candidates]
+
+
+@dataclass
+class Line:
+    readout: str
+    feedback: Optional[str]
+    lo: Optional[float]
+    """Local oscillator frequency, ``None`` if it is not set by the runcard."""
+    tones: List[Tone] = field(default_factory=list)
+    rounds: List[List[Tone]] = field(default_factory=list)
+    unreadable: List[Tone] = field(default_factory=list)
+
+
+@dataclass
+class Plan:
+    lines: List[Line]
+
+    @property
+    def rounds(self) -> List[list]:
+        """Qubits measured together, in every readout round."""
+        rounds = []
+        for line in self.lines:
+            for index, group in enumerate(line.rounds):
+                if index == len(rounds):
+                    rounds.append([])
+                rounds[index] += [tone.qubit for tone in group]
+        return rounds
+
+    @property
+    def unreadable(self) -> list:
+        return [tone.qubit for line in self.lines for tone in line.unreadable]
+
+
+def tones(runcard: dict) -> Dict:
+    """Readout tones of the qubits of a runcard."""
+    result = {}
+    characterization = runcard["characterization"]["single_qubit"]
+    for key, gates in runcard["native_gates"]["single_qubit"].items():
+        qubit = json.loads(key)
+        mz = gates.get("MZ", {})
+        frequency = mz.get("frequency", characterization[key].get("readout_frequency"))
+        result[qubit] = Tone(qubit, float(frequency), float(mz.get("duration", 1000)))
+    return result
+
+
+def lo_pointer(wiring: Wiring, runcard: dict, channel: str) -> Optional[str]:
+    """Pointer to the local oscillator frequency of a channel in the runcard."""
+    spec = wiring.channels[channel]
+    settings = runcard.get("instruments", {})
+    port = spec.get("port") or []
+    if len(port) > 1 and isinstance(port[1], str):
+        if "lo_frequency" in settings.get(port[0], {}).get(port[1], {}):
+            return pointer("instruments", port[0], port[1], "lo_frequency")
+    oscillator = spec.get("local_oscillator")
+    if "frequency" in settings.get(oscillator, {}):
+        return pointer("instruments", oscillator, "frequency")
+    return None
+
+
+def _value(runcard: dict, path: Optional[str]) -> Optional[float]:
+    if path is None:
+        return None
+    return float(get(runcard, path))
+
+
+def feedlines(wiring: Wiring, qubits) -> List[Feedline]:
+    """Feedlines of a platform, with the qubits that can be read through
+    them."""
+    result = []
+    shared = set()
+    for name, spec in wiring.readout.items():
+        lines = [tuple(line) for line in spec["lines"]]
+        shared.update(readout for readout, _ in lines)
+        options = {k: v for k, v in spec.items() if k != "lines"}
+        result.append(Feedline(name, lines, **options))
+    assignments = wiring.assignments("qubits", qubits)
+    for readout in dict.fromkeys(lines["readout"] for lines in assignments.values()):
+        if readout not in shared:
+            result.append(Feedline(readout, [(readout, None)]))
+    return result
+
+
+def _score(feedline: Feedline, lines: List[Line], los: list, moves: int = 0):
+    """Readable tones, rounds and margins of the lines of a feedline.
+
+    Margins larger than the tone spacing are considered good enough, and
+    the lines closest to the current configuration are preferred.
+    """
+    readable = sum(len(line.tones) - len(line.unreadable) for line in lines)
+    rounds = max(len(line.rounds) for line in lines)
+    margin = min(
+        (
+            feedline.margin(tone, line.lo)
+            for line in lines
+            for group in line.rounds
+            for tone in group
+        ),
+        default=np.inf,
+    )
+    deviation = sum(
+        abs(line.lo - lo)
+        for line, lo in zip(lines, los)
+        if line.lo is not None and lo is not None
+    )
+    return (
+        readable,
+        -rounds,
+        min(margin, feedline.spacing),
+        -moves,
+        -deviation,
+        margin,
+    )
+
+
+def _place(feedline: Feedline, line: Line):
+    """Choose the local oscillator of a line for its tones."""
+    candidates = [line.lo]
+    if line.lo is not None and len(line.tones) > 0:
+        candidates = feedline.candidates(line.tones, line.lo)
+    best = None
+    for lo in candidates:
+        readable = [tone for tone in line.tones if feedline.readable(tone, lo)]
+        unreadable = [tone for tone in line.tones if tone not in readable]
+        trial = Line(line.readout, line.feedback, lo, line.tones)
+        trial.rounds, trial.unreadable = feedline.rounds(readable, lo), unreadable
+        score = _score(feedline, [trial], [line.lo])
+        if best is None or score > best[0]:
+            best = (score, trial)
+    return best[1]
+
+
+def optimize(
+    feedline: Feedline,
+    tones: List[Tone],
+    los: List[Optional[float]],
+    current: Optional[Dict] = None,
+):
+    """Distribute the tones of a feedline among its lines, in contiguous
+    frequency blocks, and choose the local oscillator of each line.
+
+    Args:
+        feedline (Feedline): Feedline the tones are read through.
+        tones (list): Tones of the qubits connected to the feedline.
+        los (list): Current local oscillator frequencies of its lines.
+        current (dict): Current readout channel of each qubit.
+    """
+    current = {} if current is None else current
+    tones = sorted(tones, key=lambda tone: tone.frequency)
+    best = None
+    nlines = len(feedline.lines)
+    for cuts in itertools.combinations_with_replacement(
+        range(len(tones) + 1), nlines - 1
+    ):
+        bounds = (0,) + cuts + (len(tones),)
+        lines = [
+            _place(feedline, Line(readout, feedback, lo, tones[start:end]))
+            for (readout, feedback), lo, start, end in zip(
+                feedline.lines, los, bounds, bounds[1:]
+            )
+        ]
+        moves = sum(
+            current.get(tone.qubit, line.readout) != line.readout
+            for line in lines
+            for tone in line.tones
+        )
+        score = _score(feedline, lines, los, moves)
+        if best is None or score > best[0]:
+            best = (score, lines)
+    return best[1]
+
+
+def plan(wiring: Wiring, runcard: dict, **options) -> Plan:
+    """Readout lines, local oscillators and rounds of a platform.
+
+    Args:
+        wiring (Wiring): Wiring of the platform.
+        runcard (dict): Runcard of the platform.
+        options: Default limits of the feedlines (see :class:`Feedline`).
+    """
+    qubit_tones = tones(runcard)
+    assignments = wiring.assignments("qubits", qubit_tones)
+    lines = []
+    for feedline in feedlines(wiring, qubit_tones):
+        for key, value in options.items():
+            if key not in wiring.readout.get(feedline.name, {}):
+                setattr(feedline, key, value)
+        readouts = [readout for readout, _ in feedline.lines]
+        connected = [
+            qubit_tones[qubit]
+            for qubit, assignment in assignments.items()
+            if assignment.get("readout") in readouts
+        ]
+        los = [_value(runcard, lo_pointer(wiring, runcard, r)) for r in readouts]
+        current = {
+            qubit: assignment.get("readout")
+            for qubit, assignment in assignments.items()
+        }
+        lines += optimize(feedline, connected, los, current)
+    return Plan(lines)
+
+
+def updates(plan: Plan, wiring: Wiring, runcard: dict) -> Dict[str, float]:
+    """Runcard values changed by a plan, keyed by their JSON pointer."""
+    values = {}
+    for line in plan.lines:
+        path = lo_pointer(wiring, runcard, line.readout)
+        if path is not None and line.lo != _value(runcard, path):
+            values[path] = int(line.lo)
+    return values
+
+
+def rewire(plan: Plan, wiring: Wiring) -> bool:
+    """Move the qubits to the lines chosen by a plan, returning whether the
+    wiring changed."""
+    changed = False
+    assignments = wiring.assignments("qubits", wiring.qubits)
+    for line in plan.lines:
+        if line.feedback is None:
+            continue
+        for tone in line.tones:
+            lines = {"readout": line.readout, "feedback": line.feedback}
+            current = assignments.get(tone.qubit, {})
+            if any(current.get(key) != value for key, value in lines.items()):
+                wiring.qubits.setdefault(tone.qubit, {}).update(lines)
+                changed = True
+    return changed
+
+
+def _ghz(frequency: Optional[float]) -> str:
+    return "-" if frequency is None else f"{frequency / 1e9:.3f} GHz"
+
+
+def main(names, update=False):
+    for name in names:
+        folder = locate(name)
+        wiring = Wiring.load(load_wiring(folder).dump())
+        runcard = json.loads((folder / "parameters.json").read_text())
+        result = plan(wiring, runcard)
+        print(f"{name}: {len(result.rounds)} readout rounds")
+        for line in result.lines:
+            path = lo_pointer(wiring, runcard, line.readout)
+            current = _ghz(_value(runcard, path))
+            qubits = sorted((tone.qubit for tone in line.tones), key=str)
+            print(f"  {line.readout}: LO {current} -> {_ghz(line.lo)}, qubits {qubits}")
+        for index, group in enumerate(result.rounds):
+            print(f"  round {index}: {group}")
+        if len(result.unreadable) > 0:
+            print(f"  unreadable: {result.unreadable}")
+
+        if update:
+            update_runcard(folder, updates(result, wiring, runcard), "multiplex.py")
+            if rewire(result, wiring):
+                wiring.save(folder)
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    main(args.names, args.update)
@@ -0,0 +1,122 @@
+"""Locate and build the platforms defined in this repository.
+
+Platforms are listed by looking for ``platform.py`` files, without
+importing them, so that neither qibolab nor any instrument driver is loaded
+unless a platform is actually created.
+
+Platforms can be created with their instruments replaced by the offline
+simulator of :mod:`simulator`, keeping the same channels and qubits.
+"""
+
+import importlib.util
+import os
+import pathlib
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+from wiring import WIRING
+
+if TYPE_CHECKING:
+    from qibolab.platform import Platform
+
+ROOT = pathlib.Path(__file__).parents[1]
+PLATFORM = "platform.py"
+RUNCARD = "parameters.json"
+KERNELS = "kernels.npz"
+BUILTIN = ("dummy", "dummy_couplers")
+"""Platforms provided by qibolab itself, which do not live in a folder."""
+
+_cache: Dict[Tuple[pathlib.Path, tuple, bool], "Platform"] = {}
+
+
+def platforms_paths():
+    """Folders containing platforms, as defined by ``QIBOLAB_PLATFORMS``.
+
+    The repository root is used when the environment variable is not set.
+    """
+    paths = os.environ.get("QIBOLAB_PLATFORMS")
+    if paths is None:
+        return [ROOT]
+    return [pathlib.Path(path) for path in paths.split(os.pathsep) if path]
+
+
+def list_platforms() -> Dict[str, pathlib.Path]:
+    """Map the name of every available platform to its folder."""
+    platforms = {}
+    for path in reversed(platforms_paths()):
+        for platform in path.glob(f"*/{PLATFORM}"):
+            platforms[platform.parent.name] = platform.parent.resolve()
+    return dict(sorted(platforms.items()))
+
+
+def locate(name) -> pathlib.Path:
+    """Folder of the platform with the given name or path."""
+    path = pathlib.Path(name)
+    if (path / PLATFORM).exists():
+        return path.resolve()
+    try:
+        return list_platforms()[str(name)]
+    except KeyError:
+        raise ValueError(f"Platform {name} does not exist.")
+
+
+def stamp(folder: pathlib.Path) -> tuple:
+    """Modification times of the files a platform is built from."""
+    return tuple(
+        (folder / filename).stat().st_mtime_ns if (folder / filename).exists() else None
+        for filename in (PLATFORM, RUNCARD, KERNELS, WIRING)
+    )
+
+
+def load(folder: pathlib.Path) -> "Platform":
+    """Build the platform defined in the given folder."""
+    spec = importlib.util.spec_from_file_location("platform", folder / PLATFORM)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.create()
+
+
+def create_platform(name, simulate: Optional[bool] = None) -> "Platform":
+    """Create a platform, reusing the one already built in this process.
+
+    Platforms are cached by folder and modification time of the files
+    they are built from, so that editing the runcard invalidates the cached
+    object.
+
+    Args:
+        name (str): Platform name or folder.
+        simulate (bool): Replace the instruments with the offline simulator.
+            By default this is controlled by the ``QRC_SIMULATE`` environment
+            variable (see :func:`simulator.enabled`).
+    """
+    from simulator import enabled
+
+    simulated = enabled(name, simulate)
+    if name in BUILTIN:
+        from qibolab import create_platform as _create_platform
+
+        platform = _create_platform(name)
+        return _simulate(platform) if simulated else platform
+
+    folder = locate(name)
+    key = (folder, stamp(folder), simulated)
+    if key not in _cache:
+        for cached in [
+            cached
+            for cached in _cache
+            if cached[0] == folder and cached[2] == simulated
+        ]:
+            del _cache[cached]
+        platform = load(folder)
+        _cache[key] = _simulate(platform) if simulated else platform
+    return _cache[key]
+
+
+def _simulate(platform: "Platform") -> "Platform":
+    from simulator import simulate
+
+    return simulate(platform)
+
+
+def clear_cache():
+    """Drop all the platforms built so far."""
+    _cache.clear()
@@ -0,0 +1,235 @@
+"""Pool of connected platforms, shared by the runs of a process.
+
+Connecting to the instruments (opening the LabOne Q session, finding the
+qblox modules, ...) and setting them up takes tens of seconds, while the
+calibration jobs of a platform only need exclusive access to it::
+
+    with pool.lease("qw5q_gold") as platform:
+        platform.execute_pulse_sequence(sequence, options)
+
+The first lease of a platform connects and starts its instruments,
+concurrently (see :mod:`lifecycle`). The following leases reuse the open
+connections. When the files of the platform change, e.g. because a
+calibration updated the runcard, the platform is rebuilt but its instruments
+and channels are kept: only the qubit, pair and coupler parameters are
+replaced, and the instrument settings of the runcard that changed are
+applied again. Changes in the wiring (instruments, their addresses, the
+channels of the qubits, their ports or local oscillators) require a new
+connection.
+
+Leased platforms stay connected until :meth:`Pool.close` is called, which
+happens at the latest when the interpreter exits.
+"""
+
+import atexit
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, Optional
+
+import lifecycle
+from platforms import BUILTIN, RUNCARD, load, locate, stamp
+from qibolab.qubits import CHANNEL_NAMES
+from shadow import batch, install
+from tracing import instrument, span
+
+if TYPE_CHECKING:
+    from qibolab.platform import Platform
+
+
+@dataclass
+class Entry:
+    platform: Optional["Platform"] = None
+    stamp: Optional[tuple] = None
+    """Modification times of the files the platform was built from."""
+    settings: Dict[str, dict] = field(default_factory=dict)
+    """Instrument settings applied to the connected instruments."""
+    lock: threading.RLock = field(default_factory=threading.RLock)
+    """Held by the current lease."""
+    connections: int = 0
+    """Number of times the platform was connected."""
+    leases: int = 0
+    prepared: Optional[tuple] = None
+    """Stamp and platform built by :meth:`Pool.prepare`, not used yet."""
+
+
+def wiring(platform: "Platform") -> tuple:
+    """Instruments and channels of a platform, which cannot change without
+    reconnecting."""
+    instruments = tuple(
+        (name, type(instrument).__name__, getattr(instrument, "address", None))
+        for name, instrument in platform.instruments.items()
+    )
+    channels = tuple(
+        (name, tuple(_channel(getattr(element, line)) for line in lines))
+        for elements, lines in (
+            (platform.qubits, CHANNEL_NAMES),
+            (platform.couplers, ("flux",)),
+        )
+        for name, element in elements.items()
+    )
+    return instruments, channels
+
+
+def _channel(channel) -> Optional[tuple]:
+    """Name of a channel, of its port and of its local oscillator."""
+    if channel is None:
+        return None
+    port = channel.port
+    oscillator = channel.local_oscillator
+    return (
+        channel.name,
+        None if port is None else (type(port).__name__, getattr(port, "name", None)),
+        None if oscillator is None else oscillator.name,
+    )
+
+
+def settings(folder) -> Dict[str, dict]:
+    """Instrument settings of a runcard."""
+    from runcard import load_runcard
+
+    if folder in BUILTIN or not (folder / RUNCARD).exists():
+        return {}
+    return load_runcard(folder).get("instruments", {})
+
+
+def _folder(name):
+    return name if name in BUILTIN else locate(name)
+
+
+def build(folder, simulated: bool) -> "Platform":
+    """Build a platform, not cached by :func:`platforms.create_platform`.
+
+    The qblox controller installs a SIGTERM handler when created, so qblox
+    platforms can only be built in the main thread (see :meth:`Pool.prepare`).
+    """
+    from simulator import simulate
+
+    if folder in BUILTIN:
+        from qibolab import create_platform
+
+        platform = create_platform(folder)
+    else:
+        platform = load(folder)
+    return simulate(platform) if simulated else platform
+
+
+def refresh(platform: "Platform", fresh: "Platform"):
+    """Replace the parameters of a connected platform with the ones of a
+    platform with the same wiring, freshly built from its runcard."""
+    for kind, lines in (("qubits", CHANNEL_NAMES), ("couplers", ("flux",))):
+        live = getattr(platform, kind)
+        for name, element in getattr(fresh, kind).items():
+            for line in lines:
+                if getattr(element, line, None) is not None:
+                    setattr(element, line, getattr(live[name], line))
+    platform.qubits = fresh.qubits
+    platform.couplers = fresh.couplers
+    platform.pairs = fresh.pairs
+    platform.settings = fresh.settings
+    platform.topology = fresh.topology
+
+
+class Pool:
+    """Connected platforms, leased to one user at a time."""
+
+    def __init__(self):
+        self.entries: Dict[tuple, Entry] = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, key) -> Entry:
+        with self._lock:
+            return self.entries.setdefault(key, Entry())
+
+    def prepare(self, name, simulate: Optional[bool] = None):
+        """Build a platform for its next lease, if its files changed.
+
+        Leases taken outside of the main thread (e.g. by the :mod:`jobs`
+        workers) use the platform prepared in the main thread, instead of
+        building it themselves.
+        """
+        from simulator import enabled
+
+        folder = _folder(name)
+        simulated = enabled(name, simulate)
+        entry = self._entry((folder, simulated))
+        current = () if name in BUILTIN else stamp(folder)
+        prepared = entry.prepared
+        if entry.stamp == current or (prepared is not None and prepared[0] == current):
+            return
+        entry.prepared = (current, build(folder, simulated))
+
+    @contextmanager
+    def lease(self, name, simulate: Optional[bool] = None):
+        """Exclusive access to a connected platform.
+
+        Args:
+            name (str): Platform name or folder.
+            simulate (bool): Replace the instruments with the offline simulator
+                (see :func:`platforms.create_platform`).
+        """
+        from simulator import enabled
+
+        folder = _folder(name)
+        simulated = enabled(name, simulate)
+        entry = self._entry((folder, simulated))
+        with entry.lock:
+            current = () if name in BUILTIN else stamp(folder)
+            if entry.stamp != current:
+                prepared, entry.prepared = entry.prepared, None
+                if prepared is not None and prepared[0] == current:
+                    fresh = prepared[1]
+                else:
+                    fresh = build(folder, simulated)
+                self._update(entry, fresh, settings(folder))
+                entry.stamp = current
+            entry.leases += 1
+            yield entry.platform
+
+    def _update(self, entry: Entry, fresh: "Platform", new: Dict[str, dict]):
+        platform = entry.platform
+        connected = platform is not None and platform.is_connected
+        if connected and wiring(platform) == wiring(fresh):
+            refresh(platform, fresh)
+            for name, values in new.items():
+                if entry.settings.get(name) != values:
+                    instrument_ = platform.instruments[name]
+                    with span("setup", instrument=name, platform=platform.name):
+                        with batch(instrument_):
+                            instrument_.setup(**values)
+            entry.settings = new
+            return
+
+        if platform is not None:
+            self._disconnect(platform)
+        entry.platform = instrument(install(fresh))
+        entry.settings = new
+        # the instruments are connected and started concurrently
+        with span("connect", platform=fresh.name):
+            lifecycle.connect(fresh)
+        entry.connections += 1
+        with span("start", platform=fresh.name):
+            lifecycle.start(fresh)
+
+    def _disconnect(self, platform: "Platform"):
+        with span("stop", platform=platform.name):
+            lifecycle.stop(platform)
+        with span("disconnect", platform=platform.name):
+            lifecycle.disconnect(platform)
+
+    def close(self, name=None):
+        """Disconnect the given platform, or all of them."""
+        folder = None if name is None else _folder(name)
+        with self._lock:
+            keys = [key for key in self.entries if folder in (None, key[0])]
+            entries = [self.entries.pop(key) for key in keys]
+        for entry in entries:
+            with entry.lock:
+                if entry.platform is not None:
+                    self._disconnect(entry.platform)
+
+
+pool = Pool()
+"""Pool of the current process."""
+lease = pool.lease
+atexit.register(pool.close)
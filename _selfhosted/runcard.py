@@ -0,0 +1,419 @@
+"""Compiled, memory-mapped version of the platform runcards.
+
+The ``parameters.json`` runcard and the ``kernels.npz`` integration weights
+of a platform are compiled in a single ``parameters.bin`` file, stored in the
+same folder, made of a small JSON header followed by raw buffers aligned to
+:data:`ALIGNMENT` bytes:
+
+- the qubit (and coupler) characterization and the single qubit native gates
+  are stored as typed structured arrays, one record per qubit or gate,
+- the kernels are stored as raw arrays,
+- whatever cannot be represented as a typed array (e.g. the two-qubit gates)
+  is kept as JSON in the header.
+
+Loading maps the file in memory and returns read-only views on the buffers,
+without any copy. The compiled file is rebuilt automatically whenever its
+sources change.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import pathlib
+import shutil
+import tempfile
+from numbers import Integral, Real
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+RUNCARD = "parameters.json"
+KERNELS = "kernels.npz"
+COMPILED = "parameters.bin"
+MAGIC = b"QRCRUNC\x02"
+ALIGNMENT = 64
+
+TABLES = {
+    "characterization.single_qubit": 1,
+    "characterization.coupler": 1,
+    "native_gates.single_qubit": 2,
+    "native_gates.coupler": 2,
+}
+"""Runcard sections stored as typed arrays, with their nesting depth."""
+
+_PLACEHOLDER = "$table"
+
+_loaded: Dict[pathlib.Path, "CompiledRuncard"] = {}
+
+
+def _sources(folder: pathlib.Path) -> dict:
+    """Modification time and size of the files the compiled runcard depends
+    on."""
+    sources = {}
+    for filename in (RUNCARD, KERNELS):
+        path = folder / filename
+        if path.exists():
+            stat = path.stat()
+            sources[filename] = [stat.st_mtime_ns, stat.st_size]
+    return sources
+
+
+def _kind(value):
+    """Array type required to store a single runcard value, if any."""
+    if isinstance(value, bool):
+        return "?"
+    if isinstance(value, Integral):
+        return "i8"
+    if isinstance(value, Real):
+        return "f8"
+    if isinstance(value, str):
+        return "U"
+    if isinstance(value, list) and len(value) > 0:
+        kinds = {_kind(element) for element in value}
+        if kinds <= {"i8", "f8"}:
+            return ("f8" if "f8" in kinds else "i8", len(value))
+    return None
+
+
+def _field_dtype(values):
+    """Common array type for all the values of a field, or ``None``."""
+    kinds = {_kind(value) for value in values}
+    if None in kinds:
+        return None
+    if kinds <= {"i8", "f8"}:
+        return "f8" if "f8" in kinds else "i8"
+    if len(kinds) == 1:
+        kind = kinds.pop()
+        if kind == "U":
+            return f"U{max(1, max(len(value) for value in values))}"
+        return kind
+    shapes = {kind[1] for kind in kinds if isinstance(kind, tuple)}
+    if all(isinstance(kind, tuple) for kind in kinds) and len(shapes) == 1:
+        return ("f8", shapes.pop())
+    return None
+
+
+def _integers(values) -> Optional[list]:
+    """Which of the values stored in a float field are integers, if any.
+
+    Lists are described element by element.
+    """
+
+    def integer(value):
+        return isinstance(value, Integral) and not isinstance(value, bool)
+
+    flags = [
+        [integer(e) for e in value] if isinstance(value, list) else integer(value)
+        for value in values
+    ]
+    if any(any(flag) if isinstance(flag, list) else flag for flag in flags):
+        return flags
+    return None
+
+
+def _flatten(section: dict, depth: int) -> Tuple[List[list], List[dict]]:
+    """Flatten a nested runcard section to keys and records."""
+    if depth == 0:
+        return [[]], [section]
+    keys, records = [], []
+    for key, value in section.items():
+        subkeys, subrecords = _flatten(value, depth - 1)
+        keys.extend([key] + subkey for subkey in subkeys)
+        records.extend(subrecords)
+    return keys, records
+
+
+def _compile_table(section: dict, depth: int):
+    """Convert a runcard section to a structured array.
+
+    Returns the header describing the table, the structured array and the
+    mask of the fields present in each record.
+    """
+    keys, records = _flatten(section, depth)
+    names = list(dict.fromkeys(name for record in records for name in record))
+    fields, extras, integers = [], {}, {}
+    for name in names:
+        values = [record[name] for record in records if name in record]
+        dtype = _field_dtype(values)
+        if dtype is None:
+            extras[name] = [record.get(name) for record in records]
+            continue
+        fields.append((name,) + ((dtype,) if isinstance(dtype, str) else dtype))
+        if "f8" in dtype:
+            # integers stored as floats are restored when loading
+            flags = _integers([record.get(name) for record in records])
+            if flags is not None:
+                integers[name] = flags
+
+    data = np.zeros(len(records), dtype=np.dtype(fields))
+    mask = np.zeros((len(records), len(fields)), dtype=bool)
+    for i, record in enumerate(records):
+        for j, (name, *_) in enumerate(fields):
+            if name in record:
+                data[name][i] = record[name]
+                mask[i, j] = True
+
+    header = {
+        "keys": keys,
+        "fields": [name for name, *_ in fields],
+        "extras": extras,
+        "present": {name: [name in record for record in records] for name in extras},
+        "integers": integers,
+    }
+    return header, data, mask
+
+
+def _split(runcard: dict):
+    """Replace the tabular sections of the runcard with placeholders."""
+    skeleton = json.loads(json.dumps(runcard))
+    tables = {}
+    for path, depth in TABLES.items():
+        *parents, leaf = path.split(".")
+        node = skeleton
+        for parent in parents:
+            node = node.get(parent, {})
+        if isinstance(node.get(leaf), dict):
+            tables[path] = (node[leaf], depth)
+            node[leaf] = {_PLACEHOLDER: path}
+    return skeleton, tables
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _descr(descr):
+    """Restore the tuples of a dtype description serialized to JSON."""
+    if isinstance(descr, str):
+        return descr
+    return [
+        tuple(field[:2]) + ((tuple(field[2]),) if len(field) > 2 else ())
+        for field in descr
+    ]
+
+
+def compile_runcard(
+    folder: pathlib.Path, target: Optional[pathlib.Path] = None
+) -> pathlib.Path:
+    """Compile the runcard and kernels of a platform.
+
+    The file is written atomically, so that concurrent readers never see a
+    partial file.
+
+    Args:
+        folder (pathlib.Path): Platform folder.
+        target (pathlib.Path): Path of the compiled file, by default
+            ``parameters.bin`` in the platform folder.
+    """
+    folder = pathlib.Path(folder)
+    target = folder / COMPILED if target is None else target
+    sources = _sources(folder)
+    skeleton, sections = _split(json.loads((folder / RUNCARD).read_text()))
+
+    buffers: Dict[str, np.ndarray] = {}
+    tables = {}
+    for path, (section, depth) in sections.items():
+        tables[path], data, mask = _compile_table(section, depth)
+        buffers[f"{path}:data"] = data
+        buffers[f"{path}:mask"] = mask
+
+    kernels = []
+    if KERNELS in sources:
+        with np.load(folder / KERNELS) as npz:
+            for key, value in npz.items():
+                kernels.append(key)
+                buffers[f"kernels:{key}"] = np.ascontiguousarray(value)
+
+    layout, offset = {}, 0
+    for name, array in buffers.items():
+        layout[name] = {
+            "offset": offset,
+            "dtype": np.lib.format.dtype_to_descr(array.dtype),
+            "shape": list(array.shape),
+        }
+        offset = _align(offset + array.nbytes)
+
+    header = json.dumps(
+        {
+            "sources": sources,
+            "runcard": skeleton,
+            "tables": tables,
+            "kernels": kernels,
+            "buffers": layout,
+        }
+    ).encode()
+    start = _align(len(MAGIC) + 8 + len(header))
+
+    fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(MAGIC)
+            file.write(len(header).to_bytes(8, "little"))
+            file.write(header)
+            for name, array in buffers.items():
+                file.seek(start + layout[name]["offset"])
+                file.write(array.tobytes())
+            file.truncate(start + offset)
+        shutil.copymode(folder / RUNCARD, tmp)
+        os.replace(tmp, target)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return target
+
+
+class CompiledRuncard:
+    """Read-only, memory-mapped view of a compiled runcard.
+
+    Args:
+        path (pathlib.Path): Path of the ``parameters.bin`` file.
+    """
+
+    def __init__(self, path: pathlib.Path):
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a compiled runcard.")
+        size = int.from_bytes(self._mmap[len(MAGIC) : len(MAGIC) + 8], "little")
+        begin = len(MAGIC) + 8
+        self.header: dict = json.loads(self._mmap[begin : begin + size])
+        self._start = _align(begin + size)
+
+    @property
+    def sources(self) -> dict:
+        """Modification time and size of the files compiled."""
+        return self.header["sources"]
+
+    def buffer(self, name: str) -> np.ndarray:
+        """Zero-copy view on one of the stored arrays."""
+        layout = self.header["buffers"][name]
+        dtype = np.lib.format.descr_to_dtype(_descr(layout["dtype"]))
+        count = int(np.prod(layout["shape"], dtype=int))
+        return np.frombuffer(
+            self._mmap, dtype, count, self._start + layout["offset"]
+        ).reshape(layout["shape"])
+
+    def table(self, path: str) -> np.ndarray:
+        """Structured array holding one of the tabular runcard sections.
+
+        For example ``table("characterization.single_qubit")["T1"]`` contains
+        the relaxation times of all qubits, in the order of
+        ``keys("characterization.single_qubit")``.
+        """
+        return self.buffer(f"{path}:data")
+
+    def keys(self, path: str) -> list:
+        """Runcard keys of the records of a tabular section."""
+        return [tuple(key) for key in self.header["tables"][path]["keys"]]
+
+    def _section(self, path: str) -> dict:
+        """Rebuild the nested dictionary of a tabular section."""
+        info = self.header["tables"][path]
+        table = self.table(path)
+        columns = [table[name].tolist() for name in info["fields"]]
+        mask = self.buffer(f"{path}:mask").tolist()
+        section = {}
+        for i, key in enumerate(info["keys"]):
+            record = {
+                name: column[i]
+                for name, column, present in zip(info["fields"], columns, mask[i])
+                if present
+            }
+            for name, flags in info["integers"].items():
+                if name in record:
+                    record[name] = _restore(record[name], flags[i])
+            for name, values in info["extras"].items():
+                if info["present"][name][i]:
+                    record[name] = _copy(values[i])
+            node = section
+            for part in key[:-1]:
+                node = node.setdefault(part, {})
+            node[key[-1]] = record
+        return section
+
+    def runcard(self) -> dict:
+        """Rebuild the runcard dictionary, as loaded from ``parameters.json``."""
+        return self._fill(self.header["runcard"])
+
+    def _fill(self, node):
+        if isinstance(node, dict):
+            if set(node) == {_PLACEHOLDER}:
+                return self._section(node[_PLACEHOLDER])
+            return {key: self._fill(value) for key, value in node.items()}
+        return _copy(node)
+
+    def kernels(self) -> dict:
+        """Integration kernels, as zero-copy views, keyed by qubit."""
+        return {
+            json.loads(key): self.buffer(f"kernels:{key}")
+            for key in self.header["kernels"]
+        }
+
+
+def _restore(value, flags):
+    """Convert back to integers the values flagged by :func:`_integers`."""
+    if isinstance(flags, list):
+        return [_restore(element, flag) for element, flag in zip(value, flags)]
+    return int(value) if flags else value
+
+
+def _copy(value):
+    """Copy the mutable values stored in the header."""
+    if isinstance(value, dict):
+        return {key: _copy(element) for key, element in value.items()}
+    if isinstance(value, list):
+        return [_copy(element) for element in value]
+    return value
+
+
+def _fallback(folder: pathlib.Path) -> pathlib.Path:
+    """Location of the compiled runcard for platform folders that are not
+    writable."""
+    digest = hashlib.sha1(str(folder.resolve()).encode()).hexdigest()[:12]
+    return pathlib.Path(tempfile.gettempdir()) / f"{folder.name}-{digest}.bin"
+
+
+def load(folder: pathlib.Path) -> CompiledRuncard:
+    """Load the compiled runcard of a platform, compiling it if outdated.
+
+    When the platform folder is not writable, the runcard is compiled in the
+    temporary directory instead.
+    """
+    folder = pathlib.Path(folder).resolve()
+    sources = _sources(folder)
+    compiled = _loaded.get(folder)
+    if compiled is not None and compiled.sources == sources:
+        return compiled
+
+    for path in (folder / COMPILED, _fallback(folder)):
+        if path.exists():
+            try:
+                compiled = CompiledRuncard(path)
+            except (ValueError, KeyError, json.JSONDecodeError):
+                continue
+            if compiled.sources == sources:
+                break
+    else:
+        try:
+            compiled = CompiledRuncard(compile_runcard(folder))
+        except PermissionError:
+            compiled = CompiledRuncard(compile_runcard(folder, _fallback(folder)))
+
+    _loaded[folder] = compiled
+    return compiled
+
+
+def load_runcard(folder: pathlib.Path) -> dict:
+    """Drop-in replacement of :func:`qibolab.serialize.load_runcard`."""
+    return load(folder).runcard()
+
+
+def load_kernels(folder: pathlib.Path) -> Optional[dict]:
+    """Drop-in replacement of :meth:`qibolab.kernels.Kernels.load`.
+
+    Kernels are returned as read-only views on the memory-mapped file.
+    """
+    from qibolab.kernels import Kernels
+
+    return Kernels(load(folder).kernels())
@@ -0,0 +1,174 @@
+"""Scheduling of circuits of native gates in the shortest time.
+
+A circuit is given as a list of layers, each one a list of ``(gate, target)``
+tuples acting on different qubits, e.g.::
+
+    layers = [
+        [("RX", 0), ("RX90", 1)],
+        [("CZ", (0, 2)), ("RX", 3)],
+        [("MZ", 0), ("MZ", 1), ("MZ", 2), ("MZ", 3)],
+    ]
+
+Instead of waiting for the end of each layer, every gate starts as soon as
+the previous gates on its qubits are finished and the channels it plays on
+are free. The pulses of each gate are placed with their ``relative_start``
+and ``duration`` from the runcard, and channels shared by multiple qubits or
+pairs (e.g. the flux line of the qubit shared by all its CZ gates, or the
+flux line of a coupler) are never driven by two gates at the same time.
+Readout channels are multiplexed, and shared freely.
+
+Example::
+
+    scheduler = Scheduler(platform)
+    schedule = scheduler.schedule(layers)
+    sequence = scheduler.sequences([layers])[0]
+"""
+
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+import numpy as np
+from sequences import PulseBatch, SequenceBuilder
+
+TWO_QUBIT = ("CZ", "CNOT", "iSWAP")
+EXCLUSIVE = ("qd", "qf", "cf")
+"""Types of the pulses that cannot share their channel."""
+
+Gate = Tuple[str, object]
+Window = Tuple[str, int, int]
+
+
+@dataclass
+class Schedule:
+    """Start time of the gates of a circuit."""
+
+    gates: List[Gate]
+    start: np.ndarray
+    finish: np.ndarray
+
+    @property
+    def duration(self) -> int:
+        return int(self.finish.max()) if len(self.gates) > 0 else 0
+
+    def batch(self, builder: SequenceBuilder, sequence=0) -> PulseBatch:
+        """Pulses of the scheduled gates."""
+        indices = defaultdict(list)
+        for index, (gate, _) in enumerate(self.gates):
+            indices[gate].append(index)
+        return PulseBatch.concatenate(
+            *(
+                builder.gate(
+                    gate,
+                    [self.gates[i][1] for i in index],
+                    self.start[index],
+                    sequence,
+                )
+                for gate, index in indices.items()
+            )
+        )
+
+
+class Scheduler:
+    """Schedule circuits of native gates of a platform.
+
+    Args:
+        platform (:class:`qibolab.platform.Platform`): Platform providing the
+            native gates.
+    """
+
+    def __init__(self, platform):
+        self.builder = SequenceBuilder(platform)
+        self._footprints: Dict[Gate, Tuple[List[Window], int]] = {}
+
+    def gate(self, gate: str, target) -> Gate:
+        """Gate with its target as in the native table, accepting pairs in
+        either order."""
+        if gate not in TWO_QUBIT:
+            return gate, target
+        target = tuple(target)
+        if (gate, target) not in self.builder.table.gates:
+            if (gate, target[::-1]) in self.builder.table.gates:
+                return gate, target[::-1]
+        return gate, target
+
+    def footprint(self, gate: str, target) -> Tuple[List[Window], int]:
+        """Exclusive channel windows of a gate, relative to its start, and its
+        duration."""
+        key = (gate, target)
+        if key not in self._footprints:
+            table = self.builder.table
+            rows, _ = table.rows(gate, [target])
+            begin = table.relative_start[rows]
+            end = begin + table.duration[rows]
+            windows = [
+                (table.channel[row], int(b), int(e))
+                for row, b, e in zip(rows, begin, end)
+                if table.type[row] in EXCLUSIVE and table.channel[row] is not None
+            ]
+            duration = int(end.max()) if len(rows) > 0 else 0
+            self._footprints[key] = (windows, duration)
+        return self._footprints[key]
+
+    def schedule(self, layers: List[List[Gate]], barriers: bool = False) -> Schedule:
+        """Start time of every gate of a circuit.
+
+        Args:
+            layers (list): Layers of ``(gate, target)`` tuples.
+            barriers (bool): Wait for the end of each layer before starting the
+                next one, as a reference.
+        """
+        gates, start, finish = [], [], []
+        # time at which each qubit is free, and intervals in which each
+        # channel is used
+        ready = defaultdict(int)
+        busy = defaultdict(list)
+        barrier = 0
+        for layer in layers:
+            layer = [self.gate(gate, target) for gate, target in layer]
+            qubits = [q for gate, target in layer for q in _qubits(gate, target)]
+            if len(set(qubits)) < len(qubits):
+                raise ValueError(f"Layer {layer} acts twice on the same qubit.")
+            # longest gates first, such that shorter ones fill the gaps
+            layer.sort(key=lambda gate: -self.footprint(*gate)[1])
+            for gate, target in layer:
+                windows, duration = self.footprint(gate, target)
+                t = max([barrier] + [ready[q] for q in _qubits(gate, target)])
+                t = _earliest(busy, windows, t)
+                for channel, begin, end in windows:
+                    busy[channel].append((t + begin, t + end))
+                for qubit in _qubits(gate, target):
+                    ready[qubit] = t + duration
+                gates.append((gate, target))
+                start.append(t)
+                finish.append(t + duration)
+            if barriers:
+                barrier = max(finish, default=0)
+        return Schedule(
+            gates, np.array(start, dtype=np.int64), np.array(finish, dtype=np.int64)
+        )
+
+    def sequences(self, circuits: List[List[List[Gate]]]) -> list:
+        """Scheduled :class:`qibolab.pulses.PulseSequence` of each circuit."""
+        batches = [
+            self.schedule(layers).batch(self.builder, index)
+            for index, layers in enumerate(circuits)
+        ]
+        return PulseBatch.concatenate(*batches).sequences(self.builder.table)
+
+
+def _qubits(gate: str, target) -> tuple:
+    return tuple(target) if gate in TWO_QUBIT else (target,)
+
+
+def _earliest(busy: dict, windows: List[Window], t: int) -> int:
+    """Earliest time from ``t`` at which all the windows are free."""
+    while True:
+        shift = t
+        for channel, begin, end in windows:
+            for first, last in busy[channel]:
+                if t + begin < last and first < t + end:
+                    shift = max(shift, last - begin)
+        if shift == t:
+            return t
+        t = shift
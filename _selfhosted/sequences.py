@@ -0,0 +1,347 @@
+"""Vectorized construction of pulse sequences from the platform native gates.
+
+The native gates of a platform (``native_gates.single_qubit`` and
+``native_gates.two_qubit`` in the runcard) are flattened in a
+:class:`NativeTable`, one row per native pulse. Gates applied to many
+qubits, pairs and sequences are then collected in a :class:`PulseBatch`,
+which stores the pulses as NumPy arrays (struct-of-arrays) instead of one
+Python object per pulse. Pulse objects are created only when converting the
+batch to :class:`qibolab.pulses.PulseSequence` objects for execution.
+
+Example::
+
+    builder = SequenceBuilder(platform)
+    # RX on all qubits followed by a measurement, for 1000 sequences
+    qubits = np.tile(list(platform.qubits), 1000)
+    sequence = np.repeat(np.arange(1000), len(platform.qubits))
+    rx = builder.rx(qubits, sequence=sequence)
+    mz = builder.mz(qubits, start=rx.finish, sequence=sequence)
+    sequences = PulseBatch.concatenate(rx, mz).sequences(builder.table)
+"""
+
+from collections import defaultdict
+from dataclasses import dataclass, fields
+from typing import Dict, List, Tuple
+
+import numpy as np
+from qibolab.native import NativePulse, NativeSequence, VirtualZPulse
+from qibolab.pulses import (
+    CouplerFluxPulse,
+    DrivePulse,
+    FluxPulse,
+    PulseSequence,
+    ReadoutPulse,
+)
+
+VIRTUAL_Z = "virtual_z"
+COUPLER = "cf"
+
+
+@dataclass
+class NativeTable:
+    """Native pulses of a platform, one row per pulse."""
+
+    duration: np.ndarray
+    amplitude: np.ndarray
+    frequency: np.ndarray
+    relative_start: np.ndarray
+    phase: np.ndarray
+    """Phase of virtual Z rotations, zero for the other pulses."""
+    type: np.ndarray
+    """Pulse type (``"qd"``, ``"ro"``, ``"qf"``, ``"cf"`` or ``"virtual_z"``)."""
+    shape: np.ndarray
+    channel: np.ndarray
+    qubit: np.ndarray
+    """Qubit (or coupler) the pulse acts on."""
+    gates: Dict[Tuple[str, object], Tuple[int, int]]
+    """Map from gate name and target to the range of rows of its pulses."""
+
+    @classmethod
+    def from_platform(cls, platform):
+        """Flatten the native gates of all qubits and pairs of a platform."""
+        rows = []
+        gates = {}
+
+        def add(gate, target, pulses):
+            gates[(gate, target)] = (len(rows), len(rows) + len(pulses))
+            rows.extend(pulses)
+
+        for name, qubit in platform.qubits.items():
+            natives = qubit.native_gates
+            for gate in ("RX", "RX12", "MZ"):
+                native = getattr(natives, gate)
+                if native is not None:
+                    add(gate, name, [_native_row(native)])
+            if natives.RX is not None:
+                add("RX90", name, [_native_row(natives.RX90)])
+
+        for pair, qubit_pair in platform.pairs.items():
+            natives = qubit_pair.native_gates
+            for fld in fields(natives):
+                sequence = getattr(natives, fld.name)
+                if isinstance(sequence, NativeSequence):
+                    add(fld.name, pair, _sequence_rows(sequence))
+
+        columns = list(zip(*rows)) if rows else [()] * 9
+        return cls(
+            duration=np.array(columns[0], dtype=np.int64),
+            amplitude=np.array(columns[1], dtype=np.float64),
+            frequency=np.array(columns[2], dtype=np.int64),
+            relative_start=np.array(columns[3], dtype=np.int64),
+            phase=np.array(columns[4], dtype=np.float64),
+            type=np.array(columns[5], dtype=object),
+            shape=np.array(columns[6], dtype=object),
+            channel=np.array(columns[7], dtype=object),
+            qubit=np.array(columns[8], dtype=object),
+            gates=gates,
+        )
+
+    def rows(self, gate: str, targets) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows implementing a gate on each of the targets.
+
+        Returns the rows and, for each row, the index of the target it
+        belongs to. Gates implemented by multiple pulses (e.g. ``CZ``)
+        produce multiple rows per target.
+        """
+        ranges = {}
+        bounds = np.empty((len(targets), 2), dtype=np.int64)
+        for i, target in enumerate(targets):
+            key = (gate, target)
+            if key not in ranges:
+                if key not in self.gates:
+                    raise ValueError(f"Calibration for {gate} on {target} not found.")
+                ranges[key] = self.gates[key]
+            bounds[i] = ranges[key]
+        counts = bounds[:, 1] - bounds[:, 0]
+        owner = np.repeat(np.arange(len(targets)), counts)
+        offsets = np.arange(len(owner)) - np.repeat(np.cumsum(counts) - counts, counts)
+        return bounds[owner, 0] + offsets, owner
+
+
+def _native_row(native: NativePulse):
+    channel = getattr(native.qubit, native.pulse_type.name.lower())
+    return (
+        native.duration,
+        native.amplitude,
+        native.frequency,
+        native.relative_start,
+        0.0,
+        native.pulse_type.value,
+        native.shape,
+        channel.name if channel is not None else None,
+        native.qubit.name,
+    )
+
+
+def _sequence_rows(sequence: NativeSequence):
+    rows = []
+    for pulse in sequence.pulses:
+        if isinstance(pulse, VirtualZPulse):
+            rows.append(
+                (0, 0.0, 0, 0, pulse.phase, VIRTUAL_Z, None, None, pulse.qubit.name)
+            )
+        else:
+            rows.append(_native_row(pulse))
+    for pulse in sequence.coupler_pulses:
+        rows.append(
+            (
+                pulse.duration,
+                pulse.amplitude,
+                0,
+                pulse.relative_start,
+                0.0,
+                COUPLER,
+                pulse.shape,
+                pulse.coupler.flux.name,
+                pulse.coupler.name,
+            )
+        )
+    return rows
+
+
+@dataclass
+class PulseBatch:
+    """Pulses of many sequences, stored as arrays.
+
+    Amplitudes, frequencies and durations are copied from the native table,
+    such that they can be modified (e.g. swept) before building the
+    sequences.
+    """
+
+    row: np.ndarray
+    """Row of the native table the pulse is generated from."""
+    sequence: np.ndarray
+    """Index of the sequence the pulse belongs to."""
+    start: np.ndarray
+    duration: np.ndarray
+    amplitude: np.ndarray
+    frequency: np.ndarray
+    relative_phase: np.ndarray
+
+    def __len__(self):
+        return len(self.row)
+
+    @property
+    def finish(self) -> np.ndarray:
+        return self.start + self.duration
+
+    @classmethod
+    def concatenate(cls, *batches: "PulseBatch") -> "PulseBatch":
+        return cls(
+            **{
+                fld.name: np.concatenate(
+                    [getattr(batch, fld.name) for batch in batches]
+                )
+                for fld in fields(cls)
+            }
+        )
+
+    def sequence_finish(self, nsequences: int) -> np.ndarray:
+        """Time at which each sequence finishes."""
+        finish = np.zeros(nsequences, dtype=np.int64)
+        np.maximum.at(finish, self.sequence, self.finish)
+        return finish
+
+    def virtual_z_phases(self, table: NativeTable) -> List[Dict[object, float]]:
+        """Virtual Z phases accumulated by each qubit in each sequence."""
+        phases = defaultdict(lambda: defaultdict(float))
+        mask = table.type[self.row] == VIRTUAL_Z
+        for sequence, qubit, phase in zip(
+            self.sequence[mask],
+            table.qubit[self.row[mask]],
+            table.phase[self.row[mask]],
+        ):
+            phases[sequence][qubit] += phase
+        nsequences = int(self.sequence.max()) + 1 if len(self) > 0 else 0
+        return [dict(phases[i]) for i in range(nsequences)]
+
+    def applied_phases(self, table: NativeTable) -> np.ndarray:
+        """Relative phase of every pulse, including the virtual Z phases of
+        the gates preceding it on its qubit.
+
+        The virtual Z rotations of two-qubit gates (see :meth:`virtual_z_phases`)
+        are applied to the following drive pulses of the same qubit in the
+        same sequence, as done with the phases returned by
+        :meth:`qibolab.platform.Platform.create_CZ_pulse_sequence`.
+        """
+        phases = self.relative_phase.astype(np.float64)
+        types = table.type[self.row]
+        virtual = types == VIRTUAL_Z
+        codes = {}
+        qubits = np.array(
+            [codes.setdefault(qubit, len(codes)) for qubit in table.qubit.tolist()],
+            dtype=np.int64,
+        )[self.row]
+        # group the pulses by sequence and qubit, in time, rotations first
+        order = np.lexsort((~virtual, self.start, qubits, self.sequence))
+        increments = np.where(virtual, table.phase[self.row], 0.0)[order]
+        total = np.cumsum(increments)
+        first = np.ones(len(order), dtype=bool)
+        sequence, qubits = self.sequence[order], qubits[order]
+        first[1:] = (sequence[1:] != sequence[:-1]) | (qubits[1:] != qubits[:-1])
+        before = (total - increments)[first]
+        accumulated = total - before[np.cumsum(first) - 1]
+        drives = order[types[order] == "qd"]
+        phases[drives] += accumulated[types[order] == "qd"]
+        return phases
+
+    def sequences(self, table: NativeTable) -> List[PulseSequence]:
+        """Build the qibolab pulse sequences, applying the virtual Z phases
+        (see :meth:`applied_phases`)."""
+        nsequences = int(self.sequence.max()) + 1 if len(self) > 0 else 0
+        sequences = [PulseSequence() for _ in range(nsequences)]
+        relative_phase = self.applied_phases(table)
+        pulses = table.type[self.row] != VIRTUAL_Z
+        order = np.argsort(self.sequence[pulses], kind="stable")
+        columns = zip(
+            self.sequence[pulses][order].tolist(),
+            self.start[pulses][order].tolist(),
+            self.duration[pulses][order].tolist(),
+            self.amplitude[pulses][order].tolist(),
+            self.frequency[pulses][order].tolist(),
+            relative_phase[pulses][order].tolist(),
+            table.type[self.row[pulses]][order],
+            table.shape[self.row[pulses]][order],
+            table.channel[self.row[pulses]][order],
+            table.qubit[self.row[pulses]][order],
+        )
+        for (
+            index,
+            start,
+            duration,
+            amplitude,
+            frequency,
+            phase,
+            kind,
+            shape,
+            channel,
+            qubit,
+        ) in columns:
+            if kind == "qd":
+                pulse = DrivePulse(
+                    start, duration, amplitude, frequency, phase, shape, channel, qubit
+                )
+            elif kind == "ro":
+                pulse = ReadoutPulse(
+                    start, duration, amplitude, frequency, phase, shape, channel, qubit
+                )
+            elif kind == "qf":
+                pulse = FluxPulse(start, duration, amplitude, shape, channel, qubit)
+            else:
+                pulse = CouplerFluxPulse(
+                    start, duration, amplitude, shape, channel, qubit
+                )
+            sequences[index].add(pulse)
+        return sequences
+
+
+class SequenceBuilder:
+    """Apply native gates on many targets and sequences at once.
+
+    Args:
+        platform (:class:`qibolab.platform.Platform`): Platform providing the
+            native gates.
+    """
+
+    def __init__(self, platform):
+        self.table = NativeTable.from_platform(platform)
+
+    def gate(self, gate: str, targets, start=0, sequence=0, relative_phase=0.0):
+        """Pulses implementing a native gate.
+
+        Args:
+            gate (str): Native gate name (``"RX"``, ``"RX90"``, ``"MZ"``,
+                ``"CZ"``, ...).
+            targets (list): Qubit, or pair for two-qubit gates, of each gate.
+            start (int or np.ndarray): Start time of each gate.
+            sequence (int or np.ndarray): Sequence each gate belongs to.
+            relative_phase (float or np.ndarray): Relative phase of each gate.
+        """
+        if gate in ("CZ", "CNOT", "iSWAP"):
+            targets = [tuple(target) for target in targets]
+        rows, owner = self.table.rows(gate, list(targets))
+        ngates = len(targets)
+        start = np.broadcast_to(np.asarray(start, dtype=np.int64), ngates)
+        sequence = np.broadcast_to(np.asarray(sequence, dtype=np.int64), ngates)
+        phase = np.broadcast_to(np.asarray(relative_phase, dtype=np.float64), ngates)
+        return PulseBatch(
+            row=rows,
+            sequence=sequence[owner],
+            start=start[owner] + self.table.relative_start[rows],
+            duration=self.table.duration[rows].copy(),
+            amplitude=self.table.amplitude[rows].copy(),
+            frequency=self.table.frequency[rows].copy(),
+            relative_phase=phase[owner],
+        )
+
+    def rx(self, qubits, start=0, sequence=0, relative_phase=0.0):
+        return self.gate("RX", qubits, start, sequence, relative_phase)
+
+    def rx90(self, qubits, start=0, sequence=0, relative_phase=0.0):
+        return self.gate("RX90", qubits, start, sequence, relative_phase)
+
+    def mz(self, qubits, start=0, sequence=0):
+        return self.gate("MZ", qubits, start, sequence)
+
+    def cz(self, pairs, start=0, sequence=0):
+        return self.gate("CZ", pairs, start, sequence)
@@ -0,0 +1,187 @@
+"""Shadow state of the instrument settings, skipping redundant writes.
+
+The drivers write instrument settings with ``device.set(name, value)``, one
+round-trip each (SCPI for the local oscillators and TWPA pumps, the cluster
+for the qblox modules), even when the value did not change: local
+oscillators write all their settings when connecting, and the qblox ports
+write their attenuation, offsets and NCO settings every time they are
+assigned.
+
+:func:`install` replaces the device handles of the instruments of a
+platform with :class:`Shadow` objects, which remember the last value written
+or read for each parameter and only send the values that differ. Inside
+:meth:`Shadow.batch` writes are deferred and coalesced, such that a parameter
+set multiple times is only written once, with its last value.
+
+The shadow state is conservative: it forgets a parameter as soon as it is
+accessed directly, and all parameters when a method which may change the
+settings of the device (e.g. a reset) is called.
+"""
+
+import functools
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Optional
+
+PURE = frozenset(
+    (
+        "present",
+        "on",
+        "off",
+        "close",
+        "arm_sequencer",
+        "start_sequencer",
+        "stop_sequencer",
+        "get_sequencer_state",
+        "get_acquisition_state",
+        "get_acquisitions",
+        "store_scope_acquisition",
+        "delete_acquisition_data",
+        "is_qrm_type",
+        "is_qcm_type",
+        "is_rf_type",
+        "name",
+        "parameters",
+    )
+)
+"""Device attributes which do not change its settings."""
+
+
+def _equal(first, second) -> bool:
+    try:
+        return bool(first == second)
+    except ValueError:
+        # arrays
+        return False
+
+
+class Shadow:
+    """Device wrapper writing only the parameters that change."""
+
+    def __init__(self, device):
+        self.device = device
+        self.values: Dict[str, Any] = {}
+        """Last value written or read, for each parameter."""
+        self.pending: Optional[Dict[str, Any]] = None
+        """Writes deferred by :meth:`batch`."""
+        self.writes = 0
+        self.skipped = 0
+        self._sequencers = None
+
+    def set(self, name: str, value):
+        if self.pending is not None:
+            self.pending[name] = value
+            return
+        if name in self.values and _equal(self.values[name], value):
+            self.skipped += 1
+            return
+        # the value is unknown if the write fails
+        self.values.pop(name, None)
+        self.device.set(name, value)
+        self.values[name] = value
+        self.writes += 1
+
+    def get(self, name: str):
+        value = self.device.get(name)
+        self.values[name] = value
+        return value
+
+    @contextmanager
+    def batch(self):
+        """Defer the writes until the end of the block."""
+        if self.pending is not None:
+            yield
+            return
+        self.pending = {}
+        try:
+            yield
+        finally:
+            pending, self.pending = self.pending, None
+            for name, value in pending.items():
+                self.set(name, value)
+
+    def invalidate(self, name: Optional[str] = None):
+        """Forget the value of a parameter, or of all of them."""
+        if name is None:
+            self.values.clear()
+        else:
+            self.values.pop(name, None)
+
+    @property
+    def sequencers(self):
+        """Sequencers of qblox modules, with their own shadow state."""
+        if self._sequencers is None:
+            self._sequencers = [Shadow(s) for s in self.device.sequencers]
+        return self._sequencers
+
+    def __getattr__(self, name: str):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        attribute = getattr(self.device, name)
+        if name in PURE or not callable(attribute):
+            return attribute
+        if hasattr(attribute, "set") and hasattr(attribute, "get"):
+            # parameter accessed directly
+            self.invalidate(name)
+        else:
+            self.invalidate()
+            for sequencer in self._sequencers or []:
+                sequencer.invalidate()
+        return attribute
+
+
+def batch(instrument):
+    """Defer and coalesce the writes to an instrument, if it is shadowed."""
+    device = getattr(instrument, "device", None)
+    return device.batch() if isinstance(device, Shadow) else nullcontext()
+
+
+def _shadow_create(instrument):
+    create = instrument.create
+
+    @functools.wraps(create)
+    def wrapper():
+        return Shadow(create())
+
+    wrapper.__shadowed__ = True
+    instrument.create = wrapper
+
+
+def _shadow_connect(instrument):
+    connect = instrument.connect
+
+    @functools.wraps(connect)
+    def wrapper(*args, **kwargs):
+        result = connect(*args, **kwargs)
+        device = getattr(instrument, "device", None)
+        if device is not None and not isinstance(device, Shadow):
+            instrument.device = Shadow(device)
+        return result
+
+    wrapper.__shadowed__ = True
+    instrument.connect = wrapper
+
+
+def install(obj):
+    """Shadow the devices of an instrument, or of all the instruments of a
+    platform. Calling it again has no further effect.
+
+    Instruments building their device in ``create`` (local oscillators) are
+    shadowed before writing their settings when connecting, the other ones
+    with a ``device`` attribute once connected.
+    """
+    instruments = getattr(obj, "instruments", None)
+    if isinstance(instruments, dict):
+        for value in instruments.values():
+            install(value)
+        return obj
+    for module in getattr(obj, "modules", {}).values():
+        install(module)
+    create = getattr(obj, "create", None)
+    connect = getattr(obj, "connect", None)
+    if callable(create):
+        if not getattr(create, "__shadowed__", False):
+            _shadow_create(obj)
+    elif hasattr(obj, "device") and callable(connect):
+        if not getattr(connect, "__shadowed__", False):
+            _shadow_connect(obj)
+    return obj
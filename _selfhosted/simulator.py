@@ -0,0 +1,403 @@
+"""Offline simulator replacing the instruments of a platform.
+
+The platform is built by its own ``create()``, so that channels, ports and
+qubit wiring are exactly the ones used in the lab, and its instruments are
+then swapped with a single :class:`Simulator` controller (and dummy local
+oscillators). No instrument is ever contacted.
+
+The simulator produces IQ shots from the runcard characterization of each
+qubit:
+
+- drive pulses rotate the Bloch vector of their qubit, with Rabi rate
+  calibrated on the ``RX`` native gate and detuning from ``drive_frequency``,
+- between pulses the qubit relaxes according to ``T1`` and ``T2``,
+- the excited population at the start of each readout pulse selects
+  between the ``mean_gnd_states`` and ``mean_exc_states`` blobs, whose width
+  reproduces the runcard ``assignment_fidelity``, scaled by the resonator
+  response around ``readout_frequency``,
+- shots are discriminated with ``threshold`` and ``iq_angle``.
+
+Sweeps are evaluated on the whole grid of swept values at once. Flux and
+coupler pulses, as well as sweeps of qubit parameters (e.g. ``bias``), have
+no effect.
+
+Simulation is enabled with the ``simulate`` argument of
+:func:`platforms.create_platform` or with the ``QRC_SIMULATE`` environment
+variable, set either to ``1`` (all platforms) or to a comma separated list
+of platform names.
+"""
+
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+from qibo.config import log
+from qibolab import AcquisitionType, AveragingMode, ExecutionParameters
+from qibolab.instruments.abstract import Controller
+from qibolab.instruments.dummy import DummyLocalOscillator, DummyPort
+from qibolab.instruments.oscillator import LocalOscillator
+from qibolab.pulses import PulseSequence, PulseType
+from qibolab.qubits import Qubit, QubitId
+from qibolab.sweeper import Parameter, Sweeper
+from qibolab.unrolling import Bounds
+from scipy.special import ndtr, ndtri
+
+SIMULATE = "QRC_SIMULATE"
+"""Environment variable enabling the simulation."""
+SEED = "QRC_SIMULATE_SEED"
+"""Environment variable fixing the seed of the simulated shots."""
+LINEWIDTH = 2e6
+"""Linewidth of the readout resonators in Hz."""
+FIDELITY = 0.9
+"""Assignment fidelity of qubits without a valid one in the runcard."""
+NS = 1e-9
+
+
+def enabled(name: str, simulate: Optional[bool] = None) -> bool:
+    """Whether the given platform should be simulated.
+
+    An explicit ``simulate`` argument takes precedence over the environment.
+    """
+    if simulate is not None:
+        return simulate
+    value = os.environ.get(SIMULATE, "").strip()
+    if value.lower() in ("", "0", "false", "no"):
+        return False
+    if value.lower() in ("1", "true", "yes", "all"):
+        return True
+    return str(name) in {part.strip() for part in value.split(",")}
+
+
+@dataclass
+class Readout:
+    """Readout model of a single qubit."""
+
+    ground: complex
+    excited: complex
+    sigma: float
+    """Standard deviation of each quadrature of the shots."""
+    angle: float
+    threshold: float
+    frequency: float
+    amplitude: float
+    """Amplitude of the native measurement pulse."""
+
+    @classmethod
+    def from_qubit(cls, qubit: Qubit):
+        ground = complex(*(qubit.mean_gnd_states or (0.0, 0.0)))
+        excited = complex(*(qubit.mean_exc_states or (1.0, 1.0)))
+        if ground == excited:
+            excited = ground + 1
+        fidelity = qubit.assignment_fidelity
+        if not fidelity or not 0.5 < fidelity < 1:
+            fidelity = FIDELITY
+        distance = abs(excited - ground)
+        sigma = distance / 2 / ndtri(fidelity)
+
+        # use the runcard classifier when it separates the two blobs
+        angle, threshold = qubit.iq_angle, qubit.threshold
+        if threshold is None or not (
+            _project(ground, angle) < threshold < _project(excited, angle)
+        ):
+            angle = -np.angle(excited - ground)
+            threshold = (_project(ground, angle) + _project(excited, angle)) / 2
+
+        mz = qubit.native_gates.MZ
+        return cls(
+            ground=ground,
+            excited=excited,
+            sigma=sigma,
+            angle=angle,
+            threshold=threshold,
+            frequency=qubit.readout_frequency,
+            amplitude=mz.amplitude if mz is not None and mz.amplitude else 1.0,
+        )
+
+
+def _project(iq, angle):
+    """Component of the IQ points along the discrimination axis."""
+    return np.real(iq * np.exp(1j * angle))
+
+
+class _Grid:
+    """Values of the pulse parameters on the grid of swept values."""
+
+    def __init__(self, sweepers: List[Sweeper]):
+        self.shape = tuple(len(sweeper.values) for sweeper in sweepers)
+        self.sweeps = {}
+        for axis, sweeper in enumerate(sweepers):
+            if sweeper.pulses is None:
+                log.warning(f"Sweeps of {sweeper.parameter.name} are not simulated.")
+                continue
+            shape = [1] * len(self.shape)
+            shape[axis] = len(sweeper.values)
+            values = np.reshape(sweeper.values, shape)
+            for pulse in sweeper.pulses:
+                self.sweeps.setdefault((pulse.serial, sweeper.parameter), []).append(
+                    (sweeper.type, values)
+                )
+
+    def __call__(self, pulse, name: str) -> np.ndarray:
+        value = np.asarray(getattr(pulse, name), dtype=float)
+        for kind, values in self.sweeps.get((pulse.serial, Parameter[name]), []):
+            value = kind.value(values, value)
+        return np.broadcast_to(value, self.shape)
+
+
+def _relax(bloch: np.ndarray, delay: np.ndarray, t1: float, t2: float):
+    delay = np.maximum(delay, 0)[..., None]
+    decay = np.exp(-delay / np.array([t2, t2, t1]))
+    return np.concatenate(
+        [bloch[..., :2] * decay[..., :2], 1 - (1 - bloch[..., 2:]) * decay[..., 2:]],
+        axis=-1,
+    )
+
+
+def _rotate(bloch: np.ndarray, axis: np.ndarray, angle: np.ndarray):
+    """Rotate Bloch vectors around (unnormalized) axes, with Rodrigues'
+    formula."""
+    norm = np.linalg.norm(axis, axis=-1, keepdims=True)
+    axis = axis / np.where(norm == 0, 1, norm)
+    angle = angle[..., None]
+    return (
+        bloch * np.cos(angle)
+        + np.cross(axis, bloch) * np.sin(angle)
+        + axis * np.sum(axis * bloch, axis=-1, keepdims=True) * (1 - np.cos(angle))
+    )
+
+
+def _rotate_z(bloch: np.ndarray, angle: np.ndarray):
+    return _rotate(bloch, np.broadcast_to([0.0, 0.0, 1.0], bloch.shape), angle)
+
+
+def excited_population(qubit: Qubit, drives: list, readout, grid: _Grid, since=0):
+    """Excited population of a qubit at the start of a readout pulse.
+
+    Args:
+        qubit (:class:`qibolab.qubits.Qubit`): Qubit measured.
+        drives (list): Drive pulses acting on the qubit, played after the
+            qubit was last in its ground state.
+        readout (:class:`qibolab.pulses.ReadoutPulse`): Readout pulse.
+        grid (:class:`_Grid`): Values of the swept parameters.
+        since (float): Time at which the qubit was in its ground state.
+    """
+    t1 = qubit.T1 or np.inf
+    t2 = min(qubit.T2 or np.inf, 2 * t1)
+    rx = qubit.native_gates.RX
+    # Rabi rate per unit amplitude, such that the native RX is a pi rotation
+    rate = 0.0
+    if rx is not None and rx.amplitude and rx.duration:
+        rate = np.pi / (rx.amplitude * rx.duration)
+
+    bloch = np.zeros(grid.shape + (3,))
+    bloch[..., 2] = 1
+    now = np.full(grid.shape, float(since))
+    for pulse in sorted(drives, key=lambda pulse: pulse.start):
+        start, duration = grid(pulse, "start"), grid(pulse, "duration")
+        detuning = 0.0
+        if qubit.drive_frequency:
+            detuning = 2 * np.pi * (grid(pulse, "frequency") - qubit.drive_frequency)
+            detuning = detuning * NS
+        bloch = _relax(bloch, start - now, t1, t2)
+        # move to the frame of the drive, rotate and come back
+        frame = detuning * start
+        bloch = _rotate_z(bloch, -frame)
+        rabi = rate * grid(pulse, "amplitude")
+        phase = grid(pulse, "relative_phase")
+        axis = np.stack(
+            np.broadcast_arrays(
+                rabi * np.cos(phase),
+                rabi * np.sin(phase),
+                -detuning * np.ones_like(rabi),
+            ),
+            axis=-1,
+        )
+        bloch = _rotate(bloch, axis, np.sqrt(rabi**2 + detuning**2) * duration)
+        bloch = _rotate_z(bloch, frame + detuning * duration)
+        now = start + duration
+    bloch = _relax(bloch, grid(readout, "start") - now, t1, t2)
+    return np.clip((1 - bloch[..., 2]) / 2, 0, 1)
+
+
+class Simulator(Controller):
+    """Controller simulating the execution of pulse sequences.
+
+    Args:
+        name (str): Instrument name.
+        sampling_rate (float): Sampling rate in GS/s, used for raw
+            acquisitions.
+        seed (int): Seed of the simulated shots, by default taken from the
+            ``QRC_SIMULATE_SEED`` environment variable.
+        time_scale (float): If positive, every execution also lasts the time
+            it would take on the hardware (sequence and relaxation time of
+            all shots) multiplied by this factor, to reproduce the latency of
+            the experiments.
+    """
+
+    BOUNDS = Bounds(waveforms=10**9, readout=10**6, instructions=10**9)
+    PortType = DummyPort
+
+    def __init__(
+        self,
+        name: str = "simulator",
+        sampling_rate: float = 1,
+        seed: Optional[int] = None,
+        time_scale: float = 0,
+    ):
+        super().__init__(name, address="simulator")
+        self.bounds = self.BOUNDS
+        self._sampling_rate = sampling_rate
+        if seed is None and os.environ.get(SEED):
+            seed = int(os.environ[SEED])
+        self.rng = np.random.default_rng(seed)
+        self.time_scale = time_scale
+        self._readouts: Dict[QubitId, Readout] = {}
+
+    @property
+    def sampling_rate(self):
+        return self._sampling_rate
+
+    def connect(self):
+        log.info(f"Connecting to {self.name} instrument.")
+        self.is_connected = True
+
+    def disconnect(self):
+        log.info(f"Disconnecting {self.name} instrument.")
+        self.is_connected = False
+
+    def setup(self, *args, **kwargs):
+        log.info(f"Setting up {self.name} instrument.")
+
+    def readout(self, qubit: Qubit) -> Readout:
+        if qubit.name not in self._readouts:
+            self._readouts[qubit.name] = Readout.from_qubit(qubit)
+        return self._readouts[qubit.name]
+
+    def _values(self, readout: Readout, population, pulse, grid, options):
+        nshots = options.nshots
+        response = grid(pulse, "amplitude") / readout.amplitude
+        response = response / (
+            1 + 2j * (grid(pulse, "frequency") - readout.frequency) / LINEWIDTH
+        )
+        ground, excited = readout.ground * response, readout.excited * response
+
+        if options.averaging_mode is AveragingMode.SINGLESHOT:
+            shape = (nshots,) + grid.shape
+            states = self.rng.random(shape) < population
+            noise = 1
+        else:
+            shape = grid.shape
+            states = self.rng.binomial(nshots, population) / nshots
+            noise = 1 / np.sqrt(nshots)
+
+        if options.acquisition_type is AcquisitionType.DISCRIMINATION:
+            if options.averaging_mode is AveragingMode.SINGLESHOT:
+                iq = np.where(states, excited, ground) + self._noise(readout, shape)
+                return _project(iq, readout.angle) > readout.threshold
+            # probability of assigning each shot to the excited state
+            sigma = readout.sigma
+            false = 1 - ndtr(
+                (readout.threshold - _project(ground, readout.angle)) / sigma
+            )
+            true = 1 - ndtr(
+                (readout.threshold - _project(excited, readout.angle)) / sigma
+            )
+            probability = population * true + (1 - population) * false
+            return self.rng.binomial(nshots, probability) / nshots
+
+        iq = ground + states * (excited - ground)
+        if options.acquisition_type is AcquisitionType.RAW:
+            samples = int(pulse.duration * self.sampling_rate)
+            iq = iq[..., None]
+            shape = shape + (samples,)
+        return iq + noise * self._noise(readout, shape)
+
+    def _noise(self, readout: Readout, shape):
+        noise = self.rng.normal(scale=readout.sigma, size=shape + (2,))
+        return noise[..., 0] + 1j * noise[..., 1]
+
+    def _execute(self, qubits, sequence: PulseSequence, options, sweepers):
+        grid = _Grid(sweepers)
+        results = {}
+        for qubit_name in {pulse.qubit for pulse in sequence.ro_pulses}:
+            qubit = qubits[qubit_name]
+            readout = self.readout(qubit)
+            since = 0
+            for pulse in sequence.get_qubit_pulses(qubit_name).ro_pulses:
+                drives = [
+                    drive
+                    for drive in sequence.get_qubit_pulses(qubit_name)
+                    if drive.type is PulseType.DRIVE
+                    and since <= drive.start < pulse.start
+                ]
+                population = excited_population(qubit, drives, pulse, grid, since)
+                values = self._values(readout, population, pulse, grid, options)
+                results[pulse.qubit] = results[pulse.serial] = options.results_type(
+                    values
+                )
+                # the measurement collapses the qubit, which then relaxes
+                since = pulse.finish
+
+        if self.time_scale > 0:
+            duration = (sequence.duration + options.relaxation_time) * options.nshots
+            time.sleep(self.time_scale * duration * NS * int(np.prod(grid.shape)))
+        return results
+
+    def play(self, qubits, couplers, sequence, options: ExecutionParameters):
+        return self._execute(qubits, sequence, options, [])
+
+    def sweep(
+        self, qubits, couplers, sequence, options: ExecutionParameters, *sweepers
+    ):
+        return self._execute(qubits, sequence, options, list(sweepers))
+
+
+def _channels(platform):
+    """Channels of the qubits and couplers of a platform."""
+    from qibolab.qubits import CHANNEL_NAMES
+
+    channels = {}
+    for elements, lines in (
+        (platform.qubits, CHANNEL_NAMES),
+        (platform.couplers, ("flux",)),
+    ):
+        for element in elements.values():
+            for line in lines:
+                channel = getattr(element, line, None)
+                if channel is not None:
+                    channels[id(channel)] = channel
+    return list(channels.values())
+
+
+def simulate(platform, seed: Optional[int] = None, time_scale: float = 0):
+    """Replace the instruments of a platform with a :class:`Simulator`.
+
+    Channels, ports and qubits are left untouched, local oscillators are
+    replaced by dummy ones keeping their settings and the other
+    instruments are removed. The platform is modified in place and
+    returned.
+    """
+    controllers = [
+        instrument
+        for instrument in platform.instruments.values()
+        if isinstance(instrument, Controller)
+    ]
+    sampling_rate = controllers[0].sampling_rate if controllers else 1
+    simulator = Simulator(sampling_rate=sampling_rate, seed=seed, time_scale=time_scale)
+    instruments = {simulator.name: simulator}
+    oscillators = {}
+    for name, instrument in platform.instruments.items():
+        if isinstance(instrument, LocalOscillator):
+            oscillator = DummyLocalOscillator(name, instrument.address)
+            oscillator.settings = instrument.settings
+            instruments[name] = oscillators[id(instrument)] = oscillator
+    platform.instruments = instruments
+    # channels refer to the oscillators directly
+    for channel in _channels(platform):
+        original = channel.local_oscillator
+        if original is not None and id(original) in oscillators:
+            channel.local_oscillator = oscillators[id(original)]
+    platform.is_connected = False
+    return platform
@@ -0,0 +1,355 @@
+"""Time series of the calibration results, for drift tracking.
+
+Every calibration run appends the fitted values (T1, T2, assignment
+fidelities, ...) of each qubit to a :class:`CalibrationStore`, as a new
+segment: a ``.npy`` file holding a structured array with one record per
+value, with the columns of :data:`DTYPE`. Segments are never modified, such
+that concurrent runs and readers do not need any lock, and
+:meth:`CalibrationStore.compact` periodically merges those of a platform in
+a single one. Merged segments list the segments they supersede in a JSON
+file next to them, and readers skip those until they are removed.
+
+Segments are memory-mapped when read, and indexed by qubit and quantity,
+with the records of each series sorted by time, such that time windows are
+found with a binary search::
+
+    store = CalibrationStore()
+    series = store.series("qw5q_gold", 0, "T1", start=time.time() - 30 * DAY)
+    mean, std = series.rolling(DAY)
+
+The store is located in the folder given by the ``QRC_RESULTS`` environment
+variable, by default ``~/.cache/qrc/results``. The recent values and their
+rolling statistics are printed with::
+
+    python _selfhosted/store.py qw5q_gold [--quantity T1] [--days 30] [--window 1]
+
+and the segments of the platforms are merged with ``--compact``.
+"""
+
+import argparse
+import fcntl
+import io
+import itertools
+import json
+import os
+import pathlib
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+ENVIRONMENT_VARIABLE = "QRC_RESULTS"
+DEFAULT = pathlib.Path.home() / ".cache" / "qrc" / "results"
+SEGMENT = "segment-*.npy"
+SUPERSEDED = "segment-*.json"
+LOCK = ".compact.lock"
+DAY = 86400.0
+RETRIES = 3
+"""Times the segments are listed again when some disappear while loaded."""
+COMPACT = 32
+"""Segments of a platform above which calibration runs merge them."""
+
+DTYPE = np.dtype(
+    [
+        ("timestamp", np.float64),
+        ("qubit", "U32"),
+        ("quantity", "U32"),
+        ("value", np.float64),
+        ("error", np.float64),
+        ("run", "U32"),
+    ]
+)
+"""Columns of the stored records. Qubits are encoded as in the runcard, and
+missing errors are ``nan``."""
+
+parser = argparse.ArgumentParser()
+parser.add_argument("names", type=str, nargs="+", help="Names of the platforms.")
+parser.add_argument("--quantity", type=str, default=None, help="Quantity to show.")
+parser.add_argument("--days", type=float, default=30, help="Days of data to use.")
+parser.add_argument(
+    "--window", type=float, default=1, help="Window of the rolling statistics, days."
+)
+parser.add_argument(
+    "--compact", action="store_true", help="Merge the segments of the platforms."
+)
+
+
+@dataclass
+class Series:
+    """Values of a quantity of a qubit, sorted by time."""
+
+    timestamps: np.ndarray
+    values: np.ndarray
+    errors: np.ndarray
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def rolling(self, window: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Mean and standard deviation of the values in the time window
+        ``(t - window, t]`` of every point, in seconds."""
+        if len(self) == 0:
+            return np.empty(0), np.empty(0)
+        values = self.values - self.values[0]
+        sums = np.concatenate(([0.0], np.cumsum(values)))
+        squares = np.concatenate(([0.0], np.cumsum(values**2)))
+        stop = np.arange(1, len(self) + 1)
+        start = np.searchsorted(self.timestamps, self.timestamps - window, "right")
+        count = stop - start
+        mean = (sums[stop] - sums[start]) / count
+        variance = (squares[stop] - squares[start]) / count - mean**2
+        return mean + self.values[0], np.sqrt(np.maximum(variance, 0))
+
+
+@dataclass
+class _Table:
+    stamp: tuple
+    records: np.ndarray
+    """Records of all the segments, sorted by qubit, quantity and time."""
+    index: Dict[Tuple[str, str], slice]
+
+
+def _qubit(qubit) -> str:
+    return json.dumps(qubit)
+
+
+def _replace(path: pathlib.Path, content: bytes):
+    """Write a file atomically."""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".segment-")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(content)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class CalibrationStore:
+    """Append-only store of the calibration results of all platforms.
+
+    Args:
+        root (pathlib.Path): Folder of the store, by default the one given by
+            the ``QRC_RESULTS`` environment variable.
+    """
+
+    def __init__(self, root: Optional[pathlib.Path] = None):
+        if root is None:
+            root = os.environ.get(ENVIRONMENT_VARIABLE, DEFAULT)
+        self.root = pathlib.Path(root)
+        self._tables: Dict[str, _Table] = {}
+
+    def platforms(self) -> List[str]:
+        if not self.root.exists():
+            return []
+        return sorted(path.name for path in self.root.iterdir() if path.is_dir())
+
+    def _segments(self, platform: str) -> List[pathlib.Path]:
+        """Segments of a platform, except those already merged in another
+        one."""
+        folder = self.root / platform
+        segments = sorted(folder.glob(SEGMENT))
+        # listed after the segments, since they are written before them
+        names = {path.name for path in segments}
+        superseded = set()
+        for path in folder.glob(SUPERSEDED):
+            if path.with_suffix(".npy").name in names:
+                try:
+                    superseded.update(json.loads(path.read_text()))
+                except FileNotFoundError:
+                    pass
+        return [path for path in segments if path.name not in superseded]
+
+    def _write(
+        self,
+        platform: str,
+        records: np.ndarray,
+        supersedes: Optional[List[str]] = None,
+    ) -> pathlib.Path:
+        folder = self.root / platform
+        folder.mkdir(parents=True, exist_ok=True)
+        path = folder / f"segment-{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.npy"
+        if supersedes:
+            # in place before the segment, such that it is never read twice
+            _replace(path.with_suffix(".json"), json.dumps(list(supersedes)).encode())
+        buffer = io.BytesIO()
+        np.save(buffer, records)
+        _replace(path, buffer.getvalue())
+        return path
+
+    def append(
+        self,
+        platform: str,
+        values: Iterable[tuple],
+        timestamp: Optional[float] = None,
+        run: str = "",
+    ) -> Optional[pathlib.Path]:
+        """Store the results of a run as a new segment.
+
+        Args:
+            platform (str): Name of the platform.
+            values: ``(qubit, quantity, value)`` or
+                ``(qubit, quantity, value, error)`` tuples.
+            timestamp (float): Time of the results, now by default.
+            run (str): Identifier of the run.
+
+        Returns:
+            The path of the segment, ``None`` if there are no values.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        rows = [
+            (timestamp, _qubit(qubit), quantity, value, *(rest or [np.nan]), run)
+            for qubit, quantity, value, *rest in values
+        ]
+        if len(rows) == 0:
+            return None
+        return self._write(platform, np.array(rows, dtype=DTYPE))
+
+    def _table(self, platform: str) -> _Table:
+        """Records of a platform, cached until its segments change."""
+        for attempt in itertools.count():
+            segments = self._segments(platform)
+            stamp = tuple(path.name for path in segments)
+            table = self._tables.get(platform)
+            if table is not None and table.stamp == stamp:
+                return table
+            try:
+                parts = [np.load(path, mmap_mode="r") for path in segments]
+                break
+            except FileNotFoundError:
+                # segments merged by compact() meanwhile, list them again
+                if attempt >= RETRIES:
+                    raise
+        records = np.concatenate(parts) if parts else np.empty(0, dtype=DTYPE)
+        order = np.lexsort(
+            (records["timestamp"], records["quantity"], records["qubit"])
+        )
+        records = records[order]
+        keys = np.stack([records["qubit"], records["quantity"]], axis=-1)
+        boundaries = np.flatnonzero(np.any(keys[1:] != keys[:-1], axis=-1)) + 1
+        starts = np.concatenate(([0], boundaries)) if len(records) else []
+        stops = np.concatenate((boundaries, [len(records)])) if len(records) else []
+        index = {
+            (str(records["qubit"][a]), str(records["quantity"][a])): slice(a, b)
+            for a, b in zip(starts, stops)
+        }
+        table = _Table(stamp, records, index)
+        self._tables[platform] = table
+        return table
+
+    def series(
+        self,
+        platform: str,
+        qubit,
+        quantity: str,
+        start: Optional[float] = None,
+        stop: Optional[float] = None,
+    ) -> Series:
+        """Values of a quantity of a qubit in the time window
+        ``[start, stop)``."""
+        table = self._table(platform)
+        records = table.records[table.index.get((_qubit(qubit), quantity), slice(0))]
+        timestamps = records["timestamp"]
+        first = 0 if start is None else np.searchsorted(timestamps, start, "left")
+        last = len(records) if stop is None else np.searchsorted(timestamps, stop)
+        records = records[first:last]
+        return Series(records["timestamp"], records["value"], records["error"])
+
+    def query(
+        self,
+        platform: Optional[str] = None,
+        qubit=None,
+        quantity: Optional[str] = None,
+        start: Optional[float] = None,
+        stop: Optional[float] = None,
+    ) -> Dict[str, np.ndarray]:
+        """Records matching the given platform, qubit, quantity and time
+        window, for every platform."""
+        platforms = self.platforms() if platform is None else [platform]
+        result = {}
+        for name in platforms:
+            table = self._table(name)
+            chunks = [
+                table.records[indices]
+                for (qubit_, quantity_), indices in table.index.items()
+                if qubit in (None, json.loads(qubit_)) and quantity in (None, quantity_)
+            ]
+            records = np.concatenate(chunks) if chunks else table.records[:0]
+            mask = np.ones(len(records), dtype=bool)
+            if start is not None:
+                mask &= records["timestamp"] >= start
+            if stop is not None:
+                mask &= records["timestamp"] < stop
+            result[name] = records[mask]
+        return result
+
+    def quantities(self, platform: str) -> List[Tuple[object, str]]:
+        """Qubits and quantities stored for a platform."""
+        return [
+            (json.loads(qubit), quantity)
+            for qubit, quantity in self._table(platform).index
+        ]
+
+    def compact(self, platform: str, minimum: int = 2) -> Optional[pathlib.Path]:
+        """Merge the segments of a platform in a single one.
+
+        Segments appended meanwhile are kept. The merged segment supersedes
+        the other ones as soon as it is in place, and readers loading them
+        while they are removed list them again. Compactions of the same
+        platform are serialized with a lock file.
+
+        Args:
+            platform (str): Name of the platform.
+            minimum (int): Merge only if there are at least these many
+                segments.
+
+        Returns:
+            The path of the merged segment, ``None`` if nothing was merged.
+        """
+        folder = self.root / platform
+        if not folder.exists():
+            return None
+        with open(folder / LOCK, "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            segments = self._segments(platform)
+            if len(segments) < max(minimum, 2):
+                return None
+            records = np.concatenate([np.load(path) for path in segments])
+            records = records[np.argsort(records["timestamp"], kind="stable")]
+            path = self._write(platform, records, [path.name for path in segments])
+            for segment in segments:
+                segment.unlink()
+            for segment in segments:
+                segment.with_suffix(".json").unlink(missing_ok=True)
+        return path
+
+
+store = CalibrationStore()
+"""Calibration store of the current process."""
+
+
+def main(names, quantity=None, days=30, window=1, compact=False):
+    now = time.time()
+    for name in names:
+        if compact:
+            store.compact(name)
+        print(f"{name}:")
+        for qubit, quantity_ in store.quantities(name):
+            if quantity not in (None, quantity_):
+                continue
+            series = store.series(name, qubit, quantity_, start=now - days * DAY)
+            if len(series) == 0:
+                continue
+            mean, std = series.rolling(window * DAY)
+            print(
+                f"  {qubit} {quantity_}: {series.values[-1]:.4g} "
+                f"(mean {mean[-1]:.4g}, std {std[-1]:.2g}, {len(series)} values)"
+            )
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    main(args.names, args.quantity, args.days, args.window, args.compact)
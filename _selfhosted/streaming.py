@@ -0,0 +1,271 @@
+"""Streaming readout characterization with online statistics.
+
+Single shots are acquired in chunks, for the qubits prepared in the ground
+and in the excited state, and reduced as soon as they arrive to:
+
+- the number of shots, mean and scatter matrix of the IQ points of each
+  qubit and state, merged chunk by chunk (Chan's parallel algorithm),
+- a 2D histogram of the IQ points of each qubit and state, on a fixed grid
+  chosen from the first chunk (outliers are accumulated in the border bins).
+
+Memory is thus independent of the number of shots: the shots of every chunk
+are written into the same preallocated :class:`buffers.ResultBuffer`, and
+reduced from views of it. The classifier
+(``iq_angle`` and ``threshold``) and the ``assignment_fidelity`` are computed
+from the histograms as in :class:`qibocal.fitting.classifier.qubit_fit.QubitFit`.
+A qubit stops being measured as soon as the half-width of the confidence
+interval of its assignment fidelity falls below ``tolerance``, or when
+``nshots`` shots have been acquired.
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, Tuple
+
+import numpy as np
+import numpy.typing as npt
+from batched import sweep
+from buffers import ResultBuffer
+from qibocal.auto.operation import Data, Parameters, Qubits, Results, Routine
+from qibocal.config import log
+from qibolab import AcquisitionType, AveragingMode, ExecutionParameters
+from qibolab.platform import Platform
+from qibolab.pulses import PulseSequence
+from qibolab.qubits import QubitId
+from qibolab.sweeper import Parameter, Sweeper, SweeperType
+from scipy.special import ndtri
+from tracing import span
+
+BINS = 128
+"""Number of bins of the IQ histograms, along each axis."""
+MARGIN = 6
+"""Half-width of the histogram range, in standard deviations of the shots of
+the first chunk."""
+
+
+@dataclass
+class StreamingReadoutParameters(Parameters):
+    """Streaming readout characterization runcard inputs."""
+
+    chunk: int = 2000
+    """Shots acquired for each state in every chunk."""
+    tolerance: float = 0.005
+    """Half-width of the confidence interval on the assignment fidelity below
+    which a qubit is done."""
+    confidence: float = 0.95
+    """Confidence level of the interval."""
+    min_shots: int = 4000
+    """Shots acquired before checking the confidence interval."""
+
+
+@dataclass
+class StreamingReadoutData(Data):
+    """Streaming readout characterization acquisition outputs."""
+
+    confidence: float = 0.95
+    """Confidence level of the interval on the assignment fidelity."""
+    moments: Dict[Tuple[QubitId, int], npt.NDArray] = field(default_factory=dict)
+    """Number of shots, mean (2) and scatter matrix (2x2) of the IQ points of
+    each qubit and state, flattened."""
+    ranges: Dict[QubitId, npt.NDArray] = field(default_factory=dict)
+    """Range of the histograms, as ``[[i_min, i_max], [q_min, q_max]]``."""
+    data: Dict[QubitId, npt.NDArray] = field(default_factory=dict)
+    """IQ histograms of each qubit, for the ground and excited state."""
+
+    def update(self, chunk: Dict[Tuple[QubitId, int], np.ndarray]):
+        """Reduce a chunk of single shots (IQ points with shape ``(shots,
+        2)``), keyed by qubit and prepared state."""
+        for (qubit, state), points in chunk.items():
+            if qubit not in self.ranges:
+                # the range must contain the shots of both states
+                both = np.concatenate([chunk[key] for key in chunk if key[0] == qubit])
+                center = both.mean(axis=0)
+                width = MARGIN * max(both.std(axis=0).max(), np.finfo(float).tiny)
+                self.ranges[qubit] = np.stack([center - width, center + width], -1)
+                self.data[qubit] = np.zeros((2, BINS, BINS), dtype=np.int64)
+            self.moments[qubit, state] = merge(
+                self.moments.get((qubit, state)), moments(points)
+            )
+            low, high = self.ranges[qubit][:, 0], self.ranges[qubit][:, 1]
+            index = ((points - low) / (high - low) * BINS).astype(np.int64)
+            index = np.clip(index, 0, BINS - 1)
+            np.add.at(self.data[qubit][state], (index[:, 0], index[:, 1]), 1)
+
+    def nshots(self, qubit: QubitId) -> int:
+        return int(min(self.moments[qubit, state][0] for state in (0, 1)))
+
+
+@dataclass
+class StreamingReadoutResults(Results):
+    """Streaming readout characterization outputs."""
+
+    assignment_fidelity: Dict[QubitId, float]
+    """Assignment fidelity."""
+    fidelity: Dict[QubitId, float]
+    """Fidelity of the measurement."""
+    error: Dict[QubitId, float]
+    """Half-width of the confidence interval on the assignment fidelity."""
+    threshold: Dict[QubitId, float]
+    iq_angle: Dict[QubitId, float]
+    mean_gnd_states: Dict[QubitId, list]
+    mean_exc_states: Dict[QubitId, list]
+    covariance_gnd_states: Dict[QubitId, list]
+    covariance_exc_states: Dict[QubitId, list]
+    nshots: Dict[QubitId, int]
+    """Shots acquired for each state."""
+
+
+def moments(points: np.ndarray) -> np.ndarray:
+    """Number of points, mean and scatter matrix of 2D points, flattened."""
+    mean = points.mean(axis=0)
+    centered = points - mean
+    return np.concatenate([[len(points)], mean, (centered.T @ centered).ravel()])
+
+
+def merge(first, second: np.ndarray) -> np.ndarray:
+    """Merge the moments of two sets of points."""
+    if first is None:
+        return second
+    n1, n2 = first[0], second[0]
+    n = n1 + n2
+    delta = second[1:3] - first[1:3]
+    mean = first[1:3] + delta * n2 / n
+    scatter = first[3:] + second[3:] + np.outer(delta, delta).ravel() * n1 * n2 / n
+    return np.concatenate([[n], mean, scatter])
+
+
+def classify(histograms: np.ndarray, ranges: np.ndarray, angle: float):
+    """Optimal threshold along the rotated I axis.
+
+    Returns the threshold and the probability of assigning each state to
+    the wrong one.
+    """
+    low, high = ranges[:, 0], ranges[:, 1]
+    centers = [
+        low[k] + (np.arange(BINS) + 0.5) * (high[k] - low[k]) / BINS for k in (0, 1)
+    ]
+    i, q = np.meshgrid(*centers, indexing="ij")
+    projection = (i * np.cos(angle) - q * np.sin(angle)).ravel()
+    order = np.argsort(projection)
+    cumulative = [
+        np.cumsum(histograms[state].ravel()[order]) / histograms[state].sum()
+        for state in (0, 1)
+    ]
+    best = np.argmax(cumulative[0] - cumulative[1])
+    threshold = projection[order][best]
+    return threshold, 1 - cumulative[0][best], cumulative[1][best]
+
+
+def fit_qubit(data: StreamingReadoutData, qubit: QubitId):
+    """Classifier and fidelities of a qubit, from its current statistics."""
+    ground, excited = data.moments[qubit, 0], data.moments[qubit, 1]
+    delta = excited[1:3] - ground[1:3]
+    angle = -np.arctan2(delta[1], delta[0])
+    threshold, error0, error1 = classify(data.data[qubit], data.ranges[qubit], angle)
+    variance = (
+        error0 * (1 - error0) / ground[0] + error1 * (1 - error1) / excited[0]
+    ) / 4
+    z = ndtri((1 + data.confidence) / 2)
+    return dict(
+        assignment_fidelity=1 - (error0 + error1) / 2,
+        fidelity=1 - error0 - error1,
+        error=z * np.sqrt(variance),
+        threshold=threshold,
+        iq_angle=angle,
+    )
+
+
+def stream(
+    platform: Platform, qubits: Qubits, chunk: int, relaxation_time=None
+) -> Iterator[Dict[Tuple[QubitId, int], np.ndarray]]:
+    """Acquire chunks of single shots, indefinitely.
+
+    Each chunk maps the qubit and prepared state to the IQ points of the
+    shots. These are views of a buffer which is overwritten by the following
+    chunk. The qubits measured can be changed between chunks by sending a new
+    collection with :meth:`generator.send`.
+    """
+    options = ExecutionParameters(
+        nshots=chunk,
+        relaxation_time=relaxation_time,
+        acquisition_type=AcquisitionType.INTEGRATION,
+        averaging_mode=AveragingMode.SINGLESHOT,
+    )
+    qubits = list(qubits)
+    while qubits:
+        sequence = PulseSequence()
+        rx_pulses = []
+        for qubit in qubits:
+            rx_pulse = platform.create_RX_pulse(qubit, start=0)
+            sequence.add(rx_pulse, platform.create_MZ_pulse(qubit, rx_pulse.finish))
+            rx_pulses.append(rx_pulse)
+        # the ground state is prepared by a pulse without amplitude
+        states = Sweeper(
+            Parameter.amplitude, np.array([0, 1]), rx_pulses, type=SweeperType.FACTOR
+        )
+        buffer = ResultBuffer.allocate(
+            [pulse.qubit for pulse in sequence.ro_pulses], (2,), chunk
+        )
+        measured = qubits
+        while qubits == measured:
+            sweep(platform, sequence, options, states, out=buffer)
+            update = yield {
+                (qubit, state): buffer.iq(qubit)[state]
+                for qubit in qubits
+                for state in (0, 1)
+            }
+            if update is not None:
+                qubits = list(update)
+
+
+def _acquisition(
+    params: StreamingReadoutParameters, platform: Platform, qubits: Qubits
+) -> StreamingReadoutData:
+    """Data acquisition for the streaming readout characterization."""
+    data = StreamingReadoutData(confidence=params.confidence)
+    nshots = params.nshots if params.nshots is not None else params.chunk
+    active = list(qubits)
+    chunks = stream(platform, active, params.chunk, params.relaxation_time)
+    shots = next(chunks)
+    while True:
+        data.update(shots)
+        done = []
+        for qubit in active:
+            acquired = data.nshots(qubit)
+            if acquired >= nshots:
+                done.append(qubit)
+            elif acquired >= params.min_shots:
+                fit = fit_qubit(data, qubit)
+                if fit["error"] < params.tolerance:
+                    log.info(f"Readout of qubit {qubit} converged in {acquired} shots.")
+                    done.append(qubit)
+        active = [qubit for qubit in active if qubit not in done]
+        if len(active) == 0:
+            chunks.close()
+            return data
+        shots = chunks.send(active)
+
+
+def _fit(data: StreamingReadoutData) -> StreamingReadoutResults:
+    """Classifier and assignment fidelity of every qubit."""
+    results = {name: {} for name in StreamingReadoutResults.__dataclass_fields__}
+    for qubit in data.qubits:
+        with span("fit_qubit", "fit", qubit=qubit):
+            fit = fit_qubit(data, qubit)
+        for name, value in fit.items():
+            results[name][qubit] = float(value)
+        for state, name in enumerate(("gnd", "exc")):
+            n, *mean = data.moments[qubit, state][:3]
+            scatter = data.moments[qubit, state][3:]
+            results[f"mean_{name}_states"][qubit] = list(mean)
+            results[f"covariance_{name}_states"][qubit] = list(scatter / max(n - 1, 1))
+        results["nshots"][qubit] = data.nshots(qubit)
+    return StreamingReadoutResults(**results)
+
+
+def _plot(data: StreamingReadoutData, qubit, fit: StreamingReadoutResults = None):
+    """No plots are produced for streaming readout characterization."""
+    return [], None
+
+
+streaming_readout = Routine(_acquisition, _fit, _plot)
+"""Streaming readout characterization routine object."""
@@ -0,0 +1,259 @@
+"""Adaptive delay sweeps for coherence (T1 and T2) experiments.
+
+Instead of sweeping the same linear range on all qubits, the delays of each
+qubit are seeded from the coherence time stored in its runcard and are
+log-spaced up to a few coherence times. The acquisition proceeds in rounds:
+after each round the decay of every qubit is fitted, and the following
+round only adds points where the signal is most sensitive to the decay
+time (around the current estimate). Qubits whose decay time is known with
+a relative uncertainty below ``tolerance`` are not measured anymore.
+
+Each round is a single sweep, in which every qubit is delayed by its own
+amount, executed as few unrolled programs with :func:`batched.sweep`.
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+import numpy.typing as npt
+from batched import sweep
+from qibocal.auto.operation import Data, Parameters, Qubits, Results, Routine
+from qibocal.config import log
+from qibolab import AcquisitionType, AveragingMode, ExecutionParameters
+from qibolab.platform import Platform
+from qibolab.pulses import PulseSequence
+from qibolab.qubits import QubitId
+from qibolab.sweeper import Parameter, Sweeper, SweeperType
+from scipy.optimize import curve_fit
+from tracing import span
+
+CoherenceType = np.dtype(
+    [("wait", np.float64), ("signal", np.float64), ("phase", np.float64)]
+)
+"""Custom dtype for coherence routines."""
+
+DEFAULT_TIME = 4000
+"""Coherence time in ns assumed for qubits without a value in the runcard."""
+MIN_DELAY = 16
+"""Shortest delay in ns."""
+
+
+@dataclass
+class AdaptiveCoherenceParameters(Parameters):
+    """Adaptive coherence runcard inputs."""
+
+    kind: str = "t1"
+    """Experiment to perform, either ``"t1"`` or ``"t2"`` (Ramsey)."""
+    points: int = 10
+    """Number of delays added to each qubit in every round."""
+    rounds: int = 3
+    """Maximum number of acquisition rounds."""
+    span: float = 5
+    """Longest delay of the first round, in units of the coherence time."""
+    tolerance: float = 0.05
+    """Relative uncertainty on the fitted time below which a qubit is done."""
+
+
+@dataclass
+class AdaptiveCoherenceData(Data):
+    """Adaptive coherence acquisition outputs."""
+
+    kind: str = "t1"
+    """Experiment performed."""
+    data: Dict[QubitId, npt.NDArray] = field(default_factory=dict)
+    """Raw data acquired."""
+
+
+@dataclass
+class AdaptiveCoherenceResults(Results):
+    """Adaptive coherence outputs."""
+
+    time: Dict[QubitId, float]
+    """Fitted coherence time for each qubit [ns]."""
+    error: Dict[QubitId, float]
+    """Standard deviation of the fitted coherence time [ns]."""
+    fitted_parameters: Dict[QubitId, List[float]]
+    """Parameters of :func:`exp_decay`."""
+
+    @property
+    def t1(self) -> Dict[QubitId, tuple]:
+        """Fitted time and its error, as in
+        :class:`qibocal.protocols.characterization.coherence.t1.T1Results`."""
+        return {qubit: (time, self.error[qubit]) for qubit, time in self.time.items()}
+
+    @property
+    def t2(self) -> Dict[QubitId, tuple]:
+        return self.t1
+
+
+def exp_decay(x, *p):
+    return p[0] - p[1] * np.exp(-1 * x / p[2])
+
+
+def fit_decay(waits: np.ndarray, signal: np.ndarray):
+    """Fit an exponential decay.
+
+    Returns the fitted parameters of :func:`exp_decay` and the standard
+    deviation of the decay time, which is infinite if the fit failed.
+    """
+    try:
+        y_min, y_max = np.min(signal), np.max(signal)
+        y = (signal - y_min) / (y_max - y_min)
+        scale = np.max(waits)
+        popt, pcov = curve_fit(
+            exp_decay,
+            waits / scale,
+            y,
+            p0=[0.5, 0.5, 0.3],
+            maxfev=20000,
+            bounds=([-2, -2, 0], [2, 2, np.inf]),
+        )
+        popt = [
+            (y_max - y_min) * popt[0] + y_min,
+            (y_max - y_min) * popt[1],
+            popt[2] * scale,
+        ]
+        error = np.sqrt(pcov[2, 2]) * scale
+        if not np.isfinite(error):
+            error = np.inf
+    except Exception as e:
+        log.warning(f"Exp decay fitting was not succesful. {e}")
+        popt, error = [0, 0, 0], np.inf
+    return popt, error
+
+
+def initial_delays(time: float, points: int, span: float) -> np.ndarray:
+    """Log-spaced delays up to ``span`` times the given coherence time."""
+    end = max(span * time, 2 * MIN_DELAY)
+    return np.unique(np.geomspace(MIN_DELAY, end, points).astype(int))
+
+
+def refined_delays(time: float, points: int) -> np.ndarray:
+    """Delays around the coherence time, where the decay is most sensitive
+    to it."""
+    return np.unique(np.geomspace(time / 3, 3 * time, points).astype(int))
+
+
+def _sequence(platform: Platform, kind: str, qubits):
+    """Sequence measuring each qubit right after its excitation.
+
+    Returns the sequence, the readout pulse of each qubit and the pulses of
+    each qubit following the delay.
+    """
+    sequence = PulseSequence()
+    ro_pulses, delayed = {}, {}
+    for qubit in qubits:
+        if kind == "t1":
+            pulses = [platform.create_RX_pulse(qubit, start=0)]
+        else:
+            first = platform.create_RX90_pulse(qubit, start=0)
+            pulses = [first, platform.create_RX90_pulse(qubit, start=first.finish)]
+        ro_pulses[qubit] = platform.create_qubit_readout_pulse(
+            qubit, start=pulses[-1].finish
+        )
+        delayed[qubit] = pulses[1:] + [ro_pulses[qubit]]
+        sequence.add(*pulses, ro_pulses[qubit])
+    return sequence, ro_pulses, delayed
+
+
+def _acquire(platform, params, data, delays: Dict[QubitId, np.ndarray]):
+    """Acquire one round, sweeping the delays of all qubits together.
+
+    Qubits with fewer delays repeat their last one, which is not recorded.
+    """
+    length = max(len(values) for values in delays.values())
+    sequence, ro_pulses, delayed = _sequence(platform, params.kind, delays)
+    sweepers = [
+        Sweeper(
+            Parameter.start,
+            np.pad(values, (0, length - len(values)), mode="edge"),
+            delayed[qubit],
+            type=SweeperType.OFFSET,
+        )
+        for qubit, values in delays.items()
+    ]
+    results = sweep(
+        platform,
+        sequence,
+        ExecutionParameters(
+            nshots=params.nshots,
+            relaxation_time=params.relaxation_time,
+            acquisition_type=AcquisitionType.INTEGRATION,
+            averaging_mode=AveragingMode.CYCLIC,
+        ),
+        sweepers,
+    )
+    for qubit, values in delays.items():
+        result = results[ro_pulses[qubit].serial][: len(values)]
+        data.register_qubit(
+            CoherenceType,
+            qubit,
+            dict(wait=values, signal=np.abs(result), phase=np.angle(result)),
+        )
+
+
+def _acquisition(
+    params: AdaptiveCoherenceParameters, platform: Platform, qubits: Qubits
+) -> AdaptiveCoherenceData:
+    """Data acquisition for adaptive T1 or T2 experiments.
+
+    Delays are seeded from the ``T1`` or ``T2`` characterization of each
+    qubit and refined in rounds, until all decay times are known with the
+    required precision or ``rounds`` are exhausted.
+    """
+    data = AdaptiveCoherenceData(kind=params.kind)
+    attribute = "T1" if params.kind == "t1" else "T2"
+    seeds = {
+        qubit: getattr(qubits[qubit], attribute) or DEFAULT_TIME for qubit in qubits
+    }
+    delays = {
+        qubit: initial_delays(seed, params.points, params.span)
+        for qubit, seed in seeds.items()
+    }
+    for _ in range(params.rounds):
+        _acquire(platform, params, data, delays)
+        delays = {}
+        for qubit in qubits:
+            popt, error = fit_decay(data[qubit].wait, data[qubit].signal)
+            time = popt[2]
+            if time > 0 and error / time < params.tolerance:
+                continue
+            # refine around the current estimate, or around the seed if
+            # nothing could be fitted yet
+            center = time if time > 0 and np.isfinite(error) else seeds[qubit]
+            new = np.setdiff1d(refined_delays(center, params.points), data[qubit].wait)
+            if len(new) > 0:
+                delays[qubit] = new
+        if len(delays) == 0:
+            break
+    return data
+
+
+def _fit(data: AdaptiveCoherenceData) -> AdaptiveCoherenceResults:
+    """Fit the exponential decay of every qubit.
+
+    .. math::
+
+        y = p_0-p_1 e^{-x / p_2}.
+    """
+    times, errors, fitted_parameters = {}, {}, {}
+    for qubit in data.qubits:
+        order = np.argsort(data[qubit].wait)
+        with span("fit_decay", "fit", qubit=qubit):
+            popt, error = fit_decay(data[qubit].wait[order], data[qubit].signal[order])
+        times[qubit] = popt[2]
+        errors[qubit] = error
+        fitted_parameters[qubit] = popt
+    return AdaptiveCoherenceResults(times, errors, fitted_parameters)
+
+
+def _plot(
+    data: AdaptiveCoherenceData, qubit, fit: Optional[AdaptiveCoherenceResults] = None
+):
+    """No plots are produced for adaptive sweeps."""
+    return [], None
+
+
+adaptive_coherence = Routine(_acquisition, _fit, _plot)
+"""Adaptive T1/T2 routine object."""
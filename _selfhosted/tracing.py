@@ -0,0 +1,290 @@
+"""Lightweight tracing of the calibration runs.
+
+Spans are recorded with :func:`span`, as context managers, and can be
+exported to a Chrome trace file (``chrome://tracing`` or
+https://ui.perfetto.dev)::
+
+    with span("fit", experiment="T1", qubit=0):
+        ...
+
+    tracer.export("trace.json")
+
+Tracers keep the latest :data:`MAX_SPANS` spans. Runs sharing a process
+select their own spans with :meth:`Tracer.mark`::
+
+    start = tracer.mark()
+    ...
+    events = tracer.events(since=start)
+
+Each span belongs to a phase (``connect``, ``compile``, ``upload``,
+``acquisition``, ``transfer``, ``fit``, ...). Besides its duration, every
+span keeps its self time, i.e. the time not spent in nested spans, such that
+the self times of all phases add up to the total time of the run (see
+:meth:`Tracer.breakdown`).
+
+The methods of the instrument drivers corresponding to the different
+phases are traced by :func:`instrument`.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional
+
+PHASES = (
+    "connect",
+    "setup",
+    "start",
+    "compile",
+    "upload",
+    "acquisition",
+    "transfer",
+    "fit",
+    "stop",
+    "disconnect",
+)
+"""Phases reported in the breakdown, in order."""
+MAX_SPANS = 100000
+"""Spans kept by a tracer, the oldest ones are dropped first."""
+
+METHODS = {
+    "connect": "connect",
+    "setup": "setup",
+    "disconnect": "disconnect",
+    "play": "acquisition",
+    "sweep": "acquisition",
+    # Zurich Instruments
+    "experiment_flow": "compile",
+    "run_exp": "acquisition",
+    # Qblox modules
+    "process_pulse_sequence": "compile",
+    "upload": "upload",
+    "play_sequence": "acquisition",
+    "acquire": "transfer",
+    # RFSoC (compilation happens on the board)
+    "_execute_pulse_sequence": "acquisition",
+    "_execute_sweeps": "acquisition",
+    "convert_sweep_results": "transfer",
+}
+"""Phase of the instrument methods traced by :func:`instrument`."""
+SESSION_METHODS = {"compile": "compile", "run": "acquisition"}
+"""Phase of the methods of the LabOne Q session of Zurich instruments."""
+
+
+@dataclass
+class Span:
+    name: str
+    phase: str
+    start: int
+    """Start time in ns, from :func:`time.perf_counter_ns`."""
+    duration: int = 0
+    children: int = 0
+    """Time spent in nested spans, in ns."""
+    args: dict = field(default_factory=dict)
+    thread: int = field(default_factory=threading.get_ident)
+    process: int = field(default_factory=os.getpid)
+
+    @property
+    def self_time(self) -> int:
+        return self.duration - self.children
+
+
+class Tracer:
+    """Collect spans of the current process."""
+
+    def __init__(self):
+        self.spans: Deque[Span] = deque(maxlen=MAX_SPANS)
+        self.recorded = 0
+        """Number of spans recorded since the tracer was created."""
+        self.processes: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin = (time.time_ns(), time.perf_counter_ns())
+
+    def _state(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+            self._local.context = {}
+        return self._local
+
+    @contextmanager
+    def context(self, **args):
+        """Attach the given arguments to all the spans opened inside, in the
+        current thread."""
+        state = self._state()
+        previous = state.context
+        state.context = {**previous, **args}
+        try:
+            yield
+        finally:
+            state.context = previous
+
+    @contextmanager
+    def span(self, name: str, phase: Optional[str] = None, **args):
+        """Record a span, marking it with the error raised inside, if any."""
+        state = self._state()
+        record = Span(
+            name,
+            phase or name,
+            time.perf_counter_ns(),
+            args={**state.context, **args},
+        )
+        state.stack.append(record)
+        try:
+            yield record
+        except BaseException as exception:
+            record.args["error"] = repr(exception)
+            raise
+        finally:
+            record.duration = time.perf_counter_ns() - record.start
+            state.stack.pop()
+            if state.stack:
+                state.stack[-1].children += record.duration
+            with self._lock:
+                self.spans.append(record)
+                self.recorded += 1
+
+    def extend(self, spans: List[Span]):
+        """Add spans recorded by another process."""
+        with self._lock:
+            self.spans.extend(spans)
+            self.recorded += len(spans)
+
+    def mark(self) -> int:
+        """Position of the following spans, to select them in :meth:`events`."""
+        return self.recorded
+
+    def name_process(self, name: str):
+        """Name the current process in the exported traces."""
+        self.processes[os.getpid()] = name
+
+    def clear(self):
+        with self._lock:
+            self.spans.clear()
+
+    def events(self, since: int = 0) -> List[dict]:
+        """Spans in the Chrome trace event format.
+
+        Args:
+            since (int): Only include the spans recorded after this position
+                (see :meth:`mark`).
+        """
+        wall, perf = self._origin
+        events = [
+            {"name": "process_name", "ph": "M", "pid": pid, "args": {"name": name}}
+            for pid, name in self.processes.items()
+        ]
+        with self._lock:
+            later = min(self.recorded - since, len(self.spans))
+            spans = list(self.spans)[len(self.spans) - later :]
+        for record in spans:
+            events.append(
+                {
+                    "name": record.name,
+                    "cat": record.phase,
+                    "ph": "X",
+                    "ts": (wall + record.start - perf) / 1e3,
+                    "dur": record.duration / 1e3,
+                    "pid": record.process,
+                    "tid": record.thread,
+                    "args": {
+                        **{key: _json(value) for key, value in record.args.items()},
+                        "self_time_us": record.self_time / 1e3,
+                    },
+                }
+            )
+        return events
+
+    def export(self, path, events: Optional[List[dict]] = None):
+        """Write a Chrome trace file, by default with the spans of this
+        tracer."""
+        events = self.events() if events is None else events
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+
+def _json(value):
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_json(element) for element in value]
+    return str(value)
+
+
+def breakdown(events: List[dict], key: str = "experiment") -> Dict[str, Dict]:
+    """Self time in seconds spent in each phase, grouped by the value of one
+    of the span arguments (spans without it are grouped under ``None``)."""
+    table = defaultdict(lambda: defaultdict(float))
+    for event in events:
+        if event["ph"] != "X":
+            continue
+        group = event["args"].get(key)
+        table[group][event["cat"]] += event["args"]["self_time_us"] / 1e6
+    return {group: dict(phases) for group, phases in table.items()}
+
+
+def write_breakdown(events: List[dict], file, key: str = "experiment"):
+    """Write the time breakdown as a Markdown table."""
+    table = breakdown(events, key)
+    phases = [p for p in PHASES if any(p in row for row in table.values())]
+    phases += sorted({p for row in table.values() for p in row} - set(phases))
+    file.write("\n| | " + " | ".join(phases) + " | total |\n")
+    file.write("|---" * (len(phases) + 2) + "|\n")
+    for group, row in sorted(table.items(), key=lambda item: item[0] is not None):
+        cells = [f"{row[p]:.2f}" if p in row else "" for p in phases]
+        name = "platform" if group is None else group
+        file.write(
+            f"| {name} | " + " | ".join(cells) + f" | {sum(row.values()):.2f} |\n"
+        )
+
+
+tracer = Tracer()
+"""Tracer of the current process."""
+span = tracer.span
+context = tracer.context
+
+
+def _traced(method, name: str, phase: str, owner: str):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with span(name, phase, instrument=owner):
+            result = method(*args, **kwargs)
+        # the LabOne Q session only exists once connected
+        if phase == "connect":
+            instrument(wrapper.__self_instrument__)
+        return result
+
+    wrapper.__traced__ = True
+    return wrapper
+
+
+def _wrap(obj, methods: Dict[str, str], owner: str):
+    for name, phase in methods.items():
+        method = getattr(obj, name, None)
+        if callable(method) and not getattr(method, "__traced__", False):
+            wrapper = _traced(method, f"{owner}.{name}", phase, owner)
+            wrapper.__self_instrument__ = obj
+            setattr(obj, name, wrapper)
+
+
+def instrument(obj):
+    """Trace the methods of an instrument, or of all the instruments of a
+    platform. Calling it again has no further effect."""
+    instruments = getattr(obj, "instruments", None)
+    if isinstance(instruments, dict):
+        for value in instruments.values():
+            instrument(value)
+        return obj
+    owner = getattr(obj, "name", type(obj).__name__)
+    _wrap(obj, METHODS, owner)
+    for module in getattr(obj, "modules", {}).values():
+        instrument(module)
+    session = getattr(obj, "session", None)
+    if session is not None:
+        _wrap(session, SESSION_METHODS, f"{owner}.session")
+    return obj
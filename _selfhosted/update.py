@@ -0,0 +1,260 @@
+"""Incremental updates of the platform runcards.
+
+Calibration results are applied to ``parameters.json`` as a list of
+JSON-patch operations (RFC 6902, restricted to ``add`` and ``replace``),
+e.g.::
+
+    {"op": "replace", "path": "/characterization/single_qubit/0/T1", "value": 9500}
+
+Only the values that actually change are rewritten in the file, in place,
+preserving the formatting of the rest of the runcard, such that the git
+diff only contains the updated lines. Every applied patch is appended to a
+history file next to the runcard, which can be replayed to reconstruct the
+runcard at any point in time.
+"""
+
+import json
+import os
+import pathlib
+import tempfile
+import time
+from json.decoder import scanstring
+from typing import Any, Dict, List, Optional
+
+RUNCARD = "parameters.json"
+HISTORY = "parameters.history.jsonl"
+
+_decoder = json.JSONDecoder()
+
+
+def pointer(*parts) -> str:
+    """JSON pointer to a value of the runcard."""
+    return "".join(
+        "/" + str(part).replace("~", "~0").replace("/", "~1") for part in parts
+    )
+
+
+def _parts(path: str) -> List[str]:
+    if path == "":
+        return []
+    if not path.startswith("/"):
+        raise ValueError(f"Invalid JSON pointer {path}.")
+    return [part.replace("~1", "/").replace("~0", "~") for part in path[1:].split("/")]
+
+
+def characterization(qubit, key: str) -> str:
+    """Pointer to a characterization parameter of a qubit."""
+    return pointer("characterization", "single_qubit", json.dumps(qubit), key)
+
+
+def native_gate(qubit, gate: str, key: str) -> str:
+    """Pointer to a parameter of a single qubit native gate."""
+    return pointer("native_gates", "single_qubit", json.dumps(qubit), gate, key)
+
+
+def get(runcard, path: str):
+    """Value of the runcard at a JSON pointer."""
+    node = runcard
+    for part in _parts(path):
+        node = node[int(part)] if isinstance(node, list) else node[part]
+    return node
+
+
+def diff(runcard: dict, updates: Dict[str, Any]) -> List[dict]:
+    """Patch operations needed to bring the runcard to the given values.
+
+    Args:
+        runcard (dict): Current runcard.
+        updates (dict): New values, keyed by their JSON pointer.
+
+    Returns:
+        The list of operations, containing only the values that change.
+    """
+    operations = []
+    for path, value in updates.items():
+        try:
+            current = get(runcard, path)
+        except (KeyError, IndexError):
+            operations.append({"op": "add", "path": path, "value": value})
+            continue
+        if current != value:
+            operations.append({"op": "replace", "path": path, "value": value})
+    return operations
+
+
+def apply(runcard: dict, operations: List[dict]) -> dict:
+    """Apply patch operations to a runcard dictionary, in place."""
+    for operation in operations:
+        *parents, leaf = _parts(operation["path"])
+        node = get(runcard, pointer(*parents)) if parents else runcard
+        if operation["op"] == "replace" and leaf not in node:
+            raise KeyError(f"Cannot replace missing value {operation['path']}.")
+        if isinstance(node, list):
+            node[int(leaf)] = operation["value"]
+        else:
+            node[leaf] = operation["value"]
+    return runcard
+
+
+def _skip(text: str, index: int) -> int:
+    while index < len(text) and text[index] in " \t\n\r":
+        index += 1
+    return index
+
+
+def _members(text: str, index: int):
+    """Iterate over the members of the JSON object starting at ``index``.
+
+    Yields the key and the span of the value of each member.
+    """
+    index = _skip(text, index + 1)
+    if text[index] == "}":
+        return
+    while True:
+        key, index = scanstring(text, index + 1)
+        index = _skip(text, _skip(text, index) + 1)
+        _, end = _decoder.raw_decode(text, index)
+        yield key, index, end
+        index = _skip(text, end)
+        if text[index] == "}":
+            return
+        index = _skip(text, index + 1)
+
+
+def _elements(text: str, index: int):
+    """Iterate over the spans of the elements of the JSON array starting at
+    ``index``."""
+    index = _skip(text, index + 1)
+    if text[index] == "]":
+        return
+    while True:
+        _, end = _decoder.raw_decode(text, index)
+        yield index, end
+        index = _skip(text, end)
+        if text[index] == "]":
+            return
+        index = _skip(text, index + 1)
+
+
+def _locate(text: str, parts: List[str]):
+    """Span of the value at the given path in the JSON text."""
+    index = _skip(text, 0)
+    _, end = _decoder.raw_decode(text, index)
+    for part in parts:
+        if text[index] == "{":
+            spans = {key: (start, end) for key, start, end in _members(text, index)}
+            index, end = spans[part]
+        elif text[index] == "[":
+            index, end = list(_elements(text, index))[int(part)]
+        else:
+            raise KeyError(part)
+    return index, end
+
+
+def _indentation(text: str, index: int) -> str:
+    line = text[text.rfind("\n", 0, index) + 1 : index]
+    return line[: len(line) - len(line.lstrip())]
+
+
+def _dumps(value, indentation: str) -> str:
+    """Serialize a value to be inserted at the given indentation."""
+    if not isinstance(value, (dict, list)) or len(value) == 0:
+        return json.dumps(value)
+    return json.dumps(value, indent=4).replace("\n", "\n" + indentation)
+
+
+def _patch_text(text: str, operation: dict) -> str:
+    """Apply a single operation to the JSON text, preserving its format."""
+    *parents, leaf = _parts(operation["path"])
+    value = operation["value"]
+    try:
+        start, end = _locate(text, parents + [leaf])
+    except (KeyError, IndexError):
+        if operation["op"] == "replace":
+            raise KeyError(f"Cannot replace missing value {operation['path']}.")
+        start, end = _locate(text, parents)
+        if text[start] != "{":
+            raise ValueError(f"Cannot add {operation['path']} to a non object.")
+        members = list(_members(text, start))
+        indentation = _indentation(text, start) + "    "
+        if members:
+            _, _, last = members[-1]
+            member = f",\n{indentation}{json.dumps(leaf)}: {_dumps(value, indentation)}"
+            return text[:last] + member + text[last:]
+        closing = end - 1
+        member = f"\n{indentation}{json.dumps(leaf)}: {_dumps(value, indentation)}\n"
+        return text[: start + 1] + member + _indentation(text, start) + text[closing:]
+    return text[:start] + _dumps(value, _indentation(text, start)) + text[end:]
+
+
+def _write(path: pathlib.Path, text: str):
+    """Replace the content of a file atomically."""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "w") as file:
+            file.write(text)
+        if path.exists():
+            os.chmod(tmp, path.stat().st_mode)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def update_runcard(
+    folder: pathlib.Path, updates: Dict[str, Any], message: Optional[str] = None
+) -> List[dict]:
+    """Write new values to the runcard of a platform.
+
+    Only the changed values are rewritten and the applied operations are
+    appended to the history file.
+
+    Args:
+        folder (pathlib.Path): Platform folder.
+        updates (dict): New values, keyed by their JSON pointer (see
+            :func:`characterization` and :func:`native_gate`).
+        message (str): Optional description stored in the history.
+
+    Returns:
+        The list of applied operations.
+    """
+    path = pathlib.Path(folder) / RUNCARD
+    text = path.read_text()
+    operations = diff(json.loads(text), updates)
+    if len(operations) == 0:
+        return operations
+
+    for operation in operations:
+        text = _patch_text(text, operation)
+    _write(path, text)
+
+    entry = {"timestamp": time.time(), "operations": operations}
+    if message is not None:
+        entry["message"] = message
+    with open(pathlib.Path(folder) / HISTORY, "a") as file:
+        file.write(json.dumps(entry) + "\n")
+    return operations
+
+
+def history(folder: pathlib.Path) -> List[dict]:
+    """Entries of the update history of a platform, oldest first."""
+    path = pathlib.Path(folder) / HISTORY
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text().splitlines() if line]
+
+
+def replay(runcard: dict, entries: List[dict], until: Optional[float] = None) -> dict:
+    """Replay history entries on a runcard.
+
+    Args:
+        runcard (dict): Runcard the history starts from, modified in place.
+        entries (list): History entries, as returned by :func:`history`.
+        until (float): If given, only the entries up to this timestamp are
+            applied.
+    """
+    for entry in entries:
+        if until is not None and entry["timestamp"] > until:
+            break
+        apply(runcard, entry["operations"])
+    return runcard
@@ -0,0 +1,321 @@
+"""Consistency checks of the platform runcards, without instrument drivers.
+
+Mistakes in a ``parameters.json`` file (a qubit missing from a section, a
+two-qubit gate on a pair which is not in the topology, settings of an
+instrument which ``platform.py`` does not create, ...) only show up when the
+platform is created, or when it executes on the hardware. :func:`errors`
+finds them in a few milliseconds, reading only the runcard, the wiring and
+the source of ``platform.py``, which is parsed but not executed::
+
+    python _selfhosted/validation.py [names ...]
+
+The checks go through an :class:`Index` of the platform, which resolves
+once the cross-references between qubits, lines, channels, ports and
+instruments, and answers lookups in both directions::
+
+    index = load_index(folder)
+    index.channels(0)  # {"readout": "L3-25_a", "drive": "L4-28", ...}
+    index.instruments(0)  # {"qrm_rf_a", "qcm_rf0", "qcm_bb0", "twpa_pump"}
+    index.qubits_on("qrm_rf_a")  # [0, 1]
+"""
+
+import argparse
+import ast
+import json
+import pathlib
+import re
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from platforms import PLATFORM, list_platforms, locate
+from runcard import RUNCARD
+from wiring import WIRING, Wiring, _args
+
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    "names", type=str, nargs="*", help="Names of the platforms, all by default."
+)
+
+_cache: Dict[pathlib.Path, Tuple[tuple, dict, Wiring, "Index"]] = {}
+
+
+def _pattern(node: ast.AST) -> Optional[str]:
+    """Regular expression matching the values of a string literal."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return re.escape(node.value)
+    if isinstance(node, ast.JoinedStr):
+        return "".join(
+            re.escape(part.value) if isinstance(part, ast.Constant) else ".+"
+            for part in node.values
+        )
+    return None
+
+
+def instrument_names(source: str) -> List[str]:
+    """Patterns of the instrument names given in the source of a
+    ``platform.py``.
+
+    Names are the first argument, or the ``name`` argument, of the classes
+    created, and the string keys of dictionaries of objects.
+    """
+    patterns = []
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.Call):
+            func = node.func
+            callee = func.attr if isinstance(func, ast.Attribute) else func
+            callee = getattr(callee, "id", callee)
+            if not isinstance(callee, str) or not callee[:1].isupper():
+                continue
+            arguments = node.args[:1] + [
+                keyword.value for keyword in node.keywords if keyword.arg == "name"
+            ]
+            patterns += [_pattern(argument) for argument in arguments]
+        elif isinstance(node, ast.Dict):
+            keys = [(k, v) for k, v in zip(node.keys, node.values) if k is not None]
+            if all(isinstance(value, (ast.Name, ast.Call)) for _, value in keys):
+                patterns += [_pattern(key) for key, _ in keys]
+    return list(dict.fromkeys(p for p in patterns if p is not None))
+
+
+def _pair(key: str) -> tuple:
+    """Qubits of a two-qubit gate key, parsed as qibolab does."""
+    return tuple(int(q) if q.isdigit() else q for q in key.split("-"))
+
+
+@dataclass
+class Index:
+    """Cross-references between the elements of a platform."""
+
+    qubits: list
+    """Qubits, in the order of the runcard."""
+    couplers: list
+    lines: Dict = field(default_factory=dict)
+    """Channel of each line of every qubit, with the defaults applied."""
+    coupler_lines: Dict = field(default_factory=dict)
+    ports: Dict[str, tuple] = field(default_factory=dict)
+    """Instrument, arguments and keyword arguments of the port of every
+    channel."""
+    oscillators: Dict[str, str] = field(default_factory=dict)
+    """Local oscillator of every channel."""
+    pairs: Dict[tuple, Optional[object]] = field(default_factory=dict)
+    """Coupler of every pair of the topology, in both orders."""
+    users: Dict[str, List[tuple]] = field(default_factory=dict)
+    """Qubit and line using every channel."""
+    channels_of: Dict[str, List[str]] = field(default_factory=dict)
+    """Channels of every instrument."""
+
+    @classmethod
+    def build(cls, runcard: dict, wiring: Wiring) -> "Index":
+        characterization = runcard.get("characterization", {})
+        couplers = [json.loads(c) for c in characterization.get("coupler", {})]
+        index = cls(qubits=list(runcard.get("qubits", [])), couplers=couplers)
+        index.lines = wiring.assignments("qubits", index.qubits)
+        index.coupler_lines = wiring.assignments("couplers", couplers)
+
+        for name, spec in wiring.channels.items():
+            instruments = []
+            if spec.get("port"):
+                index.ports[name] = _args(spec["port"])
+                instruments.append(index.ports[name][0])
+            if spec.get("local_oscillator") is not None:
+                index.oscillators[name] = spec["local_oscillator"]
+                instruments.append(spec["local_oscillator"])
+            for instrument in instruments:
+                index.channels_of.setdefault(instrument, []).append(name)
+        for qubit, lines in index.lines.items():
+            for line, channel in lines.items():
+                index.users.setdefault(channel, []).append((qubit, line))
+
+        topology = runcard.get("topology", [])
+        if isinstance(topology, dict):
+            edges = [(json.loads(c), tuple(p)) for c, p in topology.items()]
+        else:
+            edges = [(None, tuple(p)) for p in topology]
+        for coupler, (q0, q1) in edges:
+            index.pairs[(q0, q1)] = index.pairs[(q1, q0)] = coupler
+        return index
+
+    def channels(self, qubit) -> Dict[str, str]:
+        """Channel of each line of a qubit."""
+        return self.lines[qubit]
+
+    def port(self, channel: str) -> Optional[tuple]:
+        return self.ports.get(channel)
+
+    def instruments(self, qubit) -> Set[str]:
+        """Instruments the lines of a qubit are connected to."""
+        result = set()
+        for channel in self.lines[qubit].values():
+            if channel in self.ports:
+                result.add(self.ports[channel][0])
+            if channel in self.oscillators:
+                result.add(self.oscillators[channel])
+        return result
+
+    def qubits_of(self, channel: str) -> list:
+        """Qubits using a channel."""
+        return list(dict.fromkeys(qubit for qubit, _ in self.users.get(channel, [])))
+
+    def qubits_on(self, instrument: str) -> list:
+        """Qubits with a line connected to an instrument."""
+        return list(
+            dict.fromkeys(
+                qubit
+                for channel in self.channels_of.get(instrument, [])
+                for qubit in self.qubits_of(channel)
+            )
+        )
+
+    def coupler(self, q0, q1):
+        """Coupler of a pair of qubits, ``KeyError`` if not in the
+        topology."""
+        return self.pairs[(q0, q1)]
+
+
+def _same(errors: list, what: str, expected: list, found) -> None:
+    found = list(found)
+    missing = [str(e) for e in expected if e not in found]
+    extra = [str(f) for f in found if f not in expected]
+    if missing:
+        errors.append(f"{what} misses {', '.join(missing)}.")
+    if extra:
+        errors.append(f"{what} has unknown {', '.join(extra)}.")
+
+
+def check(
+    runcard: dict, wiring: Wiring, index: Index, names: Optional[List[str]] = None
+) -> List[str]:
+    """Inconsistencies between a runcard, its wiring and the names of the
+    instruments (patterns, as given by :func:`instrument_names`)."""
+    errors = []
+    qubits, couplers = index.qubits, index.couplers
+    if runcard.get("nqubits", len(qubits)) != len(qubits):
+        errors.append(f"nqubits is {runcard['nqubits']} for {len(qubits)} qubits.")
+    characterization = runcard.get("characterization", {})
+    natives = runcard.get("native_gates", {})
+    single = characterization.get("single_qubit", {})
+    _same(errors, "characterization.single_qubit", qubits, map(json.loads, single))
+    _same(
+        errors,
+        "native_gates.single_qubit",
+        qubits,
+        map(json.loads, natives.get("single_qubit", {})),
+    )
+    if "coupler" in natives:
+        _same(
+            errors,
+            "native_gates.coupler",
+            couplers,
+            map(json.loads, natives["coupler"]),
+        )
+
+    topology = runcard.get("topology", [])
+    if isinstance(topology, dict) or couplers:
+        found = topology if isinstance(topology, dict) else {}
+        _same(errors, "topology", couplers, map(json.loads, found))
+        if "couplers" in runcard:
+            _same(errors, "couplers", couplers, runcard["couplers"])
+    for (q0, q1), _ in index.pairs.items():
+        for qubit in (q0, q1):
+            if qubit not in qubits:
+                errors.append(f"Pair {q0}-{q1} of the topology has unknown {qubit}.")
+
+    for key, gates in natives.get("two_qubit", {}).items():
+        pair = _pair(key)
+        if len(pair) != 2 or pair not in index.pairs:
+            errors.append(f"Two-qubit gates {key} act on a pair not in the topology.")
+            continue
+        for gate, pulses in gates.items():
+            for pulse in pulses if isinstance(pulses, list) else []:
+                if "qubit" in pulse and pulse["qubit"] not in qubits:
+                    errors.append(f"{gate} of {key} acts on unknown {pulse['qubit']}.")
+                if "coupler" in pulse and pulse["coupler"] not in couplers:
+                    errors.append(
+                        f"{gate} of {key} acts on unknown {pulse['coupler']}."
+                    )
+
+    errors += wiring.errors(qubits=qubits, couplers=couplers)
+    for qubit, lines in index.lines.items():
+        if "readout" not in lines:
+            errors.append(f"Qubit {qubit} has no readout line.")
+
+    if names is not None:
+        known = re.compile("|".join(f"(?:{name})" for name in names) or "$^")
+        for name in runcard.get("instruments", {}):
+            if not known.fullmatch(name):
+                errors.append(f"Settings of instrument {name}, not created.")
+        for name in index.channels_of:
+            if not known.fullmatch(name):
+                errors.append(f"Wiring refers to instrument {name}, not created.")
+    return errors
+
+
+def _stamp(folder: pathlib.Path) -> tuple:
+    return tuple(
+        (folder / name).stat().st_mtime_ns if (folder / name).exists() else None
+        for name in (RUNCARD, WIRING, PLATFORM)
+    )
+
+
+def _read(folder: pathlib.Path):
+    runcard = json.loads((folder / RUNCARD).read_text())
+    wiring = Wiring()
+    if (folder / WIRING).exists():
+        wiring = Wiring.load(json.loads((folder / WIRING).read_text()))
+    return runcard, wiring
+
+
+def _load(folder: pathlib.Path) -> Tuple[dict, Wiring, Index]:
+    """Runcard, wiring and index of a platform, cached until its files
+    change."""
+    stamp = _stamp(folder)
+    if folder not in _cache or _cache[folder][0] != stamp:
+        runcard, wiring = _read(folder)
+        _cache[folder] = (stamp, runcard, wiring, Index.build(runcard, wiring))
+    return _cache[folder][1:]
+
+
+def load_index(folder: pathlib.Path) -> Index:
+    """Index of a platform, cached until its files change."""
+    return _load(pathlib.Path(folder))[2]
+
+
+def errors(folder: pathlib.Path) -> List[str]:
+    """Inconsistencies of the runcard and wiring of a platform."""
+    folder = pathlib.Path(folder)
+    runcard, wiring, index = _load(folder)
+    names = None
+    if (folder / PLATFORM).exists():
+        names = instrument_names((folder / PLATFORM).read_text())
+    return check(runcard, wiring, index, names)
+
+
+def validate(folder: pathlib.Path):
+    """Raise an error listing all the inconsistencies of a platform."""
+    found = errors(folder)
+    if len(found) > 0:
+        raise ValueError(f"Invalid platform {folder}:\n" + "\n".join(found))
+
+
+def main(names=None):
+    if not names:
+        folders = list(list_platforms().values())
+    else:
+        folders = [locate(name) for name in names]
+    failed = False
+    for folder in folders:
+        begin = time.perf_counter()
+        found = errors(folder)
+        elapsed = (time.perf_counter() - begin) * 1e3
+        print(f"{folder.name}: {len(found)} errors in {elapsed:.1f} ms")
+        for error in found:
+            print(f"  {error}")
+        failed |= len(found) > 0
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    sys.exit(main(args.names))
@@ -0,0 +1,189 @@
+"""Declarative wiring of the platforms.
+
+The channels of a platform, the ports and local oscillators they are
+connected to, and the channels of every qubit and coupler are described in a
+``wiring.json`` file, next to the runcard::
+
+    {
+        "channels": {
+            "L3-25_a": {"port": ["qrm_rf_a", "o1"]},
+            "L2-5_a": {"port": ["qrm_rf_a", "i1", {"out": false}]},
+            "L4-5": {"port": ["qcm_bb0", "o1"], "max_bias": 2.5},
+            "L2-22": {"local_oscillator": "twpa_pump"}
+        },
+        "qubits": {
+            "*": {"twpa": "L2-22"},
+            "0": {"readout": "L3-25_a", "feedback": "L2-5_a", "flux": "L4-5"}
+        },
+        "couplers": {}
+    }
+
+Ports are given as the name of an instrument followed by the arguments of
+its ``ports`` method (lists are converted to tuples, a final object is passed
+as keyword arguments). Instruments are referred to with the names given to
+:meth:`Wiring.build` by the ``platform.py`` file, which still creates them.
+The other entries of a channel are set as its attributes. Qubits and
+couplers are identified as in the runcard, the lines listed under ``"*"``
+being assigned to all the qubits.
+
+Parsed and validated wirings are cached until their file changes.
+"""
+
+import json
+import pathlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+WIRING = "wiring.json"
+LINES = ("readout", "feedback", "drive", "flux", "twpa")
+"""Channels of a qubit, as :data:`qibolab.qubits.CHANNEL_NAMES`."""
+COUPLER_LINES = ("flux",)
+ALL = "*"
+
+_cache: Dict[pathlib.Path, Tuple[int, "Wiring"]] = {}
+
+
+def _id(key: str):
+    """Qubit or coupler identifier, encoded as in the runcard."""
+    return key if key == ALL else json.loads(key)
+
+
+def _args(spec: list) -> Tuple[str, tuple, dict]:
+    instrument, *args = spec
+    kwargs = args.pop() if len(args) > 0 and isinstance(args[-1], dict) else {}
+    args = tuple(tuple(arg) if isinstance(arg, list) else arg for arg in args)
+    return instrument, args, kwargs
+
+
+@dataclass
+class Wiring:
+    channels: Dict[str, dict] = field(default_factory=dict)
+    """Port, local oscillator and attributes of every channel."""
+    qubits: Dict = field(default_factory=dict)
+    """Channel of each line of every qubit."""
+    couplers: Dict = field(default_factory=dict)
+    """Channel of each line of every coupler."""
+    readout: Dict[str, dict] = field(default_factory=dict)
+    """Readout lines sharing the same feedline, see :mod:`multiplex`."""
+
+    @classmethod
+    def load(cls, data: dict) -> "Wiring":
+        return cls(
+            channels=dict(data.get("channels", {})),
+            qubits={_id(k): dict(v) for k, v in data.get("qubits", {}).items()},
+            couplers={_id(k): dict(v) for k, v in data.get("couplers", {}).items()},
+            readout=dict(data.get("readout", {})),
+        )
+
+    def dump(self) -> dict:
+        data = {
+            "channels": self.channels,
+            "qubits": {
+                k if k == ALL else json.dumps(k): v for k, v in self.qubits.items()
+            },
+            "couplers": {json.dumps(k): v for k, v in self.couplers.items()},
+        }
+        if len(self.readout) > 0:
+            data["readout"] = self.readout
+        return data
+
+    def save(self, folder: pathlib.Path):
+        """Write the wiring file, with one line per channel, qubit or
+        coupler."""
+        sections = []
+        for key, section in self.dump().items():
+            lines = [
+                f"        {json.dumps(k)}: {json.dumps(v)}" for k, v in section.items()
+            ]
+            body = "{\n" + ",\n".join(lines) + "\n    }" if lines else "{}"
+            sections.append(f"    {json.dumps(key)}: {body}")
+        text = "{\n" + ",\n".join(sections) + "\n}\n"
+        (pathlib.Path(folder) / WIRING).write_text(text)
+
+    def assignments(self, kind: str, names) -> Dict:
+        """Lines of the given qubits or couplers, with the defaults applied."""
+        section = getattr(self, kind)
+        defaults = section.get(ALL, {})
+        return {name: {**defaults, **section.get(name, {})} for name in names}
+
+    def errors(self, instruments=None, qubits=None, couplers=None) -> List[str]:
+        """Inconsistencies of the wiring, optionally checking the names of the
+        instruments, qubits and couplers it refers to."""
+        errors = []
+        for name, spec in self.channels.items():
+            port = spec.get("port")
+            references = [port[0]] if port else []
+            if spec.get("local_oscillator") is not None:
+                references.append(spec["local_oscillator"])
+            for reference in references:
+                if instruments is not None and reference not in instruments:
+                    errors.append(f"Channel {name} refers to unknown {reference}.")
+        for kind, lines, available in (
+            ("qubits", LINES, qubits),
+            ("couplers", COUPLER_LINES, couplers),
+        ):
+            for element, assignment in getattr(self, kind).items():
+                if element != ALL and available is not None:
+                    if element not in available:
+                        errors.append(f"Unknown {kind[:-1]} {element}.")
+                for line, channel in assignment.items():
+                    if line not in lines:
+                        errors.append(f"Unknown line {line} of {element}.")
+                    if channel not in self.channels:
+                        errors.append(f"Unknown channel {channel} of {element}.")
+        return errors
+
+    def validate(self, instruments=None, qubits=None, couplers=None):
+        """Raise an error listing all the inconsistencies of the wiring."""
+        errors = self.errors(instruments, qubits, couplers)
+        if len(errors) > 0:
+            raise ValueError("Invalid wiring:\n" + "\n".join(errors))
+
+    def build(self, instruments: dict, qubits: dict, couplers: Optional[dict] = None):
+        """Create the channels and assign them to the qubits and couplers.
+
+        Args:
+            instruments (dict): Instruments referred to by the wiring, by name.
+            qubits (dict): Qubits loaded from the runcard.
+            couplers (dict): Couplers loaded from the runcard.
+
+        Returns:
+            The :class:`qibolab.channels.ChannelMap` of the platform.
+        """
+        from qibolab.channels import Channel, ChannelMap
+
+        couplers = {} if couplers is None else couplers
+        self.validate(instruments, qubits, couplers)
+        channels = ChannelMap()
+        for name, spec in self.channels.items():
+            spec = dict(spec)
+            port = spec.pop("port", None)
+            if port is not None:
+                instrument, args, kwargs = _args(port)
+                port = instruments[instrument].ports(*args, **kwargs)
+            channel = Channel(name, port=port)
+            local_oscillator = spec.pop("local_oscillator", None)
+            if local_oscillator is not None:
+                channel.local_oscillator = instruments[local_oscillator]
+            for attribute, value in spec.items():
+                setattr(channel, attribute, value)
+            channels |= channel
+
+        for elements, kind in ((qubits, "qubits"), (couplers, "couplers")):
+            for name, lines in self.assignments(kind, elements).items():
+                for line, channel in lines.items():
+                    setattr(elements[name], line, channels[channel])
+                if "flux" in lines and kind == "qubits":
+                    channels[lines["flux"]].qubit = elements[name]
+        return channels
+
+
+def load_wiring(folder: pathlib.Path) -> Wiring:
+    """Wiring of a platform, cached until its file changes."""
+    path = pathlib.Path(folder) / WIRING
+    mtime = path.stat().st_mtime_ns
+    if path not in _cache or _cache[path][0] != mtime:
+        wiring = Wiring.load(json.loads(path.read_text()))
+        wiring.validate()
+        _cache[path] = (mtime, wiring)
+    return _cache[path][1]
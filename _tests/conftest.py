@@ -0,0 +1,5 @@
+import pathlib
+import sys
+
+# make the shared helpers importable by the tests
+sys.path.append(str(pathlib.Path(__file__).parents[1] / "_selfhosted"))
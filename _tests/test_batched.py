@@ -0,0 +1,106 @@
+import batched
+import numpy as np
+from batched import sweep
+from platforms import create_platform
+from qibolab import AcquisitionType, AveragingMode, ExecutionParameters
+from qibolab.pulses import PulseSequence
+from qibolab.sweeper import Parameter, Sweeper, SweeperType
+from qibolab.unrolling import Bounds
+
+
+def test_sweep(monkeypatch):
+    """Test that a two-dimensional sweep is executed in real time by the
+    controllers that can, and otherwise unrolled in the expected number of
+    programs, keeping the order of its points."""
+    platform = create_platform("qw5q_gold", simulate=True)
+    sequence = PulseSequence()
+    rx_pulses, ro_pulses = {}, {}
+    for qubit in (0, 1):
+        rx_pulses[qubit] = platform.create_RX_pulse(qubit, start=0)
+        rx_pulses[qubit].frequency = platform.qubits[qubit].drive_frequency
+        ro_pulses[qubit] = platform.create_MZ_pulse(qubit, rx_pulses[qubit].finish)
+        ro_pulses[qubit].frequency = platform.qubits[qubit].readout_frequency
+        sequence.add(rx_pulses[qubit], ro_pulses[qubit])
+
+    amplitude = [
+        Sweeper(Parameter.amplitude, np.array([0, 1]), [pulse], type=SweeperType.FACTOR)
+        for pulse in rx_pulses.values()
+    ]
+    delay = Sweeper(
+        Parameter.start,
+        np.array([0, 20, 40]),
+        list(ro_pulses.values()),
+        type=SweeperType.OFFSET,
+    )
+    options = ExecutionParameters(
+        nshots=1000,
+        relaxation_time=0,
+        acquisition_type=AcquisitionType.DISCRIMINATION,
+        averaging_mode=AveragingMode.CYCLIC,
+    )
+    platform.connect()
+    calls = []
+    execute = platform.execute_pulse_sequence
+    monkeypatch.setattr(
+        platform,
+        "execute_pulse_sequence",
+        lambda *args: calls.append(args) or execute(*args),
+    )
+    native = sweep(platform, sequence, options, amplitude, delay)
+    assert native.programs == 1
+    assert len(calls) == 0
+    assert native.values.shape == (2, 2, 3)
+
+    monkeypatch.setitem(batched.UNROLLED, "Simulator", (Parameter.start,))
+    results = sweep(platform, sequence, options, amplitude, delay)
+    assert results.programs == 1
+    assert len(calls) == 1
+    assert results.values.shape == native.values.shape
+    for values in (native, results):
+        for qubit in (0, 1):
+            assert np.all(values[qubit][0] < 0.5)
+            assert np.all(values[qubit][1] > 0.5)
+
+    monkeypatch.setitem(batched.BOUNDS, "Simulator", Bounds(1000, 4, 100))
+    monkeypatch.setattr(platform._controller, "bounds", Bounds(0, 0, 0))
+    split = sweep(platform, sequence, options, amplitude, delay)
+    assert split.programs == 3
+    assert split.values.shape == results.values.shape
+    assert len(calls) == 4
+    platform.disconnect()
+
+
+def test_sweep_single_shots(monkeypatch):
+    """Test that single shots swept in real time are written in the same
+    layout as the unrolled ones."""
+    platform = create_platform("qw5q_gold", simulate=True)
+    sequence = PulseSequence()
+    ro_pulses = {}
+    for qubit in (0, 1):
+        ro_pulses[qubit] = platform.create_MZ_pulse(qubit, start=0)
+        sequence.add(ro_pulses[qubit])
+    # different values for each qubit cannot be swept in real time
+    frequencies = [
+        Sweeper(Parameter.frequency, np.array([0, 1e6, 2e6]) * (qubit + 1), [pulse])
+        for qubit, pulse in ro_pulses.items()
+    ]
+    same = Sweeper(Parameter.frequency, np.array([0, 1e6, 2e6]), [ro_pulses[0]])
+    options = ExecutionParameters(
+        nshots=10,
+        relaxation_time=0,
+        acquisition_type=AcquisitionType.INTEGRATION,
+        averaging_mode=AveragingMode.SINGLESHOT,
+    )
+    platform.connect()
+    calls = []
+    real_time = platform.sweep
+    monkeypatch.setattr(
+        platform, "sweep", lambda *args: calls.append(args) or real_time(*args)
+    )
+    unrolled = sweep(platform, sequence, options, frequencies)
+    assert len(calls) == 0
+    native = sweep(platform, sequence, options, same)
+    assert len(calls) == 1
+    assert native.values.shape == unrolled.values.shape == (2, 3, 10)
+    assert native.buffer.data.shape == (2, 3, 10, 2)
+    platform.disconnect()
@@ -0,0 +1,24 @@
+import pathlib
+
+import pytest
+from benchmark import COSTS, compare, measure
+
+PATH = pathlib.Path(__file__).parents[1]
+
+
+@pytest.mark.parametrize("name", ["tii1q_b1", "qw5q_gold"])
+def test_measure(name):
+    """Test that every quantity is measured."""
+    results = measure(PATH / name, repeat=1)
+    for key in COSTS:
+        assert key in results
+    assert results["rx_mz"] > 0
+    assert results["rx_mz_batch"] > 0
+
+
+def test_compare():
+    baseline = {"platforms": {"a": {"create": 1.0, "rx_mz": 100.0, "cz": None}}}
+    results = {"platforms": {"a": {"create": 2.0, "rx_mz": 90.0, "cz": 10.0}}}
+    assert compare(results, baseline, tolerance=0.25) == ["a create: 1 -> 2"]
+    results["platforms"]["a"]["rx_mz"] = 50.0
+    assert len(compare(results, baseline, tolerance=0.25)) == 2
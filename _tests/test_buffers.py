@@ -0,0 +1,25 @@
+import numpy as np
+from buffers import ResultBuffer
+
+
+def test_views():
+    """Test that the complex and IQ views share the memory of the buffer."""
+    buffer = ResultBuffer.allocate([0, 2], sweep=(3,), shots=4)
+    values = np.arange(4) + 1j * np.arange(4, 8)
+    buffer.write(1, (2,), values)
+    np.testing.assert_array_equal(buffer.complex(2)[2], values)
+    np.testing.assert_array_equal(buffer.iq(2)[2, :, 1], values.imag)
+    buffer.complex()[0] = 1j
+    assert np.all(buffer.iq(0)[..., 1] == 1)
+    assert buffer.sweep == (3,)
+    assert buffer.shots == 4
+
+
+def test_memmap(tmp_path):
+    path = tmp_path / "results.npy"
+    buffer = ResultBuffer.allocate([0], sweep=(2, 3), shots=5, path=path)
+    buffer.write(0, (1, 2), np.full(5, 1 + 2j))
+    buffer.flush()
+    data = np.load(path, mmap_mode="r")
+    assert data.shape == (1, 2, 3, 5, 2)
+    np.testing.assert_array_equal(data[0, 1, 2], [[1, 2]] * 5)
@@ -0,0 +1,65 @@
+import re
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from calibration import (
+    MESSAGE_FILE,
+    TRACE_FILE,
+    Experiment,
+    calibrate,
+    main,
+    safe_calibrate,
+)
+from pool import pool
+from tracing import tracer
+
+
+def test_calibrate():
+    """Test that the fits, run in other processes, are reported in order."""
+    tracer.clear()
+    begin = time.perf_counter()
+    report = calibrate("qw5q_gold", simulate=True)
+    elapsed = time.perf_counter() - begin
+    pool.close()
+    assert "failed" not in report
+    # the wall time is reported, not the sum of the overlapping phases
+    reported = float(re.search(r"completed in ([\d.]+)sec", report).group(1))
+    assert 0 < reported <= elapsed + 0.01
+    headers = ["Readout assignment fidelities", "T1", "T2"]
+    positions = [report.index(f"\n{header}:\n") for header in headers]
+    assert positions == sorted(positions)
+    fits = [span for span in tracer.spans if span.phase == "fit"]
+    assert {span.args["experiment"] for span in fits} == set(headers)
+
+
+def test_main(tmp_path, monkeypatch):
+    """Test that the platforms, calibrated in separate processes, are
+    reported in a single message."""
+    monkeypatch.chdir(tmp_path)
+    main(["qw5q_gold", "iqm5q"], simulate=True)
+    message = (tmp_path / MESSAGE_FILE).read_text()
+    assert message.index("`qw5q_gold`") < message.index("`iqm5q`")
+    assert "failed" not in message
+    assert (tmp_path / TRACE_FILE).exists()
+
+
+def test_failed_fits():
+    """Test that failed and imprecise fits are not stored nor written."""
+    fit = SimpleNamespace(t1={0: (1000.0, 10.0), 1: (0, np.inf), 2: (1000.0, 900.0)})
+    experiment = Experiment(None, {}, "T1", "t1", parameter="T1", fit=fit)
+    assert list(experiment.results()) == [0]
+    assert len(experiment.updates()) == 1
+    assert [record[0] for record in experiment.records()] == [0]
+
+
+def test_safe_calibrate():
+    """Test that worker processes disconnect their platform, and only return
+    the spans of each run."""
+    report, events = safe_calibrate("qw5q_gold", simulate=True)
+    assert "failed" not in report
+    assert len(events) > 0
+    assert len(pool.entries) == 0
+    _, later = safe_calibrate("qw5q_gold", simulate=True)
+    end = max(e["ts"] + e["dur"] for e in events if e["ph"] == "X")
+    assert all(e["ts"] >= end for e in later if e["ph"] == "X")
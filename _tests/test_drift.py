@@ -0,0 +1,68 @@
+import pathlib
+from types import SimpleNamespace
+
+import pytest
+from drift import Graph, Tolerance, drifted, load_tolerances, probe, updates
+from pool import Pool
+
+PATH = pathlib.Path(__file__).parents[1]
+
+
+@pytest.mark.parametrize("name", ["iqm5q.yml", "qw5q.yml"])
+def test_plan(name):
+    """Test that only drifted qubits and the actions following them run."""
+    graph = Graph.load(PATH / "_monitoring" / name)
+    assert [action["id"] for action in graph.actions][:2] == ["t1", "t2"]
+    assert graph.parameters() == {"T1", "T2", "assignment_fidelity"}
+    assert graph.plan({}) == []
+
+    plan = graph.plan({"T1": {1, 3}, "assignment_fidelity": {0}})
+    assert [(action["id"], qubits) for action, qubits in plan] == [
+        ("t1", [1, 3]),
+        ("t2", [1, 3]),
+        ("readout characterization", [0]),
+        ("standard rb bootstrap", [0]),
+    ]
+
+
+def test_tolerances(tmp_path):
+    (tmp_path / "drift.json").write_text('{"T1": {"absolute": 500}}')
+    tolerances = load_tolerances(tmp_path)
+    assert tolerances["T1"] == Tolerance(absolute=500)
+    assert tolerances["T2"] == Tolerance(relative=0.3)
+
+    platform = SimpleNamespace(
+        qubits={0: SimpleNamespace(T1=10000), 1: SimpleNamespace(T1=0)}
+    )
+    measured = {"T1": {0: (10400, None), 1: (10400, None)}}
+    assert drifted(platform, measured, tolerances) == {"T1": {1}}
+    measured = {"T1": {0: (9400, None), 1: (10400, None)}}
+    assert drifted(platform, measured, tolerances) == {"T1": {0, 1}}
+    # deviations within the uncertainty of the probe are not drift
+    measured = {"T1": {0: (9400, 50)}}
+    assert drifted(platform, measured, tolerances) == {"T1": set()}
+    measured = {"T1": {0: (9000, 50)}}
+    assert drifted(platform, measured, tolerances) == {"T1": {0}}
+    # imprecise, failed or missing probes are inconclusive, not within tolerance
+    measured = {"T1": {0: (10000, 5000)}}
+    assert drifted(platform, measured, tolerances) == {"T1": {0}}
+    measured = {"T1": {}}
+    assert drifted(platform, measured, tolerances, [0]) == {"T1": {0}}
+
+
+def test_updates():
+    """Test that the parameters fitted by the actions are written back."""
+    results = SimpleNamespace(t1={0: (12000.0, 100.0), 1: (0.0, float("inf"))})
+    assert updates({"operation": "t1"}, results) == {
+        "/characterization/single_qubit/0/T1": 12000.0
+    }
+    assert updates({"operation": "standard_rb"}, results) == {}
+
+
+def test_probe():
+    pool = Pool()
+    with pool.lease("qw5q_gold", simulate=True) as platform:
+        measured = probe(platform, ["T1"], [0, 1])
+    pool.close()
+    assert set(measured["T1"]) == {0, 1}
+    assert all(value > 0 and error >= 0 for value, error in measured["T1"].values())
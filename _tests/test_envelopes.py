@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+from envelopes import EnvelopeCache, cache, install, uninstall
+from qibolab.pulses import DrivePulse, FluxPulse, ReadoutPulse
+
+
+def pulses():
+    return [
+        ReadoutPulse(0, 2000, 0.3, 7_000_000_000, 0, "Rectangular()", "ro", 0),
+        DrivePulse(0, 40, 0.5, 5_000_000_000, 0, "Gaussian(5)", "qd", 0),
+        DrivePulse(0, 40, 0.5, 5_000_000_000, 0, "Drag(5, -0.02)", "qd", 0),
+        FluxPulse(0, 60, 0.1, "Exponential(12, 5000, 0.1)", "qf", 0),
+    ]
+
+
+@pytest.mark.parametrize("sampling_rate", [6.144, 9.8304])
+def test_cached_envelopes(sampling_rate):
+    """Test that cached waveforms are identical to the ones of qibolab."""
+    expected = [
+        (p.envelope_waveform_i(sampling_rate), p.envelope_waveform_q(sampling_rate))
+        for p in pulses()
+    ]
+    cache.clear()
+    install()
+    try:
+        for _ in range(2):
+            for pulse, waveforms in zip(pulses(), expected):
+                for component, waveform in zip("iq", waveforms):
+                    cached = getattr(pulse, f"envelope_waveform_{component}")(
+                        sampling_rate
+                    )
+                    np.testing.assert_array_equal(cached.data, waveform.data)
+                    assert cached.serial == waveform.serial
+                    assert not cached.data.flags.writeable
+    finally:
+        uninstall()
+    info = cache.info()
+    # every envelope is sampled once, flux pulses reuse the I envelope as Q
+    assert info.misses == info.entries
+    assert info.hits + info.misses == 4 * len(expected)
+
+
+def test_cache_budget():
+    """Test that the least recently used entries are evicted."""
+    from qibolab.pulses import Waveform
+
+    lru = EnvelopeCache(max_bytes=3 * 800)
+    for key in range(4):
+        lru.get(key, lambda: Waveform(np.zeros(100)))
+    lru.get(1, lambda: Waveform(np.ones(100)))
+    lru.get(4, lambda: Waveform(np.zeros(100)))
+    info = lru.info()
+    assert info.entries == 3
+    assert info.nbytes == 3 * 800
+    assert lru.get(1, lambda: None).data[0] == 0
+
+
+def test_exact_parameters():
+    """Test that shapes are cached by their exact parameters."""
+    cache.clear()
+    install()
+    try:
+        for beta in (-0.02, -0.02 + 1e-15):
+            pulse = DrivePulse(0, 40, 0.5, 5_000_000_000, 0, "Drag(5, -0.02)", "qd")
+            pulse.shape.beta = beta
+            expected = pulse.shape.envelope_waveform_q.__wrapped__(pulse.shape, 6.144)
+            cached = pulse.envelope_waveform_q(6.144)
+            np.testing.assert_array_equal(cached.data, expected.data)
+    finally:
+        uninstall()
+    assert cache.info().entries == 2
@@ -0,0 +1,59 @@
+import shutil
+
+import numpy as np
+import pytest
+from integration import KernelBank, compute, history, load, main, restore, save
+from platforms import ROOT, RUNCARD
+from runcard import load_kernels
+
+
+def test_compute():
+    """Test that the kernel separates the states better than a boxcar."""
+    rng = np.random.default_rng(0)
+    samples = np.arange(100)
+    ground = np.exp(-samples / 30) + 0j
+    excited = -ground
+    noise = lambda: rng.normal(scale=0.5, size=(1000, 100))
+    kernel = compute(ground + noise(), excited + noise())
+    assert len(kernel) == 96
+    assert np.abs(kernel).max() == pytest.approx(1)
+
+    bank = KernelBank.from_kernels({0: kernel, 1: np.ones(96)})
+    traces = np.stack([ground + noise(), excited + noise()])[:, :, None]
+    # shape (states, shots, 1, samples): integrate both with the two kernels
+    traces = np.concatenate([traces, traces], axis=2).transpose(2, 0, 1, 3)
+    values = bank.integrate(traces).real
+    assert values.shape == (2, 2, 1000)
+    separation = np.abs(values[:, 0].mean(-1) - values[:, 1].mean(-1))
+    separation /= values[:, 0].std(-1)
+    assert separation[0] > separation[1]
+    np.testing.assert_allclose(values[1, 0], traces[1, 0, :, :96].sum(-1).real)
+
+
+def test_storage(tmp_path):
+    """Test that kernels are versioned and can be restored."""
+    shutil.copy(ROOT / "iqm5q" / RUNCARD, tmp_path)
+    first = save(tmp_path, {0: np.ones(16, dtype=complex)})
+    second = save(tmp_path, {1: np.zeros(16, dtype=complex)}, "second")
+    assert first != second
+    assert set(load(tmp_path)) == {0, 1}
+    assert [entry["version"] for entry in history(tmp_path)] == [first, second]
+
+    restore(tmp_path, first)
+    assert set(load(tmp_path)) == {0}
+    assert set(load_kernels(tmp_path)) == {0}
+    with pytest.raises(ValueError):
+        restore(tmp_path, "missing")
+
+
+def test_simulated_update(tmp_path):
+    """Test that kernels of simulated platforms are not saved."""
+    from pool import pool
+
+    folder = tmp_path / "qw5q_gold"
+    shutil.copytree(ROOT / "qw5q_gold", folder, ignore=shutil.ignore_patterns("*.bin"))
+    # the platform loads the helpers next to it
+    (tmp_path / "_selfhosted").symlink_to(ROOT / "_selfhosted")
+    main([folder], nshots=100, update=True, simulate=True)
+    pool.close(folder)
+    assert history(folder) == []
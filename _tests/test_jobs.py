@@ -0,0 +1,80 @@
+import threading
+from contextlib import contextmanager
+
+import pytest
+from jobs import JobQueue, actions
+from platforms import ROOT
+from pool import Pool
+
+
+class Blocking:
+    """Pool whose leases wait for an event, counting them."""
+
+    def __init__(self):
+        self.entered = threading.Event()
+        self.event = threading.Event()
+        self.leases = []
+
+    def prepare(self, name, simulate=None):
+        pass
+
+    @contextmanager
+    def lease(self, name, simulate=None):
+        self.entered.set()
+        self.event.wait()
+        self.leases.append((name, simulate))
+        yield name
+
+
+def test_priority():
+    """Test that queued jobs run by priority and share compatible leases."""
+    pool = Blocking()
+    queue = JobQueue(pool)
+    order = []
+    first = queue.submit("a", order.append, name="first")
+    pool.entered.wait()
+    futures = [
+        queue.submit("a", lambda _, i=i: order.append(i), priority=p)
+        for i, p in enumerate([30, 10, 10, 0])
+    ]
+    other = queue.submit("a", lambda _: "simulated", priority=0, simulate=True)
+    pool.event.set()
+    assert other.result() == "simulated"
+    for future in [first] + futures:
+        future.result()
+    queue.close()
+
+    assert order == ["a", 3, 1, 2, 0]
+    assert pool.leases == [("a", None), ("a", None), ("a", True)]
+    metrics = queue.metrics()["a"]
+    assert metrics["jobs"] == 6
+    assert metrics["batches"] == 3
+    assert metrics["latency_max"] >= metrics["latency_mean"] > 0
+
+
+def test_failure():
+    queue = JobQueue(Blocking(), max_batch=1)
+    queue.pool.event.set()
+    future = queue.submit("a", lambda _: 1 / 0)
+    assert queue.submit("a", lambda platform: platform).result() == "a"
+    assert isinstance(future.exception(), ZeroDivisionError)
+    queue.close()
+    assert queue.metrics()["a"]["failed"] == 1
+    with pytest.raises(RuntimeError):
+        queue.submit("a", print)
+
+
+def test_lease():
+    """Test that jobs run on the connected platforms of the pool."""
+    pool = Pool()
+    queue = JobQueue(pool)
+    future = queue.submit("qw5q_gold", lambda p: p.is_connected, simulate=True)
+    assert future.result()
+    queue.close()
+    pool.close()
+
+
+def test_actions():
+    path = next((ROOT / "_monitoring").glob("*.yml"))
+    for action in actions(path):
+        assert {"platform", "qubits", "id", "operation"} <= set(action)
@@ -0,0 +1,89 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from lifecycle import connect, dependencies, disconnect, execute, start
+from qibolab import create_platform
+from qibolab.instruments.abstract import Controller
+
+
+class Slow:
+    """Instrument taking some time to connect, recording the calls."""
+
+    def __init__(self, name, delay, calls):
+        self.name = name
+        self.delay = delay
+        self.calls = calls
+
+    def _call(self, stage):
+        time.sleep(self.delay)
+        self.calls.append((stage, self.name))
+
+    def connect(self):
+        self._call("connect")
+
+    def start(self):
+        self._call("start")
+
+    def disconnect(self):
+        self._call("disconnect")
+
+
+class SlowController(Slow, Controller):
+    modules = {"module": None}
+    play = sweep = sampling_rate = None
+
+
+def fake(delays):
+    calls = []
+    instruments = {
+        name: (SlowController if name == "controller" else Slow)(name, delay, calls)
+        for name, delay in delays.items()
+    }
+    return SimpleNamespace(instruments=instruments, is_connected=False), calls
+
+
+def test_concurrent():
+    """Test that connecting takes as long as the slowest instrument."""
+    delays = {"controller": 0.2, "module": 0.1, "lo": 0.2, "twpa": 0.2}
+    platform, calls = fake(delays)
+    begin = time.perf_counter()
+    durations = connect(platform)
+    assert time.perf_counter() - begin < 0.7 * sum(delays.values())
+    assert set(durations) == set(delays)
+    assert platform.is_connected
+    assert calls.index(("connect", "controller")) < calls.index(("connect", "module"))
+
+    calls.clear()
+    start(platform)
+    assert calls[-2:] == [("start", "controller"), ("start", "module")]
+    calls.clear()
+    disconnect(platform)
+    assert calls.index(("disconnect", "module")) < calls.index(
+        ("disconnect", "controller")
+    )
+    assert not platform.is_connected
+
+
+def test_timeout():
+    """Test that the instruments connected are disconnected after a timeout."""
+    platform, calls = fake({"controller": 0.01, "module": 0.01, "lo": 0.5})
+    with pytest.raises(TimeoutError, match="lo"):
+        asyncio.run(execute(platform, "connect", timeouts={"lo": 0.05}))
+    disconnected = [name for stage, name in calls if stage == "disconnect"]
+    assert disconnected == ["module", "controller"]
+
+
+@pytest.mark.parametrize("name", ["qw5q_gold", "iqm5q"])
+def test_dependencies(name):
+    platform = create_platform(name)
+    controller = platform._controller.name
+    graph = dependencies(platform, "start")
+    assert graph[controller] == {
+        instrument
+        for instrument in platform.instruments
+        if instrument != controller and controller not in graph[instrument]
+    }
+    reverse = dependencies(platform, "stop")
+    assert all(controller in reverse[instrument] for instrument in graph[controller])
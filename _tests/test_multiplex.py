@@ -0,0 +1,56 @@
+import json
+import pathlib
+
+import pytest
+from multiplex import Feedline, Tone, _value, optimize, plan
+from update import pointer
+from wiring import load_wiring
+
+PATH = pathlib.Path(__file__).parents[1]
+
+
+def idfn(path):
+    """Helper function to identify platform tested."""
+    return path.parent.name
+
+
+@pytest.mark.parametrize("path", PATH.glob("*/platform.py"), ids=idfn)
+def test_plan(path):
+    """Test that all the qubits of the platforms can be read out."""
+    runcard = json.loads((path.parent / "parameters.json").read_text())
+    result = plan(load_wiring(path.parent), runcard)
+    assert result.unreadable == []
+    qubits = [qubit for group in result.rounds for qubit in group]
+    assert sorted(qubits, key=str) == sorted(
+        map(json.loads, runcard["native_gates"]["single_qubit"]), key=str
+    )
+
+
+def test_optimize():
+    """Test the placement of the local oscillators and the readout rounds."""
+    feedline = Feedline("feed", [("a", "fa"), ("b", "fb")], max_tones=2)
+    tones = [Tone(q, f, 2000) for q, f in enumerate((7.0e9, 7.1e9, 7.8e9, 7.9e9))]
+    lines = optimize(feedline, tones, [7.5e9, 7.5e9])
+    assert [len(line.rounds) for line in lines] == [1, 1]
+    for line in lines:
+        assert all(feedline.readable(tone, line.lo) for tone in line.tones)
+
+    # a single line can only measure two tones together
+    feedline = Feedline("feed", [("a", None)], max_tones=2)
+    (line,) = optimize(feedline, tones[:3], [7.4e9])
+    assert len(line.rounds) == 2
+
+
+def test_image_conflict():
+    """Test that tones symmetric around the local oscillator are split."""
+    feedline = Feedline("feed", [("a", None)])
+    first, second = Tone(0, 7.1e9, 2000), Tone(1, 7.3e9, 2000)
+    assert feedline.conflict(first, second, 7.2e9)
+    assert not feedline.conflict(first, second, 7.0e9)
+
+
+def test_escaped_pointer():
+    """Test that instrument names with escaped characters are read."""
+    runcard = {"instruments": {"lo/readout~a": {"frequency": 7e9}}}
+    path = pointer("instruments", "lo/readout~a", "frequency")
+    assert _value(runcard, path) == 7e9
@@ -1,4 +1,6 @@
 import pathlib
+import subprocess
+import sys
 
 import pytest
 from qibolab import Platform, create_platform
@@ -19,3 +21,33 @@ def test_create(path):
     rx_pulse = platform.create_RX_pulse(qubit)
     _ = platform.create_MZ_pulse(qubit, start=rx_pulse.duration)
     assert isinstance(platform, Platform)
+
+
+@pytest.mark.parametrize("path", PATH.glob("*/platform.py"), ids=idfn)
+def test_lazy_drivers(path):
+    """Test that importing a platform module does not load instrument drivers."""
+    script = (
+        "import importlib.util, sys\n"
+        f"spec = importlib.util.spec_from_file_location('platform', '{path}')\n"
+        "spec.loader.exec_module(importlib.util.module_from_spec(spec))\n"
+        "drivers = ('laboneq', 'qblox_instruments', 'qibosoq', 'zhinst')\n"
+        "assert not [m for m in sys.modules if m.split('.')[0] in drivers]\n"
+    )
+    subprocess.run([sys.executable, "-c", script], check=True)
+
+
+@pytest.mark.parametrize("path", PATH.glob("*/platform.py"), ids=idfn)
+def test_shadowed_helpers(path, tmp_path):
+    """Test that installed modules named as the helpers are not loaded
+    instead of them."""
+    for name in ("runcard", "wiring"):
+        (tmp_path / f"{name}.py").write_text("raise ImportError('shadowed')\n")
+    script = (
+        "import importlib.util, sys\n"
+        f"sys.path.insert(0, '{tmp_path}')\n"
+        f"spec = importlib.util.spec_from_file_location('platform', '{path}')\n"
+        "module = importlib.util.module_from_spec(spec)\n"
+        "spec.loader.exec_module(module)\n"
+        "module.create()\n"
+    )
+    subprocess.run([sys.executable, "-c", script], check=True)
@@ -0,0 +1,78 @@
+import json
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from platforms import ROOT
+from pool import Pool
+
+
+def test_lease(tmp_path):
+    """Test that leases reuse the connection across runcard updates."""
+    folder = tmp_path / "qw5q_gold"
+    shutil.copytree(ROOT / "qw5q_gold", folder, ignore=shutil.ignore_patterns("*.bin"))
+    # the platform loads the helpers next to it
+    (tmp_path / "_selfhosted").symlink_to(ROOT / "_selfhosted")
+    pool = Pool()
+    with pool.lease(folder, simulate=True) as platform:
+        assert platform.is_connected
+        drive = platform.qubits[0].drive
+
+    path = folder / "parameters.json"
+    runcard = json.loads(path.read_text())
+    runcard["characterization"]["single_qubit"]["0"]["T1"] = 1234
+    path.write_text(json.dumps(runcard))
+    with pool.lease(folder, simulate=True) as updated:
+        assert updated is platform
+        assert updated.qubits[0].T1 == 1234
+        assert updated.qubits[0].drive is drive
+
+    (entry,) = pool.entries.values()
+    assert entry.connections == 1
+    assert entry.leases == 2
+    pool.close()
+    assert not platform.is_connected
+    assert len(pool.entries) == 0
+
+
+def test_rewiring(tmp_path):
+    """Test that changing the port of a channel reconnects the platform."""
+    folder = tmp_path / "qw5q_gold"
+    shutil.copytree(ROOT / "qw5q_gold", folder, ignore=shutil.ignore_patterns("*.bin"))
+    # the platform loads the helpers next to it
+    (tmp_path / "_selfhosted").symlink_to(ROOT / "_selfhosted")
+    pool = Pool()
+    with pool.lease(folder, simulate=True):
+        pass
+
+    path = folder / "wiring.json"
+    wiring = json.loads(path.read_text())
+    channels = wiring["channels"]
+    channels["L4-28"], channels["L3-11"] = channels["L3-11"], channels["L4-28"]
+    path.write_text(json.dumps(wiring))
+    with pool.lease(folder, simulate=True) as platform:
+        assert platform.qubits[0].drive.port.name == "o2"
+
+    (entry,) = pool.entries.values()
+    assert entry.connections == 2
+    pool.close()
+
+
+def test_prepare():
+    """Test that leases in other threads use the platform prepared in the main
+    one, where the qblox controllers can install their signal handlers."""
+    pool = Pool()
+    pool.prepare("qw5q_gold", simulate=True)
+    (entry,) = pool.entries.values()
+    _, prepared = entry.prepared
+
+    def run():
+        with pool.lease("qw5q_gold", simulate=True) as platform:
+            return platform
+
+    with ThreadPoolExecutor(1) as executor:
+        assert executor.submit(run).result() is prepared
+    assert entry.prepared is None
+    # the platform is not built again while its files do not change
+    pool.prepare("qw5q_gold", simulate=True)
+    assert entry.prepared is None
+    pool.close()
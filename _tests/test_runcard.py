@@ -0,0 +1,66 @@
+import json
+import pathlib
+
+import numpy as np
+import pytest
+from runcard import COMPILED, KERNELS, RUNCARD, compile_runcard, load
+
+PATH = pathlib.Path(__file__).parents[1]
+
+
+def dumps(runcard):
+    return json.dumps(runcard, sort_keys=True)
+
+
+def idfn(path):
+    """Helper function to identify platform tested."""
+    return path.name
+
+
+@pytest.mark.parametrize(
+    "folder", [p.parent for p in PATH.glob("*/platform.py")], ids=idfn
+)
+def test_compiled_runcard(folder, tmp_path):
+    """Test that the compiled runcard reproduces the JSON one."""
+    for filename in (RUNCARD, KERNELS):
+        if (folder / filename).exists():
+            (tmp_path / filename).write_bytes((folder / filename).read_bytes())
+
+    compiled = load(tmp_path)
+    assert (tmp_path / COMPILED).exists()
+    expected = json.loads((folder / RUNCARD).read_text())
+    assert compiled.runcard() == expected
+    # integers and floats are distinguished, e.g. 0 and 0.0
+    assert dumps(compiled.runcard()) == dumps(expected)
+    if (folder / KERNELS).exists():
+        kernels = compiled.kernels()
+        for key, value in np.load(folder / KERNELS).items():
+            np.testing.assert_array_equal(kernels[json.loads(key)], value)
+
+    # compiled file is rebuilt when the runcard changes
+    runcard = compiled.runcard()
+    runcard["settings"]["nshots"] += 1
+    (tmp_path / RUNCARD).write_text(json.dumps(runcard))
+    assert load(tmp_path).runcard() == runcard
+
+
+def test_mixed_types(tmp_path):
+    """Test that the type of the values of mixed columns is preserved."""
+    runcard = {
+        "settings": {"nshots": 1024},
+        "characterization": {
+            "single_qubit": {
+                "0": {"T1": 0, "mean_gnd_states": [0, 1.5], "flag": True},
+                "1": {"T1": 12345.6, "mean_gnd_states": [1.5, 2], "flag": False},
+            }
+        },
+    }
+    (tmp_path / RUNCARD).write_text(json.dumps(runcard))
+    loaded = load(tmp_path).runcard()
+    qubits = loaded["characterization"]["single_qubit"]
+    assert type(qubits["0"]["T1"]) is int
+    assert type(qubits["1"]["T1"]) is float
+    assert [type(v) for v in qubits["0"]["mean_gnd_states"]] == [int, float]
+    assert [type(v) for v in qubits["1"]["mean_gnd_states"]] == [float, int]
+    assert type(qubits["0"]["flag"]) is bool
+    assert dumps(loaded) == dumps(runcard)
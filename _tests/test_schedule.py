@@ -0,0 +1,46 @@
+import pytest
+from qibolab import create_platform
+from schedule import Scheduler, _earliest
+
+LAYERS = [
+    [("RX", 0), ("RX", 1), ("RX", 3)],
+    [("CZ", (2, 0)), ("RX", 4)],
+    [("CZ", (1, 2)), ("RX", 3)],
+    [("RX", 0), ("RX", 3)],
+]
+
+
+@pytest.mark.parametrize("name", ["qw5q_gold", "iqm5q"])
+def test_schedule(name):
+    """Test that the schedule is shorter than waiting for every layer, and
+    that gates on the same qubit do not overlap."""
+    scheduler = Scheduler(create_platform(name))
+    schedule = scheduler.schedule(LAYERS)
+    reference = scheduler.schedule(LAYERS, barriers=True)
+    assert schedule.duration < reference.duration
+    for qubit in range(5):
+        intervals = sorted(
+            (start, finish)
+            for (gate, target), start, finish in zip(
+                schedule.gates, schedule.start, schedule.finish
+            )
+            if qubit in (target if gate == "CZ" else (target,))
+        )
+        assert all(a[1] <= b[0] for a, b in zip(intervals, intervals[1:]))
+
+    (sequence,) = scheduler.sequences([LAYERS])
+    assert sequence.finish == schedule.duration
+
+
+def test_shared_channel():
+    """Test that gates sharing a channel are delayed until it is free."""
+    busy = {"flux": [(10, 50)], "drive": []}
+    assert _earliest(busy, [("drive", 0, 40)], 0) == 0
+    assert _earliest(busy, [("flux", 0, 20)], 0) == 50
+    assert _earliest(busy, [("flux", 20, 30)], 0) == 30
+
+
+def test_same_qubit():
+    scheduler = Scheduler(create_platform("qw5q_gold"))
+    with pytest.raises(ValueError):
+        scheduler.schedule([[("RX", 2), ("CZ", (0, 2))]])
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+from platforms import create_platform
+from sequences import PulseBatch, SequenceBuilder
+
+PLATFORMS = ["qw5q_gold", "iqm5q", "tii_zcu216"]
+"""Platforms controlled by qblox, Zurich Instruments and RFSoC."""
+
+
+def serials(sequence):
+    return sorted(pulse.serial for pulse in sequence)
+
+
+@pytest.fixture(params=PLATFORMS)
+def platform(request):
+    return create_platform(request.param)
+
+
+def test_rx_mz(platform):
+    """Test that the batched pulses are the ones created by the platform."""
+    builder = SequenceBuilder(platform)
+    qubits = list(platform.qubits)
+    rx = builder.rx(qubits)
+    mz = builder.mz(qubits, start=rx.finish)
+    sequence = PulseBatch.concatenate(rx, mz).sequences(builder.table)[0]
+
+    expected = []
+    for qubit in qubits:
+        pulse = platform.create_RX_pulse(qubit, start=0)
+        expected.append(pulse)
+        expected.append(platform.create_MZ_pulse(qubit, start=pulse.finish))
+    assert serials(sequence) == serials(expected)
+
+
+def test_cz(platform):
+    builder = SequenceBuilder(platform)
+    pairs = [target for gate, target in builder.table.gates if gate == "CZ"]
+    if len(pairs) == 0:
+        pytest.skip(f"No CZ gates on {platform.name}.")
+    for pair in pairs:
+        cz = builder.cz([pair], start=10)
+        expected, phases = platform.create_CZ_pulse_sequence(pair, start=10)
+        assert serials(cz.sequences(builder.table)[0]) == serials(expected)
+        assert cz.virtual_z_phases(builder.table) == [phases]
+
+        # virtual Z phases are applied to the following drive pulses
+        rx = builder.rx(list(pair), start=int(cz.finish.max()))
+        sequence = PulseBatch.concatenate(cz, rx).sequences(builder.table)[0]
+        for pulse in sequence.qd_pulses:
+            assert pulse.relative_phase == pytest.approx(phases.get(pulse.qubit, 0))
+
+
+def test_accumulated_phases():
+    """Test that the virtual Z phases of consecutive gates accumulate, per
+    sequence and qubit, regardless of the order of the batches."""
+    platform = create_platform("iqm5q")
+    builder = SequenceBuilder(platform)
+    pair = next(target for gate, target in builder.table.gates if gate == "CZ")
+    _, phases = platform.create_CZ_pulse_sequence(pair, start=0)
+    first = builder.cz([pair] * 2, start=0, sequence=[1, 0])
+    middle = int(first.finish.max())
+    rx = builder.rx(list(pair) * 2, start=middle, sequence=[1, 1, 0, 0])
+    second = builder.cz([pair] * 2, start=int(rx.finish.max()), sequence=[0, 1])
+    last = builder.rx(list(pair) * 2, start=int(second.finish.max()), sequence=0)
+    batch = PulseBatch.concatenate(last, rx, second, first)
+    for sequence in batch.sequences(builder.table):
+        for pulse in sequence.qd_pulses:
+            gates = 1 if pulse.start == middle else 2
+            expected = gates * phases.get(pulse.qubit, 0)
+            assert pulse.relative_phase == pytest.approx(expected)
@@ -0,0 +1,56 @@
+from platforms import create_platform
+from qibolab.instruments.oscillator import LocalOscillator
+from shadow import Shadow, batch, install
+
+
+class Device:
+    def __init__(self):
+        self.writes = []
+
+    def set(self, name, value):
+        self.writes.append((name, value))
+
+    def get(self, name):
+        return 0
+
+    def reset(self):
+        pass
+
+
+def test_shadow():
+    """Test that only changed values are written."""
+    device = Device()
+    shadow = Shadow(device)
+    shadow.set("frequency", 1e9)
+    shadow.set("frequency", 1e9)
+    shadow.get("power")
+    shadow.set("power", 0)
+    with shadow.batch():
+        shadow.set("power", 5)
+        shadow.set("power", 10)
+        assert len(device.writes) == 1
+    assert device.writes == [("frequency", 1e9), ("power", 10)]
+    assert shadow.skipped == 2
+
+    shadow.reset()
+    shadow.set("frequency", 1e9)
+    assert device.writes[-1] == ("frequency", 1e9)
+
+
+def test_install():
+    """Test shadowing the local oscillators of a simulated platform."""
+    platform = install(install(create_platform("qw5q_gold", simulate=True)))
+    oscillators = [
+        instrument
+        for instrument in platform.instruments.values()
+        if isinstance(instrument, LocalOscillator)
+    ]
+    assert len(oscillators) > 0
+    platform.connect()
+    for oscillator in oscillators:
+        assert isinstance(oscillator.device, Shadow)
+        writes = oscillator.device.writes
+        with batch(oscillator):
+            oscillator.device.set("frequency", oscillator.frequency)
+        assert oscillator.device.writes == writes
+    platform.disconnect()
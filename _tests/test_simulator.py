@@ -0,0 +1,77 @@
+import pathlib
+
+import numpy as np
+import pytest
+from platforms import create_platform
+from qibolab import AcquisitionType, AveragingMode, ExecutionParameters
+from qibolab.pulses import PulseSequence
+from qibolab.sweeper import Parameter, Sweeper, SweeperType
+from simulator import Simulator, enabled
+
+PATH = pathlib.Path(__file__).parents[1]
+
+
+def idfn(path):
+    """Helper function to identify platform tested."""
+    return path.parent.name
+
+
+@pytest.mark.parametrize("path", PATH.glob("*/platform.py"), ids=idfn)
+def test_simulated_platform(path):
+    """Test that simulated platforms keep their wiring and excite the qubits."""
+    real = create_platform(path.parent, simulate=False)
+    platform = create_platform(path.parent, simulate=True)
+    assert platform is not real
+    assert list(platform.qubits) == list(real.qubits)
+    for name, qubit in platform.qubits.items():
+        for line in ("readout", "feedback", "drive", "flux"):
+            channel = getattr(qubit, line)
+            expected = getattr(real.qubits[name], line)
+            assert (channel and channel.name) == (expected and expected.name)
+    assert any(isinstance(i, Simulator) for i in platform.instruments.values())
+    # channels use the dummy local oscillators
+    for qubit in platform.qubits.values():
+        for line in ("readout", "feedback", "drive", "flux"):
+            channel = getattr(qubit, line)
+            oscillator = getattr(channel, "local_oscillator", None)
+            if oscillator is not None:
+                assert platform.instruments[oscillator.name] is oscillator
+
+    qubit = next(iter(platform.qubits))
+    sequence = PulseSequence()
+    rx_pulse = platform.create_RX_pulse(qubit, start=0)
+    ro_pulse = platform.create_MZ_pulse(qubit, start=rx_pulse.finish)
+    # some runcards have native gates detuned from the qubit
+    rx_pulse.frequency = platform.qubits[qubit].drive_frequency
+    ro_pulse.frequency = platform.qubits[qubit].readout_frequency
+    sequence.add(rx_pulse, ro_pulse)
+
+    options = ExecutionParameters(
+        nshots=1000,
+        relaxation_time=0,
+        acquisition_type=AcquisitionType.DISCRIMINATION,
+        averaging_mode=AveragingMode.CYCLIC,
+    )
+    platform.connect()
+    excited = platform.execute_pulse_sequence(sequence, options)[ro_pulse.serial]
+    sweeper = Sweeper(
+        Parameter.amplitude, np.array([0, 1]), [rx_pulse], type=SweeperType.FACTOR
+    )
+    rabi = platform.sweep(sequence, options, sweeper)[ro_pulse.serial]
+    platform.disconnect()
+
+    assert excited.probability(1) > 0.5
+    assert rabi.probability(1).shape == (2,)
+    assert rabi.probability(1)[0] < 0.5 < rabi.probability(1)[1]
+
+
+def test_enabled(monkeypatch):
+    monkeypatch.delenv("QRC_SIMULATE", raising=False)
+    assert not enabled("iqm5q")
+    assert enabled("iqm5q", simulate=True)
+    monkeypatch.setenv("QRC_SIMULATE", "1")
+    assert enabled("iqm5q")
+    assert not enabled("iqm5q", simulate=False)
+    monkeypatch.setenv("QRC_SIMULATE", "qw5q_gold, iqm5q")
+    assert enabled("iqm5q")
+    assert not enabled("tii1q_b1")
@@ -0,0 +1,112 @@
+import threading
+
+import numpy as np
+from store import DAY, SEGMENT, CalibrationStore
+
+
+def fill(store, days=10):
+    for day in range(days):
+        store.append(
+            "platform",
+            [(0, "T1", 10000 + day), (0, "T2", 5000, 50), ("D1", "T1", 20000)],
+            timestamp=day * DAY,
+        )
+
+
+def test_series(tmp_path):
+    """Test time windows and rolling statistics of a series."""
+    store = CalibrationStore(tmp_path)
+    fill(store)
+    series = store.series("platform", 0, "T1", start=2 * DAY, stop=5 * DAY)
+    np.testing.assert_array_equal(series.values, [10002, 10003, 10004])
+    assert np.isnan(series.errors).all()
+    assert store.series("platform", 0, "T2").errors[0] == 50
+    assert len(store.series("platform", "D1", "T1")) == 10
+    assert len(store.series("platform", 1, "T1")) == 0
+
+    mean, std = store.series("platform", 0, "T1").rolling(3 * DAY)
+    np.testing.assert_allclose(mean[3:], 10000 + np.arange(2, 9))
+    np.testing.assert_allclose(std[3:], np.sqrt(2 / 3))
+    assert std[0] == 0
+
+
+def test_query(tmp_path):
+    store = CalibrationStore(tmp_path)
+    fill(store, days=3)
+    store.append("other", [(1, "T1", 1)], timestamp=DAY)
+    records = store.query(quantity="T1", start=DAY)
+    assert set(records) == {"platform", "other"}
+    assert len(records["platform"]) == 4
+    assert set(store.quantities("platform")) == {(0, "T1"), (0, "T2"), ("D1", "T1")}
+
+
+def test_compact(tmp_path):
+    """Test that compaction keeps the records in a single segment."""
+    store = CalibrationStore(tmp_path)
+    fill(store)
+    before = store.query("platform")["platform"]
+    assert store.compact("platform", minimum=11) is None
+    store.compact("platform")
+    assert len(list((tmp_path / "platform").glob(SEGMENT))) == 1
+    after = store.query("platform")["platform"]
+    columns = ["timestamp", "qubit", "quantity", "value"]
+    assert sorted(before[columns].tolist()) == sorted(after[columns].tolist())
+
+
+def test_concurrent_compact(tmp_path, monkeypatch):
+    """Test that readers list the segments again when they are merged while
+    being loaded."""
+    store = CalibrationStore(tmp_path)
+    fill(store)
+    segments = store._segments
+    compacted = []
+
+    def listing(platform):
+        listed = segments(platform)
+        if not compacted:
+            compacted.append(CalibrationStore(tmp_path).compact(platform))
+        return listed
+
+    monkeypatch.setattr(store, "_segments", listing)
+    assert len(store.series("platform", 0, "T1")) == 10
+    assert compacted[0] is not None
+
+
+def test_superseded(tmp_path):
+    """Test that the merged segments are not read twice while they are
+    removed."""
+    store = CalibrationStore(tmp_path)
+    fill(store)
+    segments = store._segments("platform")
+    merged = store._write(
+        "platform",
+        np.concatenate([np.load(path) for path in segments]),
+        [path.name for path in segments],
+    )
+    assert store._segments("platform") == [merged]
+    assert len(store.series("platform", 0, "T1")) == 10
+    # removed before the superseded segments
+    merged.unlink()
+    assert len(store._segments("platform")) == 10
+
+
+def test_overlapping_compact(tmp_path):
+    """Test that overlapping compactions keep every record once."""
+    store = CalibrationStore(tmp_path)
+    fill(store)
+    errors = []
+
+    def compact():
+        try:
+            CalibrationStore(tmp_path).compact("platform")
+        except Exception as exception:
+            errors.append(exception)
+
+    threads = [threading.Thread(target=compact) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(list((tmp_path / "platform").glob(SEGMENT))) == 1
+    assert len(store.series("platform", 0, "T1")) == 10
@@ -0,0 +1,44 @@
+import numpy as np
+from platforms import create_platform
+from streaming import BINS, merge, moments, streaming_readout
+
+
+def test_merge_moments():
+    """Test that merged moments match the ones of the whole set of points."""
+    rng = np.random.default_rng(0)
+    points = rng.normal(size=(1000, 2)) @ np.array([[1.0, 0.3], [0.0, 2.0]])
+    merged = None
+    for chunk in np.array_split(points, 7):
+        merged = merge(merged, moments(chunk))
+    assert merged[0] == len(points)
+    np.testing.assert_allclose(merged[1:3], points.mean(axis=0))
+    np.testing.assert_allclose(
+        merged[3:].reshape(2, 2) / (len(points) - 1), np.cov(points.T)
+    )
+
+
+def test_streaming_readout():
+    """Test early stopping and bounded memory on a simulated platform."""
+    platform = create_platform("qw5q_gold", simulate=True)
+    platform.connect()
+    qubits = {q: platform.qubits[q] for q in list(platform.qubits)[:2]}
+    params = streaming_readout.parameters_type.load(
+        dict(nshots=10**6, chunk=1000, tolerance=0.01)
+    )
+    data, _ = streaming_readout.acquisition(params, platform=platform, qubits=qubits)
+    results, _ = streaming_readout.fit(data)
+    platform.disconnect()
+
+    for qubit in qubits:
+        assert data.data[qubit].shape == (2, BINS, BINS)
+        assert results.nshots[qubit] < 10**5
+        assert results.error[qubit] < 0.01
+        assert 0.5 < results.assignment_fidelity[qubit] <= 1
+        # the threshold separates the two states
+        angle = results.iq_angle[qubit]
+        ground, excited = (
+            complex(*getattr(results, f"mean_{state}_states")[qubit])
+            * np.exp(1j * angle)
+            for state in ("gnd", "exc")
+        )
+        assert ground.real < results.threshold[qubit] < excited.real
@@ -0,0 +1,95 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import sweeps
+from sweeps import (
+    MIN_DELAY,
+    AdaptiveCoherenceParameters,
+    _acquisition,
+    exp_decay,
+    fit_decay,
+    initial_delays,
+    refined_delays,
+)
+
+
+def test_initial_delays():
+    delays = initial_delays(1000, 10, 5)
+    assert delays[0] == MIN_DELAY
+    assert delays[-1] == 5000
+    assert np.all(np.diff(delays) > 0)
+    # unknown times still span a few delays
+    delays = initial_delays(0, 10, 5)
+    assert delays[0] == MIN_DELAY
+    assert delays[-1] == 2 * MIN_DELAY
+
+
+def test_refined_delays():
+    delays = refined_delays(3000, 10)
+    assert delays[0] == 1000
+    assert delays[-1] == 9000
+    assert len(delays) == 10
+
+
+def test_fit_decay():
+    waits = initial_delays(2000, 30, 5).astype(float)
+    popt, error = fit_decay(waits, exp_decay(waits, 0.8, 0.6, 2000))
+    np.testing.assert_allclose(popt, [0.8, 0.6, 2000], rtol=1e-3)
+    assert error < 1
+
+
+def test_fit_decay_failure():
+    waits = initial_delays(2000, 10, 5).astype(float)
+    popt, error = fit_decay(waits, np.ones_like(waits))
+    assert popt == [0, 0, 0]
+    assert error == np.inf
+
+
+@pytest.fixture
+def rounds(monkeypatch):
+    """Acquire an ideal decay for qubit 0 and noise for qubit 1, recording
+    the delays of each round."""
+    acquired = []
+    generator = np.random.default_rng(1234)
+
+    def acquire(platform, params, data, delays):
+        acquired.append({qubit: values.copy() for qubit, values in delays.items()})
+        for qubit, values in delays.items():
+            if qubit == 0:
+                signal = exp_decay(values, 0.8, 0.6, 2000)
+            else:
+                signal = generator.random(len(values))
+            data.register_qubit(
+                sweeps.CoherenceType,
+                qubit,
+                dict(wait=values, signal=signal, phase=np.zeros(len(values))),
+            )
+
+    monkeypatch.setattr(sweeps, "_acquire", acquire)
+    return acquired
+
+
+def test_acquisition_rounds(rounds):
+    qubits = {0: SimpleNamespace(T1=1000), 1: SimpleNamespace(T1=0)}
+    params = AdaptiveCoherenceParameters(kind="t1", points=8, rounds=3)
+    data = _acquisition(params, None, qubits)
+
+    assert 1 < len(rounds) <= params.rounds
+    assert set(rounds[0]) == {0, 1}
+    # the ideal decay is known after the first round
+    for delays in rounds[1:]:
+        assert set(delays) == {1}
+    # each round only adds new delays
+    seen = set(rounds[0][1])
+    for delays in rounds[1:]:
+        assert not seen & set(delays[1])
+        seen |= set(delays[1])
+    assert set(data[1].wait) == seen
+
+
+def test_acquisition_single_round(rounds):
+    qubits = {0: SimpleNamespace(T1=1000)}
+    params = AdaptiveCoherenceParameters(kind="t1", points=8, rounds=3)
+    _acquisition(params, None, qubits)
+    assert len(rounds) == 1
@@ -0,0 +1,76 @@
+import io
+import json
+
+import pytest
+import tracing
+from platforms import create_platform
+from tracing import Tracer, breakdown, instrument, tracer, write_breakdown
+
+
+def test_self_time():
+    """Test that nested spans are not counted twice in the breakdown."""
+    local = Tracer()
+    with local.context(experiment="T1"):
+        with local.span("acquisition"):
+            with local.span("compile"):
+                pass
+            with local.span("fit", qubit=0):
+                pass
+    with pytest.raises(ValueError):
+        with local.span("connect"):
+            raise ValueError("unreachable")
+
+    events = local.events()
+    outer = next(e for e in events if e["name"] == "acquisition")
+    inner = [e for e in events if e["name"] in ("compile", "fit")]
+    assert outer["args"]["self_time_us"] == pytest.approx(
+        outer["dur"] - sum(e["dur"] for e in inner)
+    )
+    assert all(e["args"]["experiment"] == "T1" for e in inner)
+    assert next(e for e in events if e["name"] == "connect")["args"]["error"]
+
+    table = breakdown(events)
+    assert set(table) == {"T1", None}
+    assert sum(table["T1"].values()) == pytest.approx(outer["dur"] / 1e6)
+    file = io.StringIO()
+    write_breakdown(events, file)
+    assert "| T1 |" in file.getvalue()
+
+
+def test_mark(monkeypatch):
+    """Test that the spans of a run are selected, and that old spans are
+    dropped."""
+    monkeypatch.setattr(tracing, "MAX_SPANS", 3)
+    local = Tracer()
+    with local.span("first"):
+        pass
+    start = local.mark()
+    assert local.events(since=start) == []
+    for name in ("second", "third", "fourth"):
+        with local.span(name):
+            pass
+    assert [e["name"] for e in local.events(since=start)] == [
+        "second",
+        "third",
+        "fourth",
+    ]
+    with local.span("fifth"):
+        pass
+    assert len(local.events()) == 3
+    assert [e["name"] for e in local.events(since=local.mark() - 1)] == ["fifth"]
+
+
+def test_instrument(tmp_path):
+    """Test tracing the instruments of a simulated platform."""
+    platform = create_platform("qw5q_gold", simulate=True)
+    assert instrument(instrument(platform)) is platform
+    tracer.clear()
+    platform.connect()
+    platform.disconnect()
+    names = {e["name"] for e in tracer.events()}
+    assert "simulator.connect" in names
+    assert "simulator.disconnect" in names
+
+    tracer.export(tmp_path / "trace.json")
+    trace = json.loads((tmp_path / "trace.json").read_text())
+    assert all(e["ph"] in ("X", "M") for e in trace["traceEvents"])
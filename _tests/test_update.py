@@ -0,0 +1,53 @@
+import copy
+import difflib
+import json
+import pathlib
+
+from update import (
+    RUNCARD,
+    apply,
+    characterization,
+    get,
+    history,
+    native_gate,
+    replay,
+    update_runcard,
+)
+
+PATH = pathlib.Path(__file__).parents[1]
+
+
+def test_update_runcard(tmp_path):
+    """Test that only the changed values are rewritten and can be replayed."""
+    original = (PATH / "qw5q_gold" / RUNCARD).read_text()
+    (tmp_path / RUNCARD).write_text(original)
+    runcard = json.loads(original)
+
+    updates = {
+        characterization(0, "T1"): 9000.5,
+        characterization(1, "T2"): runcard["characterization"]["single_qubit"]["1"][
+            "T2"
+        ],
+        characterization(2, "mean_gnd_states"): [0.1, 0.2],
+        characterization(3, "new_parameter"): 1,
+        native_gate(4, "RX", "amplitude"): 0.3,
+    }
+    operations = update_runcard(tmp_path, updates)
+    assert [operation["op"] for operation in operations] == [
+        "replace",
+        "replace",
+        "add",
+        "replace",
+    ]
+
+    updated = (tmp_path / RUNCARD).read_text()
+    changed = [
+        line
+        for line in difflib.ndiff(original.splitlines(), updated.splitlines())
+        if line[0] in "+-"
+    ]
+    assert len(changed) == 11
+    assert json.loads(updated) == apply(copy.deepcopy(runcard), operations)
+    assert get(json.loads(updated), characterization(0, "T1")) == 9000.5
+    assert replay(copy.deepcopy(runcard), history(tmp_path)) == json.loads(updated)
+    assert update_runcard(tmp_path, updates) == []
@@ -0,0 +1,79 @@
+import json
+import pathlib
+import shutil
+
+import pytest
+from validation import errors, instrument_names, load_index, main, validate
+
+PATH = pathlib.Path(__file__).parents[1]
+
+
+def idfn(path):
+    """Helper function to identify platform tested."""
+    return path.name
+
+
+@pytest.mark.parametrize(
+    "folder", [p.parent for p in PATH.glob("*/platform.py")], ids=idfn
+)
+def test_platforms(folder):
+    """Test that the runcards of the repository are consistent."""
+    validate(folder)
+
+
+def test_errors(tmp_path):
+    """Test that inconsistent runcards are reported."""
+    folder = tmp_path / "qw5q_gold"
+    shutil.copytree(PATH / "qw5q_gold", folder, ignore=shutil.ignore_patterns("*.bin"))
+    path = folder / "parameters.json"
+    runcard = json.loads(path.read_text())
+    runcard["native_gates"]["two_qubit"]["0-1"] = runcard["native_gates"]["two_qubit"][
+        "0-2"
+    ]
+    runcard["instruments"]["qrm_rf_c"] = {}
+    del runcard["native_gates"]["single_qubit"]["4"]
+    path.write_text(json.dumps(runcard))
+
+    found = errors(folder)
+    assert len(found) == 3
+    assert any("0-1" in error for error in found)
+    assert any("qrm_rf_c" in error for error in found)
+    assert any("misses 4" in error for error in found)
+    with pytest.raises(ValueError):
+        validate(folder)
+
+
+def test_instrument_names():
+    source = """
+modules = {"qcm": Qcm("qcm", ADDRESS)}
+pump = SGS100A(name="pump", address=ADDRESS)
+oscillators = [Oscillator(f"lo_{kind}", None) for kind in KINDS]
+settings = {"frequency": 5e9}
+"""
+    assert instrument_names(source) == ["qcm", "pump", "lo_.+"]
+
+
+def test_index():
+    index = load_index(PATH / "qw5q_gold")
+    assert load_index(PATH / "qw5q_gold") is index
+    assert index.channels(0)["readout"] == "L3-25_a"
+    assert index.instruments(0) == {"qrm_rf_a", "qcm_rf0", "qcm_bb0", "twpa_pump"}
+    assert index.qubits_on("qrm_rf_a") == [0, 1]
+    assert index.qubits_of("L2-22") == [0, 1, 2, 3, 4]
+    assert index.coupler(2, 0) is None
+    with pytest.raises(KeyError):
+        index.coupler(0, 1)
+
+
+def test_main(tmp_path, monkeypatch, capsys):
+    """Test that the platforms of QIBOLAB_PLATFORMS are validated."""
+    shutil.copytree(
+        PATH / "qw5q_gold",
+        tmp_path / "qw5q_gold",
+        ignore=shutil.ignore_patterns("*.bin"),
+    )
+    monkeypatch.setenv("QIBOLAB_PLATFORMS", str(tmp_path))
+    assert main() == 0
+    output = capsys.readouterr().out
+    assert output.startswith("qw5q_gold: 0 errors")
+    assert len(output.splitlines()) == 1
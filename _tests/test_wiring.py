@@ -0,0 +1,70 @@
+import json
+import pathlib
+
+import pytest
+from qibolab.qubits import Qubit
+from wiring import Wiring, load_wiring
+
+PATH = pathlib.Path(__file__).parents[1]
+
+
+def idfn(path):
+    """Helper function to identify platform tested."""
+    return path.parent.name
+
+
+@pytest.mark.parametrize("path", PATH.glob("*/platform.py"), ids=idfn)
+def test_platform_wiring(path):
+    """Test that the wiring refers to the qubits and couplers of the runcard."""
+    runcard = json.loads((path.parent / "parameters.json").read_text())
+    characterization = runcard["characterization"]
+    wiring = load_wiring(path.parent)
+    assert load_wiring(path.parent) is wiring
+    wiring.validate(
+        qubits=[json.loads(q) for q in characterization["single_qubit"]],
+        couplers=[json.loads(c) for c in characterization.get("coupler", {})],
+    )
+    assignments = wiring.assignments("qubits", runcard["qubits"])
+    assert all("readout" in lines for lines in assignments.values())
+
+
+class Instrument:
+    def ports(self, *args, **kwargs):
+        return (args, kwargs)
+
+
+def test_build():
+    """Test building the channels with the defaults of all qubits."""
+    wiring = Wiring.load(
+        {
+            "channels": {
+                "ro": {"port": ["controller", ["device", "OUT"]], "power_range": 10},
+                "fb": {"port": ["controller", 0, {"out": False}]},
+                "fl": {"port": ["controller", 1], "max_bias": 2.5},
+                "twpa": {"local_oscillator": "pump"},
+            },
+            "qubits": {
+                "*": {"readout": "ro", "feedback": "fb", "twpa": "twpa"},
+                '"D1"': {"flux": "fl"},
+            },
+        }
+    )
+    instruments = {"controller": Instrument(), "pump": Instrument()}
+    qubits = {"D1": Qubit("D1"), "D2": Qubit("D2")}
+    with pytest.raises(AttributeError):
+        # the fake ports have no power range
+        wiring.build(instruments, qubits)
+
+    del wiring.channels["ro"]["power_range"]
+    channels = wiring.build(instruments, qubits)
+    assert channels["ro"].port == ((("device", "OUT"),), {})
+    assert channels["fb"].port == ((0,), {"out": False})
+    assert channels["twpa"].local_oscillator is instruments["pump"]
+    assert qubits["D2"].readout is qubits["D1"].readout
+    assert qubits["D1"].flux.max_bias == 2.5
+    assert channels["fl"].qubit is qubits["D1"]
+    assert qubits["D2"].flux is None
+
+    wiring.qubits["D2"] = {"drive": "missing"}
+    with pytest.raises(ValueError, match="missing"):
+        wiring.build(instruments, qubits)
@@ -1,23 +1,40 @@
+import importlib.util
 import itertools
 import pathlib
+import sys
 
-from laboneq.dsl.device import create_connection
-from laboneq.dsl.device.instruments import HDAWG, PQSC, SHFQC
-from laboneq.simple import DeviceSetup
 from qibolab import Platform
-from qibolab.channels import Channel, ChannelMap
-from qibolab.instruments.dummy import DummyLocalOscillator
-from qibolab.instruments.rohde_schwarz import SGS100A
-from qibolab.instruments.zhinst import Zurich
-from qibolab.kernels import Kernels
 from qibolab.serialize import (
     load_instrument_settings,
     load_qubits,
-    load_runcard,
     load_settings,
 )
 
 FOLDER = pathlib.Path(__file__).parent
+# shared helpers, e.g. the compiled runcard loader, loaded by path such that
+# installed modules with the same names cannot shadow them
+HELPERS = FOLDER.parent / "_selfhosted"
+
+
+def _helper(name: str):
+    """Module of the shared helpers."""
+    path = HELPERS / f"{name}.py"
+    module = sys.modules.get(name)
+    location = getattr(module, "__file__", None)
+    if location is not None and pathlib.Path(location).resolve() == path.resolve():
+        return module
+    qualified = f"_selfhosted_{name}"
+    if qualified not in sys.modules:
+        spec = importlib.util.spec_from_file_location(qualified, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[qualified] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[qualified]
+            raise
+    return sys.modules[qualified]
+
 
 TWPA_ADDRESS = "192.168.0.35"
 
@@ -30,6 +47,17 @@ def create():
     Args:
         runcard_path (str): Path to the runcard file.
     """
+    # drivers and helpers are imported here, such that loading this module stays cheap
+    from laboneq.dsl.device import create_connection
+    from laboneq.dsl.device.instruments import HDAWG, PQSC, SHFQC
+    from laboneq.simple import DeviceSetup
+    from qibolab.instruments.dummy import DummyLocalOscillator
+    from qibolab.instruments.rohde_schwarz import SGS100A
+    from qibolab.instruments.zhinst import Zurich
+
+    helpers = _helper("runcard")
+    load_kernels, load_runcard = helpers.load_kernels, helpers.load_runcard
+    load_wiring = _helper("wiring").load_wiring
 
     device_setup = DeviceSetup("EL_ZURO")
     # Dataserver
@@ -93,68 +121,12 @@ def create():
         smearing=50,
     )
 
-    # Create channel objects and map controllers
-    channels = ChannelMap()
-    # feedback
-    channels |= Channel(
-        "L2-7", port=controller.ports(("device_shfqc", "[QACHANNELS/0/INPUT]"))
-    )
-    # readout
-    channels |= Channel(
-        "L3-31", port=controller.ports(("device_shfqc", "[QACHANNELS/0/OUTPUT]"))
-    )
-    # drive
-    channels |= (
-        Channel(
-            f"L4-{i}",
-            port=controller.ports(("device_shfqc", f"SGCHANNELS/{i-5}/OUTPUT")),
-        )
-        for i in range(15, 20)
-    )
-    # flux qubits (CAREFUL WITH THIS !!!)
-    channels |= (
-        Channel(f"L4-{i}", port=controller.ports(("device_hdawg", f"SIGOUTS/{i-6}")))
-        for i in range(6, 11)
-    )
-    # flux couplers
-    channels |= (
-        Channel(f"L4-{i}", port=controller.ports(("device_hdawg", f"SIGOUTS/{i-11+5}")))
-        for i in range(11, 14)
-    )
-    channels |= Channel("L4-14", port=controller.ports(("device_hdawg2", "SIGOUTS/0")))
-    # TWPA pump(EraSynth)
-    channels |= Channel("L3-32")
-
-    # SHFQC
-    # Sets the maximal Range of the Signal Output power.
-    # The instrument selects the closest available Range [-50. -30. -25. -20. -15. -10.  -5.   0.   5.  10.]
-    # with a resolution of 5 dBm.
-
+    # The power ranges of the channels are set in wiring.json.
+    # SHFQC: the instrument selects the closest available range
+    # [-50. -30. -25. -20. -15. -10.  -5.   0.   5.  10.] dBm (drive from -30 dBm).
     # WE DON'T WANT BIG NUMBERS HERE AT THE EXPENSE OF AMPLITUDES IN THE ORDER 10-2 !!!
-
-    # readout "gain": Set to max power range (10 Dbm) if no distorsion
-    channels["L3-31"].power_range = -15  # -15
-    # feedback "gain": play with the power range to calibrate the best RO
-    channels["L2-7"].power_range = 10
-
-    # drive
-    # The instrument selects the closest available Range [-30. -25. -20. -15. -10.  -5.   0.   5.  10.]
-    channels["L4-15"].power_range = -10  # q0
-    channels["L4-16"].power_range = -5  # q1
-    channels["L4-17"].power_range = -10  # q2
-    channels["L4-18"].power_range = -5  # q3
-    channels["L4-19"].power_range = -10  # q4
-
-    # HDAWGS
-    # Sets the output voltage range.
-    # The instrument selects the next higher available Range with a resolution of 0.4 Volts.
-
-    # flux
-    for i in range(6, 11):
-        channels[f"L4-{i}"].power_range = 0.8
-    # flux couplers
-    for i in range(11, 15):
-        channels[f"L4-{i}"].power_range = 0.8
+    # HDAWG: the instrument selects the next higher available output voltage range,
+    # with a resolution of 0.4 Volts.
 
     # Instantiate local oscillators
     local_oscillators = [
@@ -164,39 +136,17 @@ def create():
 
     local_oscillators.append(SGS100A("TWPA", TWPA_ADDRESS))
 
-    # Map LOs to channels
-    ch_to_lo = {
-        "L3-31": 0,
-        "L4-15": 1,
-        "L4-16": 1,
-        "L4-17": 2,
-        "L4-18": 2,
-        "L4-19": 3,
-        "L3-32": 4,
-    }
-    for ch, lo in ch_to_lo.items():
-        channels[ch].local_oscillator = local_oscillators[lo]
-
-    # create qubit objects
+    # create qubit objects and connect them as described in wiring.json
     runcard = load_runcard(FOLDER)
-    kernels = Kernels.load(FOLDER)
+    kernels = load_kernels(FOLDER)
     qubits, couplers, pairs = load_qubits(runcard, kernels)
     settings = load_settings(runcard)
+    load_wiring(FOLDER).build(
+        {"controller": controller, **{lo.name: lo for lo in local_oscillators}},
+        qubits,
+        couplers,
+    )
 
-    # assign channels to qubits and sweetspots(operating points)
-    for q in range(0, 5):
-        qubits[q].readout = channels["L3-31"]
-        qubits[q].feedback = channels["L2-7"]
-
-    for q in range(0, 5):
-        qubits[q].drive = channels[f"L4-{15 + q}"]
-        qubits[q].flux = channels[f"L4-{6 + q}"]
-        qubits[q].twpa = channels["L3-32"]
-        channels[f"L4-{6 + q}"].qubit = qubits[q]
-
-    # assign channels to couplers and sweetspots(operating points)
-    for c, coupler in enumerate(couplers.values()):
-        coupler.flux = channels[f"L4-{11 + c}"]
     instruments = {controller.name: controller}
     instruments.update({lo.name: lo for lo in local_oscillators})
     instruments = load_instrument_settings(runcard, instruments)
@@ -1,22 +1,40 @@
+import importlib.util
 import pathlib
+import sys
 
-from qibolab.channels import Channel, ChannelMap
-from qibolab.instruments.qblox.cluster_qcm_bb import QcmBb
-from qibolab.instruments.qblox.cluster_qcm_rf import QcmRf
-from qibolab.instruments.qblox.cluster_qrm_rf import QrmRf
-from qibolab.instruments.qblox.controller import QbloxController
-from qibolab.instruments.rohde_schwarz import SGS100A
 from qibolab.platform import Platform
 from qibolab.serialize import (
     load_instrument_settings,
     load_qubits,
-    load_runcard,
     load_settings,
 )
 
 ADDRESS = "192.168.0.20"
 TIME_OF_FLIGHT = 500
 FOLDER = pathlib.Path(__file__).parent
+# shared helpers, e.g. the compiled runcard loader, loaded by path such that
+# installed modules with the same names cannot shadow them
+HELPERS = FOLDER.parent / "_selfhosted"
+
+
+def _helper(name: str):
+    """Module of the shared helpers."""
+    path = HELPERS / f"{name}.py"
+    module = sys.modules.get(name)
+    location = getattr(module, "__file__", None)
+    if location is not None and pathlib.Path(location).resolve() == path.resolve():
+        return module
+    qualified = f"_selfhosted_{name}"
+    if qualified not in sys.modules:
+        spec = importlib.util.spec_from_file_location(qualified, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[qualified] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[qualified]
+            raise
+    return sys.modules[qualified]
 
 
 def create():
@@ -25,6 +43,16 @@ def create():
     Args:
         runcard_path (str): Path to the runcard file.
     """
+    # drivers and helpers are imported here, such that loading this module stays cheap
+    from qibolab.instruments.qblox.cluster_qcm_bb import QcmBb
+    from qibolab.instruments.qblox.cluster_qcm_rf import QcmRf
+    from qibolab.instruments.qblox.cluster_qrm_rf import QrmRf
+    from qibolab.instruments.qblox.controller import QbloxController
+    from qibolab.instruments.rohde_schwarz import SGS100A
+
+    helpers = _helper("runcard")
+    load_kernels, load_runcard = helpers.load_kernels, helpers.load_runcard
+    load_wiring = _helper("wiring").load_wiring
 
     runcard = load_runcard(FOLDER)
 
@@ -55,60 +83,9 @@ def create():
     instruments.update(modules)
     instruments = load_instrument_settings(runcard, instruments)
 
-    # Create channel objects
-    channels = ChannelMap()
-    # Readout
-    channels |= Channel(name="L3-25_a", port=modules["qrm_rf_a"].ports("o1"))
-    channels |= Channel(name="L3-25_b", port=modules["qrm_rf_b"].ports("o1"))
-    # Feedback
-    channels |= Channel(name="L2-5_a", port=modules["qrm_rf_a"].ports("i1", out=False))
-    channels |= Channel(name="L2-5_b", port=modules["qrm_rf_b"].ports("i1", out=False))
-    # Drive
-    channels |= Channel(name="L4-28", port=modules["qcm_rf0"].ports("o1"))
-    channels |= Channel(name="L3-11", port=modules["qcm_rf0"].ports("o2"))
-    channels |= Channel(name="L3-12", port=modules["qcm_rf1"].ports("o1"))
-    channels |= Channel(name="L3-13", port=modules["qcm_rf1"].ports("o2"))
-    channels |= Channel(name="L4-22", port=modules["qcm_rf2"].ports("o1"))
-    # Flux
-    channels |= Channel(name="L4-5", port=modules["qcm_bb0"].ports("o1"))
-    channels |= Channel(name="L4-1", port=modules["qcm_bb0"].ports("o2"))
-    channels |= Channel(name="L4-2", port=modules["qcm_bb0"].ports("o3"))
-    channels |= Channel(name="L4-3", port=modules["qcm_bb0"].ports("o4"))
-    channels |= Channel(name="L4-4", port=modules["qcm_bb1"].ports("o1"))
-    # TWPA
-    channels |= Channel(name="L2-22", port=None)
-    channels["L2-22"].local_oscillator = twpa_pump
-
-    # create qubit objects
-    qubits, couplers, pairs = load_qubits(runcard)
-
-    # remove witness qubit
-    # del qubits[5]
-    # assign channels to qubits
-    for q in [0, 1]:
-        qubits[q].readout = channels["L3-25_a"]
-        qubits[q].feedback = channels["L2-5_a"]
-        qubits[q].twpa = channels["L2-22"]
-    for q in [2, 3, 4]:
-        qubits[q].readout = channels["L3-25_b"]
-        qubits[q].feedback = channels["L2-5_b"]
-        qubits[q].twpa = channels["L2-22"]
-
-    qubits[0].drive = channels["L4-28"]
-    qubits[0].flux = channels["L4-5"]
-    channels["L4-5"].qubit = qubits[0]
-
-    qubits[4].drive = channels["L4-22"]
-    qubits[4].flux = channels["L4-4"]
-    channels["L4-4"].qubit = qubits[4]
-    for q in range(1, 4):
-        qubits[q].drive = channels[f"L3-{10 + q}"]
-        qubits[q].flux = channels[f"L4-{q}"]
-        channels[f"L4-{q}"].qubit = qubits[q]
-
-    # set maximum allowed bias
-    for q in range(5):
-        qubits[q].flux.max_bias = 2.5
+    # create qubit objects and connect them as described in wiring.json
+    qubits, couplers, pairs = load_qubits(runcard, load_kernels(FOLDER))
+    load_wiring(FOLDER).build(instruments, qubits, couplers)
 
     settings = load_settings(runcard)
 
@@ -1,22 +1,40 @@
+import importlib.util
 import pathlib
+import sys
 
-from qibolab.channels import Channel, ChannelMap
-from qibolab.instruments.qblox.cluster_qcm_bb import QcmBb
-from qibolab.instruments.qblox.cluster_qcm_rf import QcmRf
-from qibolab.instruments.qblox.cluster_qrm_rf import QrmRf
-from qibolab.instruments.qblox.controller import QbloxController
-from qibolab.instruments.rohde_schwarz import SGS100A
 from qibolab.platform import Platform
 from qibolab.serialize import (
     load_instrument_settings,
     load_qubits,
-    load_runcard,
     load_settings,
 )
 
 NAME = "spinq10q"
 ADDRESS = "192.168.0.6"
 FOLDER = pathlib.Path(__file__).parent
+# shared helpers, e.g. the compiled runcard loader, loaded by path such that
+# installed modules with the same names cannot shadow them
+HELPERS = FOLDER.parent / "_selfhosted"
+
+
+def _helper(name: str):
+    """Module of the shared helpers."""
+    path = HELPERS / f"{name}.py"
+    module = sys.modules.get(name)
+    location = getattr(module, "__file__", None)
+    if location is not None and pathlib.Path(location).resolve() == path.resolve():
+        return module
+    qualified = f"_selfhosted_{name}"
+    if qualified not in sys.modules:
+        spec = importlib.util.spec_from_file_location(qualified, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[qualified] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[qualified]
+            raise
+    return sys.modules[qualified]
 
 
 def create():
@@ -25,6 +43,17 @@ def create():
     Args:
         runcard_path (str): Path to the runcard file.
     """
+    # drivers and helpers are imported here, such that loading this module stays cheap
+    from qibolab.instruments.qblox.cluster_qcm_bb import QcmBb
+    from qibolab.instruments.qblox.cluster_qcm_rf import QcmRf
+    from qibolab.instruments.qblox.cluster_qrm_rf import QrmRf
+    from qibolab.instruments.qblox.controller import QbloxController
+    from qibolab.instruments.rohde_schwarz import SGS100A
+
+    helpers = _helper("runcard")
+    load_kernels, load_runcard = helpers.load_kernels, helpers.load_runcard
+    load_wiring = _helper("wiring").load_wiring
+
     runcard = load_runcard(FOLDER)
     modules = {
         "qrm_rf0": QrmRf("qrm_rf0", f"{ADDRESS}:18"),
@@ -43,38 +72,10 @@ def create():
         twpa_pump0.name: twpa_pump0,
     }
     instruments.update(modules)
-    channels = ChannelMap()
-    # Readout
-    channels |= Channel(name="L3-20", port=modules["qrm_rf0"].ports("o1"))
-    # Feedback
-    channels |= Channel(name="L1-1", port=modules["qrm_rf0"].ports("i1", out=False))
-    # Drive
-    channels |= Channel(name="L6-1", port=modules["qcm_rf0"].ports("o1"))
-    channels |= Channel(name="L6-2", port=modules["qcm_rf0"].ports("o2"))
-    channels |= Channel(name="L6-3", port=modules["qcm_rf1"].ports("o1"))
-    channels |= Channel(name="L6-4", port=modules["qcm_rf1"].ports("o2"))
-    channels |= Channel(name="L6-5", port=modules["qcm_rf2"].ports("o1"))
-    # Flux
-    channels |= Channel(name="L6-39", port=modules["qcm_bb0"].ports("o1"))
-    channels |= Channel(name="L6-40", port=modules["qcm_bb0"].ports("o2"))
-    channels |= Channel(name="L6-41", port=modules["qcm_bb0"].ports("o3"))
-    channels |= Channel(name="L6-42", port=modules["qcm_bb0"].ports("o4"))
-    channels |= Channel(name="L6-43", port=modules["qcm_bb1"].ports("o1"))
-    # TWPA
-    channels |= Channel(name="L3-10", port=None)
-    channels["L3-10"].local_oscillator = twpa_pump0
-
-    # create qubit objects
-    qubits, couplers, pairs = load_qubits(runcard)
 
-    for q in range(5):
-        qubits[q].readout = channels["L3-20"]
-        qubits[q].feedback = channels["L1-1"]
-        qubits[q].twpa = channels["L3-10"]
-        qubits[q].drive = channels[f"L6-{q+1}"]
-        qubits[q].flux = channels[f"L6-{39+q}"]
-        channels[f"L6-{39+q}"].qubit = qubits[q]
-        qubits[q].flux.max_bias = 2.5
+    # create qubit objects and connect them as described in wiring.json
+    qubits, couplers, pairs = load_qubits(runcard, load_kernels(FOLDER))
+    load_wiring(FOLDER).build(instruments, qubits, couplers)
 
     settings = load_settings(runcard)
     instruments = load_instrument_settings(runcard, instruments)
@@ -1,14 +1,36 @@
+import importlib.util
 import pathlib
+import sys
 
-from qibolab.channels import Channel, ChannelMap
-from qibolab.instruments.rfsoc import RFSoC
-from qibolab.instruments.rohde_schwarz import SGS100A as LocalOscillator
 from qibolab.platform import Platform
-from qibolab.serialize import load_qubits, load_runcard, load_settings
+from qibolab.serialize import load_qubits, load_settings
 
 ADDRESS = "192.168.0.72"
 PORT = 6000
 FOLDER = pathlib.Path(__file__).parent
+# shared helpers, e.g. the compiled runcard loader, loaded by path such that
+# installed modules with the same names cannot shadow them
+HELPERS = FOLDER.parent / "_selfhosted"
+
+
+def _helper(name: str):
+    """Module of the shared helpers."""
+    path = HELPERS / f"{name}.py"
+    module = sys.modules.get(name)
+    location = getattr(module, "__file__", None)
+    if location is not None and pathlib.Path(location).resolve() == path.resolve():
+        return module
+    qualified = f"_selfhosted_{name}"
+    if qualified not in sys.modules:
+        spec = importlib.util.spec_from_file_location(qualified, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[qualified] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[qualified]
+            raise
+    return sys.modules[qualified]
 
 
 def create():
@@ -16,23 +38,21 @@ def create():
 
     IPs and other instrument related parameters are hardcoded in.
     """
+    # drivers and helpers are imported here, such that loading this module stays cheap
+    from qibolab.instruments.rfsoc import RFSoC
+
+    helpers = _helper("runcard")
+    load_kernels, load_runcard = helpers.load_kernels, helpers.load_runcard
+    load_wiring = _helper("wiring").load_wiring
+
     # Instantiate QICK instruments
     controller = RFSoC(str(FOLDER), ADDRESS, PORT, sampling_rate=9.8304)
     controller.cfg.adc_trig_offset = 200
     controller.cfg.repetition_duration = 70
-    # Create channel objects
-    channels = ChannelMap()
-    channels |= Channel("L3-22_ro", port=controller.ports(1))  # readout (DAC)
-    channels |= Channel("L1-2-RO", port=controller.ports(0))  # feedback (readout ADC)
-    channels |= Channel("L3-22_qd", port=controller.ports(0))  # drive
-
-    # create qubit objects
+    # create qubit objects and connect them as described in wiring.json
     runcard = load_runcard(FOLDER)
-    qubits, couplers, pairs = load_qubits(runcard)
-    # assign channels to qubits
-    qubits[0].readout = channels["L3-22_ro"]
-    qubits[0].feedback = channels["L1-2-RO"]
-    qubits[0].drive = channels["L3-22_qd"]
+    qubits, couplers, pairs = load_qubits(runcard, load_kernels(FOLDER))
+    load_wiring(FOLDER).build({"controller": controller}, qubits, couplers)
 
     instruments = {controller.name: controller}
 
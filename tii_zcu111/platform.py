@@ -1,13 +1,11 @@
+import importlib.util
 import pathlib
+import sys
 
-from qibolab.channels import Channel, ChannelMap
-from qibolab.instruments.erasynth import ERA
-from qibolab.instruments.rfsoc import RFSoC
 from qibolab.platform import Platform
 from qibolab.serialize import (
     load_instrument_settings,
     load_qubits,
-    load_runcard,
     load_settings,
 )
 
@@ -17,6 +15,29 @@ PORT = 6000
 LO_ADDRESS = "192.168.0.212"
 
 FOLDER = pathlib.Path(__file__).parent
+# shared helpers, e.g. the compiled runcard loader, loaded by path such that
+# installed modules with the same names cannot shadow them
+HELPERS = FOLDER.parent / "_selfhosted"
+
+
+def _helper(name: str):
+    """Module of the shared helpers."""
+    path = HELPERS / f"{name}.py"
+    module = sys.modules.get(name)
+    location = getattr(module, "__file__", None)
+    if location is not None and pathlib.Path(location).resolve() == path.resolve():
+        return module
+    qualified = f"_selfhosted_{name}"
+    if qualified not in sys.modules:
+        spec = importlib.util.spec_from_file_location(qualified, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[qualified] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[qualified]
+            raise
+    return sys.modules[qualified]
 
 
 def create():
@@ -24,53 +45,30 @@ def create():
 
     IPs and other instrument related parameters are hardcoded in.
     """
+    # drivers and helpers are imported here, such that loading this module stays cheap
+    from qibolab.instruments.erasynth import ERA
+    from qibolab.instruments.rfsoc import RFSoC
+
+    helpers = _helper("runcard")
+    load_kernels, load_runcard = helpers.load_kernels, helpers.load_runcard
+    load_wiring = _helper("wiring").load_wiring
 
     # Instantiate QICK instruments
     controller = RFSoC(str(FOLDER), ADDRESS, PORT, sampling_rate=6.144)
     controller.cfg.adc_trig_offset = 200
     controller.cfg.repetition_duration = 100
 
-    # Create channel objects
-    channels = ChannelMap()
-    channels |= Channel("L3-30_ro", port=controller.ports(6))  # readout  dac6
-    # QUBIT 0
-    channels |= Channel("L2-4-RO_0", port=controller.ports(0))  # feedback adc0
-    channels |= Channel("L4-29_qd", port=controller.ports(3))  # drive    dac3
-    channels |= Channel("L1-22_fl", port=controller.ports(0))  # flux     dac0
-    # QUBIT 1
-    channels |= Channel("L2-4-RO_1", port=controller.ports(1))  # feedback adc1
-    channels |= Channel("L4-30_qd", port=controller.ports(4))  # drive    dac4
-    channels |= Channel("L1-23_fl", port=controller.ports(1))  # flux     dac1
-    # QUBIT 2
-    channels |= Channel("L2-4-RO_2", port=controller.ports(2))  # feedback adc2
-    channels |= Channel("L4-31_qd", port=controller.ports(5))  # drive    dac5
-    channels |= Channel("L1-24_fl", port=controller.ports(2))  # flux     dac2
-
     # Readout local oscillator
     local_oscillator = ERA("ErasynthLO", LO_ADDRESS, ethernet=True)
-    channels["L3-30_ro"].local_oscillator = local_oscillator
 
-    # create qubit objects
+    # create qubit objects and connect them as described in wiring.json
     runcard = load_runcard(FOLDER)
-    qubits, couplers, pairs = load_qubits(runcard)
-    # assign channels to qubits
-    qubits[0].readout = channels["L3-30_ro"]
-    qubits[0].feedback = channels["L2-4-RO_0"]
-    qubits[0].drive = channels["L4-29_qd"]
-    qubits[0].flux = channels["L1-22_fl"]
-    channels["L1-22_fl"].qubit = qubits[0]
-
-    qubits[1].readout = channels["L3-30_ro"]
-    qubits[1].feedback = channels["L2-4-RO_1"]
-    qubits[1].drive = channels["L4-30_qd"]
-    qubits[1].flux = channels["L1-23_fl"]
-    channels["L1-23_fl"].qubit = qubits[1]
-
-    qubits[2].readout = channels["L3-30_ro"]
-    qubits[2].feedback = channels["L2-4-RO_2"]
-    qubits[2].drive = channels["L4-31_qd"]
-    qubits[2].flux = channels["L1-24_fl"]
-    channels["L1-24_fl"].qubit = qubits[2]
+    qubits, couplers, pairs = load_qubits(runcard, load_kernels(FOLDER))
+    load_wiring(FOLDER).build(
+        {"controller": controller, local_oscillator.name: local_oscillator},
+        qubits,
+        couplers,
+    )
 
     instruments = {controller.name: controller, local_oscillator.name: local_oscillator}
     settings = load_settings(runcard)
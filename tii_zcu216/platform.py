@@ -1,14 +1,11 @@
+import importlib.util
 import pathlib
+import sys
 
-from qibolab.channels import Channel, ChannelMap
-from qibolab.instruments.erasynth import ERA
-from qibolab.instruments.rfsoc import RFSoC
-from qibolab.instruments.rohde_schwarz import SGS100A
 from qibolab.platform import Platform
 from qibolab.serialize import (
     load_instrument_settings,
     load_qubits,
-    load_runcard,
     load_settings,
 )
 
@@ -18,6 +15,29 @@ TWPA_ADDRESS = "192.168.0.31"
 LO_ADDRESS = "192.168.0.35"
 
 FOLDER = pathlib.Path(__file__).parent
+# shared helpers, e.g. the compiled runcard loader, loaded by path such that
+# installed modules with the same names cannot shadow them
+HELPERS = FOLDER.parent / "_selfhosted"
+
+
+def _helper(name: str):
+    """Module of the shared helpers."""
+    path = HELPERS / f"{name}.py"
+    module = sys.modules.get(name)
+    location = getattr(module, "__file__", None)
+    if location is not None and pathlib.Path(location).resolve() == path.resolve():
+        return module
+    qualified = f"_selfhosted_{name}"
+    if qualified not in sys.modules:
+        spec = importlib.util.spec_from_file_location(qualified, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[qualified] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[qualified]
+            raise
+    return sys.modules[qualified]
 
 
 def create():
@@ -25,53 +45,27 @@ def create():
 
     IPs and other instrument related parameters are hardcoded in.
     """
+    # drivers and helpers are imported here, such that loading this module stays cheap
+    from qibolab.instruments.rfsoc import RFSoC
+    from qibolab.instruments.rohde_schwarz import SGS100A
+
+    helpers = _helper("runcard")
+    load_kernels, load_runcard = helpers.load_kernels, helpers.load_runcard
+    load_wiring = _helper("wiring").load_wiring
+
     # Instantiate QICK instruments
     controller = RFSoC(str(FOLDER), ADDRESS, PORT, sampling_rate=6.144)
     controller.cfg.adc_trig_offset = 200
     controller.cfg.repetition_duration = 200
-    # Create channel objects
-    channels = ChannelMap()
-
-    channels |= Channel("L3-30", port=controller.ports(6))  # readout
-
-    # qubit D1
-    channels |= Channel("L2-01-0", port=controller.ports(0))  # feedback
-    channels |= Channel("L1-21", port=controller.ports(1))  # flux
-    channels |= Channel("L4-28", port=controller.ports(0))  # drive
-
-    # qubit D2
-    channels |= Channel("L2-01-1", port=controller.ports(1))  # feedback
-    channels |= Channel("L1-22", port=controller.ports(3))  # flux
-    channels |= Channel("L4-29", port=controller.ports(4))  # drive
-
-    # qubit D3
-    channels |= Channel("L2-01-2", port=controller.ports(2))  # feedback
-    channels |= Channel("L1-23", port=controller.ports(5))  # flux
-    channels |= Channel("L4-30", port=controller.ports(2))  # drive
-
     twpa_lo = SGS100A("TWPA", TWPA_ADDRESS)
     readout_lo = SGS100A("readout_lo", LO_ADDRESS)
-    channels["L3-30"].local_oscillator = readout_lo
 
-    # create qubit objects
+    # create qubit objects and connect them as described in wiring.json
     runcard = load_runcard(FOLDER)
-    qubits, couplers, pairs = load_qubits(runcard)
-
-    # assign channels to qubits
-    qubits["D1"].readout = channels["L3-30"]
-    qubits["D1"].feedback = channels["L2-01-0"]
-    qubits["D1"].drive = channels["L4-28"]
-    qubits["D1"].flux = channels["L1-21"]
-
-    qubits["D2"].readout = channels["L3-30"]
-    qubits["D2"].feedback = channels["L2-01-1"]
-    qubits["D2"].drive = channels["L4-29"]
-    qubits["D2"].flux = channels["L1-22"]
-
-    qubits["D3"].readout = channels["L3-30"]
-    qubits["D3"].feedback = channels["L2-01-2"]
-    qubits["D3"].drive = channels["L4-30"]
-    qubits["D3"].flux = channels["L1-23"]
+    qubits, couplers, pairs = load_qubits(runcard, load_kernels(FOLDER))
+    load_wiring(FOLDER).build(
+        {"controller": controller, readout_lo.name: readout_lo}, qubits, couplers
+    )
 
     instruments = {
         controller.name: controller,